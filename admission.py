@@ -0,0 +1,222 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Deque, Dict, Iterator, List, Optional, Sequence, Union
+
+# Lower value = served first.
+INTERACTIVE = 0
+BROADCAST = 1
+ANALYTICS = 2
+PRIORITIES = ("interactive", "broadcast", "analytics")
+
+
+class Overloaded(Exception):
+    def __init__(self, priority: int):
+        super().__init__(f"{PRIORITIES[priority]} work shed: server is saturated")
+        self.priority = priority
+
+
+# A queued acquire: a thread waits on the event, a coroutine on the future,
+# which is resolved on its own loop whichever thread frees the slot.
+class _Waiter:
+    __slots__ = ("priority", "event", "admitted", "loop", "future")
+
+    def __init__(self, priority: int, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.priority = priority
+        self.event = threading.Event()
+        self.admitted: Optional[bool] = None
+        self.loop = loop
+        self.future = loop.create_future() if loop is not None else None
+
+    def wake(self) -> None:
+        self.event.set()
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self) -> None:
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+# Priority admission in front of the handlers. At most `limit` pieces of
+# work run at once; broadcasts may only fill `shares[BROADCAST]` of it and
+# analytics `shares[ANALYTICS]`, so interactive replies always find room.
+# Work that cannot start waits in a bounded queue, and freed slots go to
+# the highest priority first.
+#
+# The limit adapts to observed run time (AIMD): +1/limit per completion
+# under target_latency, x backoff when one goes over, at most once per
+# target_latency so a burst of slow completions counts once.
+#
+# Interactive work waits at most queue_timeout and is then shed (Overloaded),
+# so the caller can answer with a static reply. Broadcast and analytics work
+# is never shed: when the queue is full an interactive arrival takes the
+# place of the newest lower-priority waiter, which backs off and queues again.
+class AdmissionController:
+    def __init__(self, max_concurrency: int = 64, min_concurrency: int = 4, max_queue: int = 256,
+                 target_latency: float = 0.25, queue_timeout: float = 0.2, backoff: float = 0.8,
+                 shares: Sequence[float] = (1.0, 0.5, 0.25), retry_delay: float = 0.05, clock=time.monotonic):
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.max_queue = max_queue
+        self.target_latency = target_latency
+        self.queue_timeout = queue_timeout
+        self.backoff = backoff
+        self.shares = tuple(shares)
+        self.retry_delay = retry_delay
+        self._clock = clock
+        self.limit = float(max_concurrency)
+        self._running = [0] * len(PRIORITIES)
+        self._waiting: List[Deque[_Waiter]] = [deque() for _ in PRIORITIES]
+        self._lock = threading.Lock()
+        self._last_decrease = float("-inf")
+        self.admitted = [0] * len(PRIORITIES)
+        self.shed = [0] * len(PRIORITIES)
+        self.bumped = [0] * len(PRIORITIES)
+        self.decreases = 0
+
+    def _has_room(self, priority: int) -> bool:
+        return sum(self._running) < max(1.0, self.limit * self.shares[priority])
+
+    def _start(self, priority: int) -> None:
+        self._running[priority] += 1
+        self.admitted[priority] += 1
+
+    # Admits at once (True), sheds (False), or queues and returns the waiter.
+    def _enter(self, priority: int, loop: Optional[asyncio.AbstractEventLoop] = None) -> Union[bool, _Waiter]:
+        with self._lock:
+            ahead = any(self._waiting[p] for p in range(priority + 1))
+            if not ahead and self._has_room(priority):
+                self._start(priority)
+                return True
+            if sum(len(q) for q in self._waiting) >= self.max_queue:
+                victim = self._bump_below(priority)
+                if victim is None:
+                    self.shed[priority] += 1
+                    return False
+            waiter = _Waiter(priority, loop)
+            self._waiting[priority].append(waiter)
+            return waiter
+
+    def _settle(self, waiter: _Waiter) -> bool:
+        with self._lock:
+            if waiter.admitted is None:
+                self._waiting[waiter.priority].remove(waiter)
+                self.shed[waiter.priority] += 1
+                return False
+            return waiter.admitted
+
+    # True once admitted; False if the wait timed out or the waiter was
+    # bumped from a full queue.
+    def acquire(self, priority: int, timeout: Optional[float] = None) -> bool:
+        waiter = self._enter(priority)
+        if isinstance(waiter, bool):
+            return waiter
+        waiter.event.wait(timeout)
+        return self._settle(waiter)
+
+    # acquire() for the event loop: waits without holding a thread.
+    async def acquire_async(self, priority: int, timeout: Optional[float] = None) -> bool:
+        waiter = self._enter(priority, asyncio.get_running_loop())
+        if isinstance(waiter, bool):
+            return waiter
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout)
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            # Give back a slot granted while being cancelled.
+            if not self._settle(waiter):
+                raise
+            self.release(waiter.priority, 0.0)
+            raise
+        return self._settle(waiter)
+
+    def _bump_below(self, priority: int) -> Optional[_Waiter]:
+        for p in range(len(PRIORITIES) - 1, priority, -1):
+            if self._waiting[p]:
+                victim = self._waiting[p].pop()
+                victim.admitted = False
+                self.bumped[p] += 1
+                victim.wake()
+                return victim
+        return None
+
+    def release(self, priority: int, latency: float) -> None:
+        with self._lock:
+            self._running[priority] -= 1
+            self._adapt(latency)
+            self._dispatch()
+
+    def _adapt(self, latency: float) -> None:
+        if latency <= self.target_latency:
+            self.limit = min(float(self.max_concurrency), self.limit + 1.0 / self.limit)
+            return
+        now = self._clock()
+        if now - self._last_decrease >= self.target_latency:
+            self._last_decrease = now
+            self.limit = max(float(self.min_concurrency), self.limit * self.backoff)
+            self.decreases += 1
+
+    def _dispatch(self) -> None:
+        for priority, queue in enumerate(self._waiting):
+            while queue and self._has_room(priority):
+                waiter = queue.popleft()
+                waiter.admitted = True
+                self._start(priority)
+                waiter.wake()
+            if queue:
+                # Lower priorities never overtake a waiting higher one.
+                return
+
+    @contextmanager
+    def slot(self, priority: int) -> Iterator[None]:
+        if priority == INTERACTIVE:
+            if not self.acquire(priority, self.queue_timeout):
+                raise Overloaded(priority)
+        else:
+            while not self.acquire(priority):
+                time.sleep(self.retry_delay)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(priority, time.perf_counter() - started)
+
+    @asynccontextmanager
+    async def slot_async(self, priority: int) -> AsyncIterator[None]:
+        if priority == INTERACTIVE:
+            if not await self.acquire_async(priority, self.queue_timeout):
+                raise Overloaded(priority)
+        else:
+            while not await self.acquire_async(priority):
+                await asyncio.sleep(self.retry_delay)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(priority, time.perf_counter() - started)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "limit": round(self.limit, 2),
+                "decreases": self.decreases,
+                "running": dict(zip(PRIORITIES, self._running)),
+                "queued": dict(zip(PRIORITIES, (len(q) for q in self._waiting))),
+                "admitted": dict(zip(PRIORITIES, self.admitted)),
+                "shed": dict(zip(PRIORITIES, self.shed)),
+                "bumped": dict(zip(PRIORITIES, self.bumped)),
+            }
+
+
+def admission_from_env(env: Dict[str, str]) -> AdmissionController:
+    return AdmissionController(
+        max_concurrency=int(env.get("ADMISSION_MAX_CONCURRENCY", "64")),
+        min_concurrency=int(env.get("ADMISSION_MIN_CONCURRENCY", "4")),
+        max_queue=int(env.get("ADMISSION_MAX_QUEUE", "256")),
+        target_latency=float(env.get("ADMISSION_TARGET_LATENCY", "0.25")),
+        queue_timeout=float(env.get("ADMISSION_QUEUE_TIMEOUT", "0.2")),
+    )
@@ -0,0 +1,141 @@
+import csv
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+# A 6-digit PIN falls back to its 3-digit sorting district, then to its
+# 2-digit postal circle (the state).
+FALLBACK_LEVELS = (6, 3, 2)
+
+Alert = Dict[str, str]
+
+
+def _area_key(area: object) -> str:
+    key = "".join(ch for ch in str(area) if ch.isdigit())
+    if len(key) not in FALLBACK_LEVELS:
+        raise ValueError(f"alert area must be a 2, 3 or 6 digit pincode prefix: {area!r}")
+    return key
+
+
+def _messages(rec: Dict[str, object]) -> Alert:
+    msgs = {}
+    for k, v in rec.items():
+        # A CSV row with more fields than the header puts the extras under None.
+        if k is None or v in (None, ""):
+            continue
+        if k == "message":
+            msgs["en"] = str(v)
+        elif k.startswith("message_"):
+            msgs[k[len("message_"):]] = str(v)
+    if "en" not in msgs:
+        raise ValueError(f"alert for {rec.get('area')!r} has no message")
+    return msgs
+
+
+def load_alert_feed(path: str) -> Dict[str, Alert]:
+    with open(path, encoding="utf-8", newline="") as fp:
+        if path.endswith(".csv"):
+            records: List[Dict[str, object]] = list(csv.DictReader(fp))
+        else:
+            data = json.load(fp)
+            if isinstance(data, dict):
+                data = data.get("alerts", data)
+            if isinstance(data, dict):
+                records = [{"area": k, "message": v} for k, v in data.items()]
+            else:
+                records = data
+    if not isinstance(records, list):
+        raise ValueError(f"alert feed must be a list of records, not {type(records).__name__}")
+    index: Dict[str, Alert] = {}
+    for rec in records:
+        if not isinstance(rec, dict):
+            raise ValueError(f"alert record must be an object: {rec!r}")
+        index[_area_key(rec["area"])] = _messages(rec)
+    return index
+
+
+class AlertIndex:
+    def __init__(self, path: Optional[str] = None, poll_interval: float = 5.0):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.version = 0
+        self.loaded_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._index: Dict[str, Alert] = {}
+        self._stamp: Optional[Tuple[float, int]] = None
+        self._listeners: List[Callable[[], None]] = []
+        self._thread: Optional[threading.Thread] = None
+        if path:
+            self.reload()
+
+    def on_reload(self, fn: Callable[[], None]) -> None:
+        self._listeners.append(fn)
+
+    def lookup(self, pincode: Optional[str], lang: str = "en") -> Optional[str]:
+        if not pincode:
+            return None
+        index = self._index
+        digits = "".join(ch for ch in str(pincode) if ch.isdigit())
+        for n in FALLBACK_LEVELS:
+            if len(digits) >= n:
+                alert = index.get(digits[:n])
+                if alert is not None:
+                    return alert.get(lang) or alert["en"]
+        return None
+
+    def reload(self) -> bool:
+        if not self.path:
+            return False
+        try:
+            st = os.stat(self.path)
+        except OSError as exc:
+            self.last_error = f"{type(exc).__name__}: {exc}"
+            return False
+        try:
+            index = load_alert_feed(self.path)
+        except (OSError, ValueError, KeyError, TypeError, csv.Error) as exc:
+            # Remember the broken file's stamp so the watcher waits for the next edit.
+            self._stamp = (st.st_mtime, st.st_size)
+            self.last_error = f"{type(exc).__name__}: {exc}"
+            print(f"[ALERTS] keeping previous feed, reload of {self.path} failed: {self.last_error}")
+            return False
+        # Readers never lock: they pick up either the old or the new dict.
+        self._index = index
+        self._stamp = (st.st_mtime, st.st_size)
+        self.version += 1
+        self.loaded_at = time.time()
+        self.last_error = None
+        for fn in self._listeners:
+            fn()
+        return True
+
+    def start(self) -> None:
+        if not self.path or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._watch, name="alert-feed", daemon=True)
+        self._thread.start()
+
+    def _watch(self) -> None:
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                st = os.stat(self.path)
+                if (st.st_mtime, st.st_size) != self._stamp:
+                    self.reload()
+            except OSError:
+                continue
+            except Exception as exc:
+                # A failing listener must not stop the watcher.
+                self.last_error = f"{type(exc).__name__}: {exc}"
+                print(f"[ALERTS] watcher error: {self.last_error}")
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "path": self.path,
+            "areas": len(self._index),
+            "version": self.version,
+            "loaded_at": self.loaded_at,
+            "last_error": self.last_error,
+        }
@@ -1,448 +1,232 @@
-from flask import Flask, request, jsonify
+import gc
+import json
+import os
+import time
+
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from typing import Dict, List, Optional, Tuple
 from datetime import datetime
 
+from admission import ANALYTICS, BROADCAST, INTERACTIVE, Overloaded, admission_from_env
+from alerts import AlertIndex
+from batch_ingest import BadRecord, iter_records
+from broadcast import BroadcastEngine, open_job_store
+from dedup import idempotency_store
+from delivery_log import DeliveryLog
+from knowledge import DEFAULT_ARTIFACT, DEFAULT_SOURCE, KnowledgePack, PackReloader, load_pack
+from lang_detect import detect_lang, keeps_lang
+from metrics import NULL_TIMER, Registry
+from outbound import DeliveryError, outbound_from_env
+from profiling import profiler_from_env
+from reply_cache import InvalidationLog, ReplyCache, ReplyKey
+from sessions import Session, session_store_from_env
+from state import open_state
+from subscribers import SubscriberStore, open_subscriber_store
+from twiml import EMPTY_RESPONSE, TwimlReplies, render_message
+
 app = Flask(__name__)
 
-LANGS = ["en", "hi", "te", "kn", "ta"]
+# Keywords, replies and the vaccine schedule come from data/knowledge.json,
+# compiled to data/knowledge.pack; each language is decoded on first use.
+# Edits are picked up without a restart, see swap_content().
+KNOWLEDGE_PACK = os.environ.get("KNOWLEDGE_PACK", DEFAULT_ARTIFACT)
+KNOWLEDGE_SOURCE = os.environ.get("KNOWLEDGE_SOURCE", DEFAULT_SOURCE)
+PACK = load_pack(KNOWLEDGE_PACK, KNOWLEDGE_SOURCE)
+LANGS = PACK.langs
+CONTENT = PackReloader(KNOWLEDGE_PACK, KNOWLEDGE_SOURCE,
+                       poll_interval=float(os.environ.get("KNOWLEDGE_WATCH_INTERVAL", "5")))
+
+# Shared by every worker: dedup entries and reply-cache invalidations.
+# memory, a SQLite file path, or redis://host:6379/0.
+STATE_URL = os.environ.get("STATE_URL", "memory")
+STATE = open_state(STATE_URL)
+
+METRICS = Registry(enabled=os.environ.get("METRICS_ENABLED", "1") != "0")
+# Off unless armed; see /admin/profile/start.
+PROFILER = profiler_from_env(os.environ, backend=STATE)
+STAGE_SECONDS = METRICS.histogram("chatbot_stage_seconds", "Time spent in each stage of handle_message.", ["stage"])
+REQUEST_SECONDS = METRICS.histogram("chatbot_request_seconds", "HTTP request latency by endpoint.", ["endpoint"])
+MESSAGES_TOTAL = METRICS.counter(
+    "chatbot_messages_total", "Handled messages by endpoint, language and intent.", ["endpoint", "lang", "intent"]
+)
 
 def guess_lang(text: str) -> str:
-    if text is None:
-        return "en"
-    t = text.strip().lower()
-    if len(t) == 0:
-        return "en"
-    hi_hints = ["namaste", "नमस्ते", "खांसी", "बुखार", "टीका", "टीकाकरण", "स्वास्थ्य"]
-    te_hints = ["నమస్తే", "జ్వరం", "దగ్గు", "టీకా", "ఆరోగ్యం"]
-    kn_hints = ["ನಮಸ್ಕಾರ", "ಜ್ವರ", "ಕೆಮ್ಮು", "ಲಸಿಕೆ", "ಆರೋಗ್ಯ"]
-    ta_hints = ["வணக்கம்", "காய்ச்சல்", "இருமல்", "தடுப்பூசி", "ஆரோக்கியம்"]
-    if any(ch in t for ch in "अआइईउऊएऐओऔकखगघचछजझटठडढतथदधनपफबभमयरलवशषसहािंीुूेैोौंः"):
-        return "hi"
-    if any(ch in t for ch in "అఆఇఈఉఊఎఏఐఒఔకఖగఘఙచఛజఝఞటఠడఢణతథదధనపఫబభమయరలవశషసహాిీుూెేైొోౌంః"):
-        return "te"
-    if any(ch in t for ch in "ಅಆಇಈಉಊಎಏಐಒಓಔಕಖಗಘಙಚಛಜಝಞಟಠಡಢಣತಥದಧನಪಫಬಭಮಯರಲವಶಷಸಹಾಿೀುೂೃೆೇೈೊೋೌಂಃ"):
-        return "kn"
-    if any(ch in t for ch in "அஆஇஈஉஊஎஏஐஒஓஔகஙசஞடணதநபமயரலவழளறஸஷஹாிீுூெேைொோௌம்ஂஃ"):
-        return "ta"
-    if any(w in t for w in hi_hints):
-        return "hi"
-    if any(w in t for w in te_hints):
-        return "te"
-    if any(w in t for w in kn_hints):
-        return "kn"
-    if any(w in t for w in ta_hints):
-        return "ta"
-    return "en"
+    return detect_lang(text).lang
 
 class Intent(str):
     pass
 
-INTENT_KEYWORDS: Dict[str, Dict[str, List[str]]] = {
-    "en": {
-        "greet": ["hi", "hello", "hey", "namaste"],
-        "preventive": ["prevention", "prevent", "wash", "mask", "avoid"],
-        "symptoms": ["symptom", "fever", "cough", "cold", "headache"],
-        "vaccine": ["vaccine", "vaccination", "schedule", "dose", "immunization"],
-        "outbreak": ["outbreak", "alert", "cases", "disease spread"],
-        "help": ["help", "menu"],
-    },
-    "hi": {
-        "greet": ["नमस्ते", "नमस्कार", "हैलो"],
-        "preventive": ["रोकथाम", "सावधानी", "मास्क", "हाथ", "धो"],
-        "symptoms": ["लक्षण", "बुखार", "खांसी", "जुकाम", "सरदर्द"],
-        "vaccine": ["टीका", "टीकाकरण", "खुराक", "शेड्यूल"],
-        "outbreak": ["प्रकोप", "अलर्ट", "मामले", "फैल"],
-        "help": ["मदद", "विकल्प"],
-    },
-    "te": {
-        "greet": ["నమస్తే", "హలో"],
-        "preventive": ["నివారణ", "మాస్క్", "కడుగు", "దూరం"],
-        "symptoms": ["లక్షణాలు", "జ్వరం", "దగ్గు", "జలుబు", "తలనొప్పి"],
-        "vaccine": ["టీకా", "టీకాకరణ", "డోస్", "షెడ్యూల్"],
-        "outbreak": ["అలర్ట్", "కేసులు", "విస్తరణ"],
-        "help": ["సహాయం", "మెను"],
-    },
-    "kn": {
-        "greet": ["ನಮಸ್ಕಾರ", "ಹಲೋ"],
-        "preventive": ["ತಡೆಗಟ್ಟುವಿಕೆ", "ಮಾಸ್ಕ್", "ಕೈ", "ತೊಳೆಯಿರಿ", "ಅಂತರ"],
-        "symptoms": ["ಲಕ್ಷಣಗಳು", "ಜ್ವರ", "ಕೆಮ್ಮು", "ಶೀತ", "ತಲೆನೋವು"],
-        "vaccine": ["ಲಸಿಕೆ", "ವೇಳಾಪಟ್ಟಿ", "ಡೋಸ್", "ಲಸಿಕಾಕರಣ"],
-        "outbreak": ["ಎಚ್ಚರಿಕೆ", "ಕೇಸುಗಳು", "ಪ್ರಸರಣ"],
-        "help": ["ಸಹಾಯ", "ಮೆನು"],
-    },
-    "ta": {
-        "greet": ["வணக்கம்", "ஹலோ"],
-        "preventive": ["தடுப்பு", "மாஸ்க்", "கைகளை", "கழுவ", "இடைவெளி"],
-        "symptoms": ["அறிகுறிகள்", "காய்ச்சல்", "இருமல்", "சளி", "தலைவலி"],
-        "vaccine": ["தடுப்பூசி", "அட்டவணை", "டோஸ்"],
-        "outbreak": ["அலர்ட்", "பரவல்", "வழக்குகள்"],
-        "help": ["உதவி", "மெனு"],
-    },
-}
-
-RESPONSES: Dict[str, Dict[str, str]] = {
-    "en": {
-        "greet": "Hello! Ask me about prevention, symptoms, vaccines, or type 'alert'.",
-        "preventive": "Wash hands, wear a mask in crowds, keep distance if sick, drink safe water.",
-        "symptoms": "Watch for fever, cough, cold, headache. Seek a doctor for breathing issues.",
-        "vaccine": "Send your age or a child's age to get a sample vaccination schedule.",
-        "outbreak": "Current demo alert: Dengue risk is moderate. Remove stagnant water.",
-        "help": "Try: prevention tips, symptoms, vaccine schedule, outbreak alerts.",
-    },
-    "hi": {
-        "greet": "नमस्ते! रोकथाम, लक्षण, टीकाकरण या 'अलर्ट' लिखें।",
-        "preventive": "हाथ धोएँ, भीड़ में मास्क पहनें, बीमार हों तो दूरी रखें, साफ पानी पिएँ।",
-        "symptoms": "लक्षण: बुखार, खांसी, जुकाम, सिरदर्द। सांस में दिक्कत हो तो डॉक्टर से मिलें।",
-        "vaccine": "अपनी या बच्चे की उम्र भेजें, मैं नमूना टीकाकरण शेड्यूल बताऊँगा।",
-        "outbreak": "डेमो अलर्ट: डेंगू जोखिम मध्यम। रुका पानी हटाएँ।",
-        "help": "पूछें: रोकथाम, लक्षण, टीकाकरण, प्रकोप अलर्ट।",
-    },
-    "te": {
-        "greet": "నమస్తే! నివారణ, లక్షణాలు, టీకాలు లేదా 'అలర్ట్' అడగండి.",
-        "preventive": "చేతులు కడగండి, గుంపుల్లో మాస్క్ ధరించండి, అనారోగ్యం ఉంటే దూరం పాటించండి, శుభ్రమైన నీరు తాగండి.",
-        "symptoms": "లక్షణాలు: జ్వరం, దగ్గు, జలుబు, తలనొప్పి. శ్వాస ఇబ్బంది అయితే వైద్యుడిని సంప్రదించండి.",
-        "vaccine": "వయస్సు పంపండి, నమూనా టీకా షెడ్యూల్ ఇస్తాను.",
-        "outbreak": "డెమో అలర్ట్: డెంగ్యూ మోస్తరు ప్రమాదం. నిల్వ నీరు తొలగించండి.",
-        "help": "ప్రశ్నలు: నివారణ, లక్షణాలు, టీకాలు, అలర్ట్స్.",
-    },
-    "kn": {
-        "greet": "ನಮಸ್ಕಾರ! ತಡೆಗಟ್ಟುವಿಕೆ, ಲಕ್ಷಣಗಳು, ಲಸಿಕೆಗಳು ಅಥವಾ 'ಅಲರ್ಟ್' ಕೇಳಿ.",
-        "preventive": "ಕೈ ತೊಳೆಯಿರಿ, ಗುಂಪಿನಲ್ಲಿ ಮಾಸ್ಕ್ ಧರಿಸಿ, ಅಸ್ವಸ್ಥರಾಗಿದ್ದರೆ ಅಂತರ ಕಾಯ್ದುಕೊಳ್ಳಿ, ಶುದ್ಧ ನೀರು ಕುಡಿಯಿರಿ.",
-        "symptoms": "ಲಕ್ಷಣಗಳು: ಜ್ವರ, ಕೆಮ್ಮು, ಶೀತ, ತಲೆನೋವು. ಉಸಿರಾಟ ತೊಂದರೆ ಇದ್ದರೆ ವೈದ್ಯರನ್ನು ಸಂಪರ್ಕಿಸಿ.",
-        "vaccine": "ನಿಮ್ಮ ವಯಸ್ಸು ಕಳುಹಿಸಿ, ಮಾದರಿ ಲಸಿಕೆ ವೇಳಾಪಟ್ಟಿ ನೀಡುತ್ತೇನೆ.",
-        "outbreak": "ಡೆಮೋ ಎಚ್ಚರಿಕೆ: ಡೆಂಗ್ಯು ಮಧ್ಯಮ ಅಪಾಯ. ನಿಂತ ನೀರನ್ನು ತೆಗೆಯಿರಿ.",
-        "help": "ಪ್ರಶ್ನೆಗಳು: ತಡೆಗಟ್ಟುವಿಕೆ, ಲಕ್ಷಣಗಳು, ಲಸಿಕೆ, ಅಲರ್ಟ್.",
-    },
-    "ta": {
-        "greet": "வணக்கம்! தடுப்பு, அறிகுறிகள், தடுப்பூசி அல்லது 'அலர்ட்' கேளுங்கள்.",
-        "preventive": "கைகளை கழுவுங்கள், கூட்டத்தில் மாஸ்க் அணியுங்கள், உடல்நலம் குன்றினால் இடைவெளி வைத்திருங்கள், சுத்தமான தண்ணீர் குடியுங்கள்.",
-        "symptoms": "அறிகுறிகள்: காய்ச்சல், இருமல், சளி, தலைவலி. சுவாச சிரமம் இருந்தால் மருத்துவரை காணுங்கள்.",
-        "vaccine": "வயதை அனுப்புங்கள், மாதிரி தடுப்பூசி அட்டவணை தருகிறேன்.",
-        "outbreak": "டெமோ எச்சரிக்கை: டெங்கு மிதமான ஆபத்து. தங்கிய நீரை அகற்றுங்கள்.",
-        "help": "கேள்விகள்: தடுப்பு, அறிகுறிகள், தடுப்பூசி, அலர்ட்.",
-    },
-}
-
-MOCK_VACCINE_SCHEDULE = {
-    "infant": [
-        {"age": "6 weeks", "vaccine": "OPV, Penta, Rota"},
-        {"age": "10 weeks", "vaccine": "OPV, Penta, Rota"},
-        {"age": "14 weeks", "vaccine": "OPV, Penta, Rota"},
-        {"age": "9-12 months", "vaccine": "Measles/Rubella"},
-    ],
-    "adult": [
-        {"age": "Anytime", "vaccine": "Tetanus booster every 10 years"},
-        {"age": ">= 60", "vaccine": "Flu, Pneumococcal (as advised)"},
-    ],
-}
-
-SUBSCRIBERS: List[Tuple[str, str]] = []
-
-def fetch_vaccination_schedule(age_years: int) -> List[Dict[str, str]]:
-    if age_years <= 1:
-        return MOCK_VACCINE_SCHEDULE["infant"]
-    return MOCK_VACCINE_SCHEDULE["adult"]
-
-def fetch_outbreak_alerts(pincode: Optional[str]) -> str:
-    if pincode:
-        return f"Outbreak update for {pincode}: Dengue risk is moderate. Remove stagnant water."
-    return "Outbreak update: No major alerts currently. Stay safe!"
-
-def format_vaccine_reply(lang: str, schedule: List[Dict[str, str]]) -> str:
-    if lang not in RESPONSES:
-        lang = "en"
-    if lang == "en":
-        lines = ["Sample vaccination schedule:"]
-    elif lang == "hi":
-        lines = ["नमूना टीकाकरण शेड्यूल:"]
-    elif lang == "te":
-        lines = ["నమూనా టీకా షెడ్యూల్:"]
-    elif lang == "kn":
-        lines = ["ಮಾದರಿ ಲಸಿಕೆ ವೇಳಾಪಟ್ಟಿ:"]
-    else:
-        lines = ["மாதிரி தடுப்பூசி அட்டவணை:"]
-    for row in schedule:
-        lines.append(f"- {row['age']}: {row['vaccine']}")
-    return "".join(lines)
-
-def send_message(phone: str, text: str) -> None:
-    print(f"[SEND] to {phone}: {text}")
-
-class BroadcastIn:
-    def __init__(self, d: dict):
-        self.message_en = d.get("message_en", "")
-        self.message_hi = d.get("message_hi")
-        self.message_te = d.get("message_te")
-        self.message_kn = d.get("message_kn")
-        self.message_ta = d.get("message_ta")
-
-def handle_message(phone: str, text: str, pincode: Optional[str] = None, lang_in: Optional[str] = None):
-    lang = lang_in if lang_in in LANGS else guess_lang(text)
-    lang_map = INTENT_KEYWORDS.get(lang, INTENT_KEYWORDS["en"])
-    t = (text or "").lower()
-    intent = "help"
-    for k_intent, kws in lang_map.items():
-        for k in kws:
-            if k in t:
-                intent = k_intent
-                break
-        if intent != "help":
-            break
-    if len(t) <= 2:
-        intent = "greet"
-    reply = RESPONSES.get(lang, RESPONSES["en"]).get(intent, RESPONSES["en"]["help"])
-    age = extract_age_years(text)
-    if age is not None:
-        schedule = fetch_vaccination_schedule(age)
-        reply = format_vaccine_reply(lang, schedule)
-    if intent == "outbreak":
-        alert = fetch_outbreak_alerts(pincode)
-        reply = reply + "" + alert
-    send_message(phone, reply)
-    return {"to": phone, "lang": lang, "intent": intent, "reply": reply}
-
-@app.route("/webhook", methods=["POST"])
-def webhook():
-    data = request.get_json(force=True, silent=True) or {}
-    phone = str(data.get("phone", ""))
-    text = str(data.get("text", ""))
-    pincode = data.get("pincode")
-    lang_in = data.get("lang")
-    result = handle_message(phone=phone, text=text, pincode=pincode, lang_in=lang_in)
-    return jsonify(result)
-
-@app.route("/twilio", methods=["POST"])
-def twilio_webhook():
-    form = request.form or {}
-    phone = form.get("WaId") or form.get("From", "").replace("whatsapp:", "")
-    text = form.get("Body", "")
-    pincode = None
-    lang_in = None
-    result = handle_message(phone=phone, text=text, pincode=pincode, lang_in=lang_in)
-    return jsonify(result)
-
-def extract_age_years(text: str) -> Optional[int]:
-    if not text:
+# keyword (exact matches only) or fuzzy: messages without a keyword hit are
+# scored by character n-gram similarity, which needs numpy.
+INTENT_CLASSIFIER = os.environ.get("INTENT_CLASSIFIER", "keyword")
+
+def fuzzy_keywords(lang: str, pack: Optional[KnowledgePack] = None) -> Dict[str, List[str]]:
+    pack = pack if pack is not None else PACK
+    keywords = {intent: list(kws) for intent, kws in pack.get(lang).keywords.items()}
+    # Senders with a sticky language still type English words, and romanized
+    # text without a known hint word is detected as English.
+    others = [pack.default_lang] if lang != pack.default_lang else [x for x in pack.langs if x != lang]
+    for other in others:
+        for intent, kws in pack.get(other).keywords.items():
+            keywords.setdefault(intent, []).extend(k for k in kws if k.isascii())
+    return keywords
+
+# Prototypes are built lazily from one pack; a reload gets a new classifier.
+def fuzzy_for(pack: KnowledgePack):
+    if INTENT_CLASSIFIER != "fuzzy":
         return None
-    t = text.lower()
-    num = ""
-    digits: List[str] = []
-    for ch in t:
-        if ch.isdigit():
-            num += ch
-        else:
-            if num:
-                digits.append(num)
-                num = ""
-    if num:
-        digits.append(num)
-    if not digits:
-        return None
-    try:
-        val = int(digits[0])
-        if 0 <= val <= 120:
-            return val
-    except Exception:
-        return None
-    return None
+    from fuzzy_intent import FuzzyIntentClassifier
+    return FuzzyIntentClassifier(lambda lang: fuzzy_keywords(lang, pack),
+                                 threshold=float(os.environ.get("INTENT_FUZZY_THRESHOLD", "0.5")))
 
-@app.route("/admin/broadcast", methods=["POST"])
-def admin_broadcast():
-    payload = BroadcastIn(request.get_json(force=True, silent=True) or {})
-    messages = {
-        "en": payload.message_en,
-        "hi": payload.message_hi or payload.message_en,
-        "te": payload.message_te or payload.message_en,
-        "kn": payload.message_kn or payload.message_en,
-        "ta": payload.message_ta or payload.message_en,
-    }
-    report: List[Dict[str, str]] = []
-    for phone, lang in SUBSCRIBERS:
-        text = messages.get(lang, payload.message_en)
-        send_message(phone, text)
-        report.append({"phone": phone, "lang": lang, "sent": "yes"})
-    return jsonify({"count": len(report), "details": report})
+FUZZY = fuzzy_for(PACK)
 
-@app.route("/health", methods=["GET"])
-def health():
-    return jsonify({
-        "status": "ok",
-        "time": datetime.utcnow().isoformat(),
-        "subscribers": len(SUBSCRIBERS),
-        "langs": LANGS,
-    })
+SUBSCRIBERS: SubscriberStore = open_subscriber_store(os.environ.get("SUBSCRIBER_DB", "subscribers.db"))
 
-if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=8000)
-from flask import Flask, request, jsonify
-from typing import Dict, List, Optional, Tuple
-from datetime import datetime
+REPLY_CACHE = ReplyCache(
+    maxsize=int(os.environ.get("REPLY_CACHE_SIZE", "1024")),
+    ttl=float(os.environ.get("REPLY_CACHE_TTL", "3600")),
+)
+OUTBREAK_CACHE_TTL = float(os.environ.get("OUTBREAK_CACHE_TTL", "60"))
+CACHE_SYNC = InvalidationLog(REPLY_CACHE, STATE, interval=float(os.environ.get("CACHE_SYNC_INTERVAL", "1")))
 
-app = Flask(__name__)
+# Last language, intent and pincode per phone: in STATE when it is shared,
+# otherwise local to this worker.
+SESSIONS = session_store_from_env(os.environ, backend=STATE)
 
-LANGS = ["en", "hi", "te", "kn", "ta"]
+# Ages are in days. Every age maps to an interval of the schedule table
+# whose reply is pre-rendered per language in the knowledge pack.
+def vaccine_bucket(age_days: int, pack: Optional[KnowledgePack] = None) -> str:
+    return (pack if pack is not None else PACK).vaccine_schedule.band_id(age_days)
 
-def guess_lang(text: str) -> str:
-    if text is None:
-        return "en"
-    t = text.strip().lower()
-    if len(t) == 0:
-        return "en"
-    hi_hints = ["namaste", "नमस्ते", "खांसी", "बुखार", "टीका", "टीकाकरण", "स्वास्थ्य"]
-    te_hints = ["నమస్తే", "జ్వరం", "దగ్గు", "టీకా", "ఆరోగ్యం"]
-    kn_hints = ["ನಮಸ್ಕಾರ", "ಜ್ವರ", "ಕೆಮ್ಮು", "ಲಸಿಕೆ", "ಆರೋಗ್ಯ"]
-    ta_hints = ["வணக்கம்", "காய்ச்சல்", "இருமல்", "தடுப்பூசி", "ஆரோக்கியம்"]
-    if any(ch in t for ch in "अआइईउऊएऐओऔकखगघचछजझटठडढतथदधनपफबभमयरलवशषसहािंीुूेैोौंः"):
-        return "hi"
-    if any(ch in t for ch in "అఆఇఈఉఊఎఏఐఒఔకఖగఘఙచఛజఝఞటఠడఢణతథదధనపఫబభమయరలవశషసహాిీుూెేైొోౌంః"):
-        return "te"
-    if any(ch in t for ch in "ಅಆಇಈಉಊಎಏಐಒಓಔಕಖಗಘಙಚಛಜಝಞಟಠಡಢಣತಥದಧನಪಫಬಭಮಯರಲವಶಷಸಹಾಿೀುೂೃೆೇೈೊೋೌಂಃ"):
-        return "kn"
-    if any(ch in t for ch in "அஆஇஈஉஊஎஏஐஒஓஔகஙசஞடணதநபமயரலவழளறஸஷஹாிீுூெேைொோௌம்ஂஃ"):
-        return "ta"
-    if any(w in t for w in hi_hints):
-        return "hi"
-    if any(w in t for w in te_hints):
-        return "te"
-    if any(w in t for w in kn_hints):
-        return "kn"
-    if any(w in t for w in ta_hints):
-        return "ta"
-    return "en"
+def fetch_vaccination_schedule(age_days: int, lang: str = "en", pack: Optional[KnowledgePack] = None) -> str:
+    # One read of PACK: the interval and its reply come from the same version.
+    pack = pack if pack is not None else PACK
+    return pack.get(lang).schedule_replies[pack.vaccine_schedule.band(age_days)]
 
-class Intent(str):
-    pass
+ALERTS = AlertIndex(os.environ.get("ALERT_FEED"), poll_interval=float(os.environ.get("ALERT_POLL_INTERVAL", "5")))
+ALERTS.on_reload(lambda: REPLY_CACHE.invalidate(intent="outbreak"))
 
-INTENT_KEYWORDS: Dict[str, Dict[str, List[str]]] = {
-    "en": {
-        "greet": ["hi", "hello", "hey", "namaste"],
-        "preventive": ["prevention", "prevent", "wash", "mask", "avoid"],
-        "symptoms": ["symptom", "fever", "cough", "cold", "headache"],
-        "vaccine": ["vaccine", "vaccination", "schedule", "dose", "immunization"],
-        "outbreak": ["outbreak", "alert", "cases", "disease spread"],
-        "help": ["help", "menu"],
-    },
-    "hi": {
-        "greet": ["नमस्ते", "नमस्कार", "हैलो"],
-        "preventive": ["रोकथाम", "सावधानी", "मास्क", "हाथ", "धो"],
-        "symptoms": ["लक्षण", "बुखार", "खांसी", "जुकाम", "सरदर्द"],
-        "vaccine": ["टीका", "टीकाकरण", "खुराक", "शेड्यूल"],
-        "outbreak": ["प्रकोप", "अलर्ट", "मामले", "फैल"],
-        "help": ["मदद", "विकल्प"],
-    },
-    "te": {
-        "greet": ["నమస్తే", "హలో"],
-        "preventive": ["నివారణ", "మాస్క్", "కడుగు", "దూరం"],
-        "symptoms": ["లక్షణాలు", "జ్వరం", "దగ్గు", "జలుబు", "తలనొప్పి"],
-        "vaccine": ["టీకా", "టీకాకరణ", "డోస్", "షెడ్యూల్"],
-        "outbreak": ["అలర్ట్", "కేసులు", "విస్తరణ"],
-        "help": ["సహాయం", "మెను"],
-    },
-    "kn": {
-        "greet": ["ನಮಸ್ಕಾರ", "ಹಲೋ"],
-        "preventive": ["ತಡೆಗಟ್ಟುವಿಕೆ", "ಮಾಸ್ಕ್", "ಕೈ", "ತೊಳೆಯಿರಿ", "ಅಂತರ"],
-        "symptoms": ["ಲಕ್ಷಣಗಳು", "ಜ್ವರ", "ಕೆಮ್ಮು", "ಶೀತ", "ತಲೆನೋವು"],
-        "vaccine": ["ಲಸಿಕೆ", "ವೇಳಾಪಟ್ಟಿ", "ಡೋಸ್", "ಲಸಿಕಾಕರಣ"],
-        "outbreak": ["ಎಚ್ಚರಿಕೆ", "ಕೇಸುಗಳು", "ಪ್ರಸರಣ"],
-        "help": ["ಸಹಾಯ", "ಮೆನು"],
-    },
-    "ta": {
-        "greet": ["வணக்கம்", "ஹலோ"],
-        "preventive": ["தடுப்பு", "மாஸ்க்", "கைகளை", "கழுவ", "இடைவெளி"],
-        "symptoms": ["அறிகுறிகள்", "காய்ச்சல்", "இருமல்", "சளி", "தலைவலி"],
-        "vaccine": ["தடுப்பூசி", "அட்டவணை", "டோஸ்"],
-        "outbreak": ["அலர்ட்", "பரவல்", "வழக்குகள்"],
-        "help": ["உதவி", "மெனு"],
-    },
-}
-
-RESPONSES: Dict[str, Dict[str, str]] = {
-    "en": {
-        "greet": "Hello! Ask me about prevention, symptoms, vaccines, or type 'alert'.",
-        "preventive": "Wash hands, wear a mask in crowds, keep distance if sick, drink safe water.",
-        "symptoms": "Watch for fever, cough, cold, headache. Seek a doctor for breathing issues.",
-        "vaccine": "Send your age or a child's age to get a sample vaccination schedule.",
-        "outbreak": "Current demo alert: Dengue risk is moderate. Remove stagnant water.",
-        "help": "Try: prevention tips, symptoms, vaccine schedule, outbreak alerts.",
-    },
-    "hi": {
-        "greet": "नमस्ते! रोकथाम, लक्षण, टीकाकरण या 'अलर्ट' लिखें।",
-        "preventive": "हाथ धोएँ, भीड़ में मास्क पहनें, बीमार हों तो दूरी रखें, साफ पानी पिएँ।",
-        "symptoms": "लक्षण: बुखार, खांसी, जुकाम, सिरदर्द। सांस में दिक्कत हो तो डॉक्टर से मिलें।",
-        "vaccine": "अपनी या बच्चे की उम्र भेजें, मैं नमूना टीकाकरण शेड्यूल बताऊँगा।",
-        "outbreak": "डेमो अलर्ट: डेंगू जोखिम मध्यम। रुका पानी हटाएँ।",
-        "help": "पूछें: रोकथाम, लक्षण, टीकाकरण, प्रकोप अलर्ट।",
-    },
-    "te": {
-        "greet": "నమస్తే! నివారణ, లక్షణాలు, టీకాలు లేదా 'అలర్ట్' అడగండి.",
-        "preventive": "చేతులు కడగండి, గుంపుల్లో మాస్క్ ధరించండి, అనారోగ్యం ఉంటే దూరం పాటించండి, శుభ్రమైన నీరు తాగండి.",
-        "symptoms": "లక్షణాలు: జ్వరం, దగ్గు, జలుబు, తలనొప్పి. శ్వాస ఇబ్బంది అయితే వైద్యుడిని సంప్రదించండి.",
-        "vaccine": "వయస్సు పంపండి, నమూనా టీకా షెడ్యూల్ ఇస్తాను.",
-        "outbreak": "డెమో అలర్ట్: డెంగ్యూ మోస్తరు ప్రమాదం. నిల్వ నీరు తొలగించండి.",
-        "help": "ప్రశ్నలు: నివారణ, లక్షణాలు, టీకాలు, అలర్ట్స్.",
-    },
-    "kn": {
-        "greet": "ನಮಸ್ಕಾರ! ತಡೆಗಟ್ಟುವಿಕೆ, ಲಕ್ಷಣಗಳು, ಲಸಿಕೆಗಳು ಅಥವಾ 'ಅಲರ್ಟ್' ಕೇಳಿ.",
-        "preventive": "ಕೈ ತೊಳೆಯಿರಿ, ಗುಂಪಿನಲ್ಲಿ ಮಾಸ್ಕ್ ಧರಿಸಿ, ಅಸ್ವಸ್ಥರಾಗಿದ್ದರೆ ಅಂತರ ಕಾಯ್ದುಕೊಳ್ಳಿ, ಶುದ್ಧ ನೀರು ಕುಡಿಯಿರಿ.",
-        "symptoms": "ಲಕ್ಷಣಗಳು: ಜ್ವರ, ಕೆಮ್ಮು, ಶೀತ, ತಲೆನೋವು. ಉಸಿರಾಟ ತೊಂದರೆ ಇದ್ದರೆ ವೈದ್ಯರನ್ನು ಸಂಪರ್ಕಿಸಿ.",
-        "vaccine": "ನಿಮ್ಮ ವಯಸ್ಸು ಕಳುಹಿಸಿ, ಮಾದರಿ ಲಸಿಕೆ ವೇಳಾಪಟ್ಟಿ ನೀಡುತ್ತೇನೆ.",
-        "outbreak": "ಡೆಮೋ ಎಚ್ಚರಿಕೆ: ಡೆಂಗ್ಯು ಮಧ್ಯಮ ಅಪಾಯ. ನಿಂತ ನೀರನ್ನು ತೆಗೆಯಿರಿ.",
-        "help": "ಪ್ರಶ್ನೆಗಳು: ತಡೆಗಟ್ಟುವಿಕೆ, ಲಕ್ಷಣಗಳು, ಲಸಿಕೆ, ಅಲರ್ಟ್.",
-    },
-    "ta": {
-        "greet": "வணக்கம்! தடுப்பு, அறிகுறிகள், தடுப்பூசி அல்லது 'அலர்ட்' கேளுங்கள்.",
-        "preventive": "கைகளை கழுவுங்கள், கூட்டத்தில் மாஸ்க் அணியுங்கள், உடல்நலம் குன்றினால் இடைவெளி வைத்திருங்கள், சுத்தமான தண்ணீர் குடியுங்கள்.",
-        "symptoms": "அறிகுறிகள்: காய்ச்சல், இருமல், சளி, தலைவலி. சுவாச சிரமம் இருந்தால் மருத்துவரை காணுங்கள்.",
-        "vaccine": "வயதை அனுப்புங்கள், மாதிரி தடுப்பூசி அட்டவணை தருகிறேன்.",
-        "outbreak": "டெமோ எச்சரிக்கை: டெங்கு மிதமான ஆபத்து. தங்கிய நீரை அகற்றுங்கள்.",
-        "help": "கேள்விகள்: தடுப்பு, அறிகுறிகள், தடுப்பூசி, அலர்ட்.",
-    },
-}
-
-MOCK_VACCINE_SCHEDULE = {
-    "infant": [
-        {"age": "6 weeks", "vaccine": "OPV, Penta, Rota"},
-        {"age": "10 weeks", "vaccine": "OPV, Penta, Rota"},
-        {"age": "14 weeks", "vaccine": "OPV, Penta, Rota"},
-        {"age": "9-12 months", "vaccine": "Measles/Rubella"},
-    ],
-    "adult": [
-        {"age": "Anytime", "vaccine": "Tetanus booster every 10 years"},
-        {"age": ">= 60", "vaccine": "Flu, Pneumococcal (as advised)"},
-    ],
-}
-
-SUBSCRIBERS: List[Tuple[str, str]] = []
-
-def fetch_vaccination_schedule(age_years: int) -> List[Dict[str, str]]:
-    if age_years <= 1:
-        return MOCK_VACCINE_SCHEDULE["infant"]
-    return MOCK_VACCINE_SCHEDULE["adult"]
-
-def fetch_outbreak_alerts(pincode: Optional[str]) -> str:
+def fetch_outbreak_alerts(pincode: Optional[str], lang: str = "en") -> str:
     if pincode:
-        return f"Outbreak update for {pincode}: Dengue risk is moderate. Remove stagnant water."
+        alert = ALERTS.lookup(pincode, lang)
+        if alert is not None:
+            return f"Outbreak update for {pincode}: {alert}"
+        if not ALERTS.path:
+            return f"Outbreak update for {pincode}: Dengue risk is moderate. Remove stagnant water."
     return "Outbreak update: No major alerts currently. Stay safe!"
 
-def format_vaccine_reply(lang: str, schedule: List[Dict[str, str]]) -> str:
-    if lang not in RESPONSES:
-        lang = "en"
-    if lang == "en":
-        lines = ["Sample vaccination schedule:"]
-    elif lang == "hi":
-        lines = ["नमूना टीकाकरण शेड्यूल:"]
-    elif lang == "te":
-        lines = ["నమూనా టీకా షెడ్యూల్:"]
-    elif lang == "kn":
-        lines = ["ಮಾದರಿ ಲಸಿಕೆ ವೇಳಾಪಟ್ಟಿ:"]
-    else:
-        lines = ["மாதிரி தடுப்பூசி அட்டவணை:"]
-    for row in schedule:
-        lines.append(f"- {row['age']}: {row['vaccine']}")
-    return "".join(lines)
-
-def send_message(phone: str, text: str) -> None:
-    print(f"[SEND] to {phone}: {text}")
+OUTBOUND = outbound_from_env(autostart=False)
+
+DEDUP = idempotency_store(
+    os.environ.get("DEDUP_BACKEND") or STATE_URL,
+    path=os.environ.get("DEDUP_DB", "dedup.db"),
+    maxsize=int(os.environ.get("DEDUP_MAX_ENTRIES", "100000")),
+    ttl=float(os.environ.get("DEDUP_TTL", "3600")),
+)
+DUPLICATE_IN_FLIGHT = {"status": "duplicate", "detail": "original delivery is still being processed"}
+
+# False if the outbound queue was full and the reply was dropped.
+def send_message(phone: str, text: str) -> bool:
+    if OUTBOUND is None:
+        print(f"[SEND] to {phone}: {text}")
+        return True
+    if not OUTBOUND.enqueue(phone, text):
+        print(f"[OUTBOUND] queue full, dropped message to {phone}")
+        return False
+    return True
+
+# Broadcast sends wait for a bulk slot in the outbound queue, which slows the
+# job to the send rate; only a send that waited out OUTBOUND_BULK_TIMEOUT
+# counts as failed.
+def send_broadcast(phone: str, text: str) -> None:
+    if OUTBOUND is None:
+        print(f"[SEND] to {phone}: {text}")
+        return
+    if not OUTBOUND.enqueue(phone, text, bulk=True):
+        raise DeliveryError(f"outbound queue full for {OUTBOUND.bulk_timeout:g}s")
+
+# Interactive replies before broadcast sends before batch/analytics work;
+# interactive requests that cannot start in time get a static busy reply.
+ADMISSION = admission_from_env(os.environ)
+
+# Per-job CSV of delivery outcomes, queried via /admin/broadcast/<id>/deliveries.
+DELIVERIES = DeliveryLog(
+    os.environ.get("BROADCAST_LOG_DIR", "broadcast_logs"),
+    fsync=os.environ.get("BROADCAST_LOG_FSYNC", "1") != "0",
+)
+
+BROADCASTS = BroadcastEngine(
+    recipients=SUBSCRIBERS.iter_from,
+    count=SUBSCRIBERS.count,
+    send=lambda phone, text: send_broadcast(phone, text),
+    store=open_job_store(os.environ.get("BROADCAST_DB", "broadcast_jobs.db")),
+    concurrency=int(os.environ.get("BROADCAST_CONCURRENCY", "8")),
+    rate=float(os.environ.get("BROADCAST_RATE", "20")),
+    lease=float(os.environ.get("BROADCAST_LEASE", "60")),
+    admit=lambda: ADMISSION.slot(BROADCAST),
+    log=DELIVERIES,
+)
+
+def _queue_depths():
+    depths = {("broadcast_jobs",): len(BROADCASTS.active())}
+    if OUTBOUND is not None:
+        stats = OUTBOUND.stats()
+        depths[("outbound",)] = stats["queued"]
+        depths[("outbound_retry",)] = stats["retrying"]
+    return depths
+
+def _outbound_outcomes():
+    if OUTBOUND is None:
+        return {}
+    stats = OUTBOUND.stats()
+    return {(k,): stats[k] for k in ("sent", "retried", "dead_lettered", "dropped", "bulk_timed_out")}
+
+def _broadcast_progress():
+    totals = {("sent",): 0, ("failed",): 0, ("pending",): 0}
+    for job in BROADCASTS.active():
+        for state in ("sent", "failed", "pending"):
+            totals[(state,)] += job[state]
+    return totals
+
+METRICS.gauge("chatbot_queue_depth", "Items waiting in in-process queues.", ["queue"], collect=_queue_depths)
+METRICS.gauge(
+    "chatbot_outbound_messages", "Outbound sends since start by outcome; dropped counts interactive replies refused by a full "
+    "queue, bulk_timed_out broadcast sends that waited out OUTBOUND_BULK_TIMEOUT.",
+    ["outcome"], collect=_outbound_outcomes,
+)
+METRICS.gauge(
+    "chatbot_broadcast_messages", "Progress of broadcast jobs running in this process.", ["state"],
+    collect=_broadcast_progress,
+)
+METRICS.gauge(
+    "chatbot_reply_cache", "Reply cache size and counters.", ["stat"],
+    collect=lambda: {(k,): v for k, v in REPLY_CACHE.stats().items()},
+)
+METRICS.gauge(
+    "chatbot_dedup", "Webhook de-duplication store size and counters.", ["stat"],
+    collect=lambda: {(k,): v for k, v in DEDUP.stats().items() if isinstance(v, (int, float))},
+)
+METRICS.gauge(
+    "chatbot_admission_queue_depth", "Requests waiting for admission by priority.", ["priority"],
+    collect=lambda: {(p,): v for p, v in ADMISSION.stats()["queued"].items()},
+)
+METRICS.gauge(
+    "chatbot_admission_running", "Admitted requests in progress by priority.", ["priority"],
+    collect=lambda: {(p,): v for p, v in ADMISSION.stats()["running"].items()},
+)
+METRICS.gauge(
+    "chatbot_admission_shed", "Requests shed since start by priority.", ["priority"],
+    collect=lambda: {(p,): v for p, v in ADMISSION.stats()["shed"].items()},
+)
+METRICS.gauge(
+    "chatbot_admission_limit", "Current adaptive concurrency limit.",
+    collect=lambda: {(): ADMISSION.limit},
+)
+METRICS.gauge(
+    "chatbot_sessions", "Conversation session store size and counters.", ["stat"],
+    collect=lambda: {(k,): v for k, v in SESSIONS.stats().items()},
+)
 
 class BroadcastIn:
     def __init__(self, d: dict):
@@ -452,41 +236,228 @@ class BroadcastIn:
         self.message_kn = d.get("message_kn")
         self.message_ta = d.get("message_ta")
 
-def handle_message(phone: str, text: str, pincode: Optional[str] = None, lang_in: Optional[str] = None):
-    lang = lang_in if lang_in in LANGS else guess_lang(text)
-    lang_map = INTENT_KEYWORDS.get(lang, INTENT_KEYWORDS["en"])
+    def messages(self) -> Dict[str, str]:
+        return {
+            "en": self.message_en,
+            "hi": self.message_hi or self.message_en,
+            "te": self.message_te or self.message_en,
+            "kn": self.message_kn or self.message_en,
+            "ta": self.message_ta or self.message_en,
+        }
+
+# Functions that read content take the request's `pack`, read from PACK
+# once by handle_message, so a reload mid-request cannot mix versions.
+# Without one they read PACK themselves.
+def compose_reply(lang: str, intent: str, schedule: Optional[str], alert: Optional[str],
+                  pack: Optional[KnowledgePack] = None) -> str:
+    pack = pack if pack is not None else PACK
+    reply = pack.get(lang).responses.get(intent) or pack.get(pack.default_lang).responses["help"]
+    if schedule is not None:
+        reply = schedule
+    if alert is not None:
+        reply = reply + "" + alert
+    return reply
+
+def render_reply(lang: str, intent: str, age: Optional[int], pincode: Optional[str],
+                 pack: Optional[KnowledgePack] = None) -> str:
+    pack = pack if pack is not None else PACK
+    schedule = fetch_vaccination_schedule(age, lang, pack) if age is not None else None
+    alert = fetch_outbreak_alerts(pincode, lang) if intent == "outbreak" else None
+    return compose_reply(lang, intent, schedule, alert, pack)
+
+def classify(text: str, lang_in: Optional[str] = None, timer=NULL_TIMER,
+             session: Optional[Session] = None, pack: Optional[KnowledgePack] = None) -> Tuple[str, str, Optional[int]]:
+    pack = pack if pack is not None else PACK
+    if lang_in in pack.langs:
+        lang = lang_in
+    elif session is not None and keeps_lang(text, session.lang):
+        # Known senders keep their language until they write in another script.
+        lang = session.lang
+    else:
+        lang = guess_lang(text)
+    timer.mark("guess_lang")
     t = (text or "").lower()
-    intent = "help"
-    for k_intent, kws in lang_map.items():
-        for k in kws:
-            if k in t:
-                intent = k_intent
-                break
-        if intent != "help":
-            break
-    if len(t) <= 2:
+    intent = pack.get(lang).matcher.best(t, "")
+    if not intent and lang != pack.default_lang and t.isascii():
+        intent = pack.get(pack.default_lang).matcher.best(t, "")
+    fuzzy = FUZZY
+    if not intent and fuzzy is not None:
+        intent = fuzzy.classify(lang, t) or ""
+    timer.mark("intent")
+    age = pack.vaccine_schedule.extract_age_days(text)
+    timer.mark("extract_age")
+    digits = t.strip()
+    if session is not None and not intent and (
+        (session.intent == "vaccine" and age is not None)
+        or (session.intent == "outbreak" and len(digits) == 6 and digits.isdigit())
+    ):
+        # "2" or "6 months" after a vaccine question is an age; six digits
+        # after an outbreak question are a pincode.
+        intent = session.intent
+    elif len(t) <= 2:
         intent = "greet"
-    reply = RESPONSES.get(lang, RESPONSES["en"]).get(intent, RESPONSES["en"]["help"])
-    age = extract_age_years(text)
-    if age is not None:
-        schedule = fetch_vaccination_schedule(age)
-        reply = format_vaccine_reply(lang, schedule)
+    elif not intent:
+        intent = "help"
+    return lang, intent, age
+
+# classify() with the sender's session: reads it, fills in a pincode from
+# the text or an earlier message, and records this turn.
+def classify_turn(phone: str, text: str, pincode: Optional[str], lang_in: Optional[str] = None,
+                  timer=NULL_TIMER, pack: Optional[KnowledgePack] = None) -> Tuple[str, str, Optional[int], Optional[str]]:
+    session = SESSIONS.get(phone)
+    lang, intent, age = classify(text, lang_in, timer, session, pack)
+    if not pincode:
+        t = (text or "").strip()
+        if len(t) == 6 and t.isdigit():
+            pincode = t
+        elif session is not None:
+            pincode = session.pincode_str()
+    SESSIONS.update(phone, lang, intent, pincode)
+    return lang, intent, age, pincode
+
+def reply_key(lang: str, intent: str, age: Optional[int], pincode: Optional[str],
+              pack: Optional[KnowledgePack] = None):
+    pack = pack if pack is not None else PACK
+    bucket = None if age is None else vaccine_bucket(age, pack)
+    # Only outbreak replies depend on the pincode, and they expire sooner.
     if intent == "outbreak":
-        alert = fetch_outbreak_alerts(pincode)
-        reply = reply + "" + alert
+        pincode = str(pincode) if pincode else None
+        return ReplyKey(lang, intent, bucket, pincode, pack.version), OUTBREAK_CACHE_TTL, pincode
+    return ReplyKey(lang, intent, bucket, None, pack.version), None, None
+
+def twiml_replies_for(pack: KnowledgePack) -> TwimlReplies:
+    return TwimlReplies(lambda lang, intent: compose_reply(lang, intent, None, None, pack))
+
+TWIML_REPLIES = twiml_replies_for(PACK)
+
+# A content reload replaces PACK with one assignment. Requests read it once,
+# without a lock, and use either the old or the new version throughout.
+# Reply cache keys carry the pack version, and the TwiML bodies and fuzzy
+# prototypes are rebuilt for the new pack (before PACK itself is swapped),
+# so nothing rendered from the old content is served after the swap.
+def swap_content(pack: KnowledgePack) -> None:
+    global PACK, LANGS, FUZZY, TWIML_REPLIES
+    FUZZY = fuzzy_for(pack)
+    TWIML_REPLIES = twiml_replies_for(pack)
+    PACK = pack
+    LANGS = pack.langs
+    # Old-version entries can no longer be hit; free the space. Local only:
+    # every worker reloads, and clears, on its own.
+    REPLY_CACHE.invalidate()
+    print(f"[KNOWLEDGE] content version {pack.version} is live")
+
+CONTENT.on_reload(swap_content)
+
+def handle_message(phone: str, text: str, pincode: Optional[str] = None, lang_in: Optional[str] = None,
+                   endpoint: str = "direct"):
+    CACHE_SYNC.poll()
+    pack = PACK
+    timer = STAGE_SECONDS.timer()
+    lang, intent, age, pincode = classify_turn(phone, text, pincode, lang_in, timer, pack)
+    if PROFILER.enabled:
+        PROFILER.tag(lang=lang, intent=intent)
+    key, ttl, pincode = reply_key(lang, intent, age, pincode, pack)
+    reply = REPLY_CACHE.get_or_render(key, lambda: render_reply(lang, intent, age, pincode, pack), ttl)
+    timer.mark("format_reply")
     send_message(phone, reply)
+    timer.mark("send")
+    timer.done()
+    MESSAGES_TOTAL.inc(endpoint, lang, intent)
     return {"to": phone, "lang": lang, "intent": intent, "reply": reply}
 
-@app.route("/webhook", methods=["POST"])
-def webhook():
-    data = request.get_json(force=True, silent=True) or {}
+# The sender's last language if known; shedding must not pay for guess_lang.
+def busy_lang(phone: str) -> str:
+    session = SESSIONS.get(phone)
+    return session.lang if session is not None else PACK.default_lang
+
+def shed_reply(phone: str, endpoint: str) -> dict:
+    lang = busy_lang(phone)
+    reply = compose_reply(lang, "busy", None, None)
+    send_message(phone, reply)
+    MESSAGES_TOTAL.inc(endpoint, lang, "busy")
+    return {"to": phone, "lang": lang, "intent": "busy", "reply": reply}
+
+# Shed requests are answered outside DEDUP, so a provider retry is handled
+# normally instead of replaying the busy reply.
+def admitted(priority: int, phone: str, endpoint: str, process):
+    try:
+        with ADMISSION.slot(priority):
+            return process()
+    except Overloaded:
+        return shed_reply(phone, endpoint)
+
+def handle_webhook_payload(data: dict, endpoint: str = "/webhook", priority: int = INTERACTIVE):
     phone = str(data.get("phone", ""))
     text = str(data.get("text", ""))
     pincode = data.get("pincode")
     lang_in = data.get("lang")
-    result = handle_message(phone=phone, text=text, pincode=pincode, lang_in=lang_in)
+    message_id = data.get("message_id")
+    return admitted(priority, phone, endpoint, lambda: DEDUP.run_once(
+        f"webhook:{message_id}" if message_id else None,
+        lambda: handle_message(phone=phone, text=text, pincode=pincode, lang_in=lang_in, endpoint=endpoint),
+        DUPLICATE_IN_FLIGHT,
+    ))
+
+@app.before_request
+def _start_timer():
+    g.started = time.perf_counter()
+    PROFILER.poll()
+    if PROFILER.enabled:
+        g.profiling = PROFILER.begin(request.headers)
+
+@app.teardown_request
+def _end_profile(exc):
+    if g.get("profiling"):
+        PROFILER.end(endpoint=request.url_rule.rule if request.url_rule is not None else "unmatched")
+
+# A streamed body (/webhook/batch) is produced after teardown, so its
+# profile is ended once the server has sent it and closed the response.
+@app.after_request
+def _defer_profile(response):
+    if g.get("profiling") and response.is_streamed:
+        g.profiling = False
+        rule = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        response.call_on_close(lambda: PROFILER.end(endpoint=rule))
+    return response
+
+@app.after_request
+def _observe_request(response):
+    started = g.get("started")
+    if started is not None:
+        rule = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        REQUEST_SECONDS.observe(time.perf_counter() - started, rule)
+    return response
+
+@app.route("/webhook", methods=["POST"])
+def webhook():
+    data = request.get_json(force=True, silent=True) or {}
+    result = handle_webhook_payload(data)
     return jsonify(result)
 
+@app.route("/webhook/batch", methods=["POST"])
+def webhook_batch():
+    records = iter_records(request.stream, request.mimetype)
+
+    def results():
+        index = 0
+        try:
+            for data in records:
+                if isinstance(data, BadRecord):
+                    line = {"index": index, "error": data.error}
+                elif isinstance(data, dict):
+                    try:
+                        line = {"index": index, **handle_webhook_payload(data, endpoint="/webhook/batch", priority=ANALYTICS)}
+                    except Exception as exc:
+                        line = {"index": index, "error": str(exc)}
+                else:
+                    line = {"index": index, "error": "record must be a JSON object"}
+                yield json.dumps(line, ensure_ascii=False) + "\n"
+                index += 1
+        except ValueError as exc:
+            yield json.dumps({"index": index, "error": f"invalid input: {exc}"}) + "\n"
+
+    return Response(stream_with_context(results()), mimetype="application/x-ndjson")
+
 @app.route("/twilio", methods=["POST"])
 def twilio_webhook():
     form = request.form or {}
@@ -494,82 +465,182 @@ def twilio_webhook():
     text = form.get("Body", "")
     pincode = None
     lang_in = None
-    result = handle_message(phone=phone, text=text, pincode=pincode, lang_in=lang_in)
+    sid = form.get("MessageSid")
+    result = admitted(INTERACTIVE, phone, "/twilio", lambda: DEDUP.run_once(
+        f"twilio:{sid}" if sid else None,
+        lambda: handle_message(phone=phone, text=text, pincode=pincode, lang_in=lang_in, endpoint="/twilio"),
+        DUPLICATE_IN_FLIGHT,
+    ))
     return jsonify(result)
 
-def extract_age_years(text: str) -> Optional[int]:
-    if not text:
-        return None
-    t = text.lower()
-    num = ""
-    digits: List[str] = []
-    for ch in t:
-        if ch.isdigit():
-            num += ch
-        else:
-            if num:
-                digits.append(num)
-                num = ""
-    if num:
-        digits.append(num)
-    if not digits:
-        return None
-    try:
-        val = int(digits[0])
-        if 0 <= val <= 120:
-            return val
-    except Exception:
-        return None
-    return None
+# "6 months", "10 weeks", "2 साल"; a bare number is years.
+def extract_age_days(text: str) -> Optional[int]:
+    return PACK.vaccine_schedule.extract_age_days(text)
 
 @app.route("/admin/broadcast", methods=["POST"])
 def admin_broadcast():
     payload = BroadcastIn(request.get_json(force=True, silent=True) or {})
-    messages = {
-        "en": payload.message_en,
-        "hi": payload.message_hi or payload.message_en,
-        "te": payload.message_te or payload.message_en,
-        "kn": payload.message_kn or payload.message_en,
-        "ta": payload.message_ta or payload.message_en,
-    }
-    report: List[Dict[str, str]] = []
-    for phone, lang in SUBSCRIBERS:
-        text = messages.get(lang, payload.message_en)
-        send_message(phone, text)
-        report.append({"phone": phone, "lang": lang, "sent": "yes"})
-    return jsonify({"count": len(report), "details": report})
+    job_id = BROADCASTS.submit(payload.messages())
+    return jsonify(BROADCASTS.status(job_id)), 202
+
+@app.route("/admin/broadcast/<job_id>", methods=["GET"])
+def admin_broadcast_status(job_id: str):
+    status = BROADCASTS.status(job_id)
+    if status is None:
+        return jsonify({"error": "unknown job"}), 404
+    return jsonify(status)
+
+# One page of a job's delivery log as NDJSON. X-Next-Cursor continues the
+# scan; X-Complete is "1" once the job is finished and the log fully read.
+def delivery_page(job_id: str, args) -> Optional[Tuple[str, Dict[str, str]]]:
+    status = BROADCASTS.status(job_id)
+    if status is None:
+        return None
+    try:
+        cursor = int(args.get("cursor") or 0)
+        limit = min(max(int(args.get("limit") or 1000), 1), 10000)
+    except ValueError:
+        raise ValueError("cursor and limit must be integers") from None
+    rows, next_cursor = DELIVERIES.read(
+        job_id, status=args.get("status") or None, lang=args.get("lang") or None, after=cursor, limit=limit,
+    )
+    body = "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+    complete = status["status"] in ("done", "failed") and next_cursor >= DELIVERIES.size(job_id)
+    return body, {"X-Next-Cursor": str(next_cursor), "X-Complete": "1" if complete else "0"}
+
+@app.route("/admin/broadcast/<job_id>/deliveries", methods=["GET"])
+def admin_broadcast_deliveries(job_id: str):
+    try:
+        page = delivery_page(job_id, request.args)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    if page is None:
+        return jsonify({"error": "unknown job"}), 404
+    body, headers = page
+    return Response(body, mimetype="application/x-ndjson", headers=headers)
 
 @app.route("/health", methods=["GET"])
 def health():
-    return jsonify({
+    return jsonify(health_report())
+
+def health_report() -> dict:
+    return {
         "status": "ok",
         "time": datetime.utcnow().isoformat(),
-        "subscribers": len(SUBSCRIBERS),
+        "subscribers": SUBSCRIBERS.count(),
         "langs": LANGS,
-    })
-from flask import Flask, request, Response
-from twilio.twiml.messaging_response import MessagingResponse
-
-app = Flask(__name__)
-
-@app.route("/twilio", methods=["POST"])
-def twilio_webhook():
-    # get incoming message
-    incoming_msg = (request.form.get("Body") or "").strip()
-
-    # simple reply
-    reply = f"You said: {incoming_msg}. Ask me about vaccines, symptoms, or type 'alert'."
-
-    # build TwiML
-    twiml = MessagingResponse()
-    twiml.message(reply)
+        "intent_classifier": INTENT_CLASSIFIER,
+        "knowledge": {**PACK.stats(), "reload": CONTENT.stats()},
+        "state": STATE.kind,
+        "reply_cache": REPLY_CACHE.stats(),
+        "alerts": ALERTS.stats(),
+        "outbound": OUTBOUND.stats() if OUTBOUND is not None else None,
+        "broadcasts": BROADCASTS.active(),
+        "dedup": DEDUP.stats(),
+        "sessions": SESSIONS.stats(),
+        "admission": ADMISSION.stats(),
+        "profiling": PROFILER.stats(),
+        "metrics_enabled": METRICS.enabled,
+    }
 
-    # return XML
-    return Response(str(twiml), mimetype="application/xml")
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(METRICS.render(), mimetype="text/plain; version=0.0.4")
 
+@app.route("/admin/content/reload", methods=["POST"])
+def admin_content_reload():
+    # Builds and swaps in this worker; the watchers in the others see the new file.
+    if not CONTENT.reload():
+        return jsonify({"error": CONTENT.last_error, "knowledge": PACK.stats()}), 422
+    return jsonify({"knowledge": PACK.stats()})
 
-if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=8000)
+@app.route("/admin/profile/start", methods=["POST"])
+def admin_profile_start():
+    data = request.get_json(force=True, silent=True) or {}
+    try:
+        PROFILER.start(float(data.get("seconds", 60)), float(data.get("sample_rate", 0.01)))
+    except (TypeError, ValueError) as exc:
+        return jsonify({"error": str(exc)}), 400
+    return jsonify(PROFILER.stats())
+
+@app.route("/admin/profile/stop", methods=["POST"])
+def admin_profile_stop():
+    PROFILER.stop()
+    return jsonify(PROFILER.stats())
+
+@app.route("/admin/cache/invalidate", methods=["POST"])
+def admin_cache_invalidate():
+    data = request.get_json(force=True, silent=True) or {}
+    count = CACHE_SYNC.publish(lang=data.get("lang"), intent=data.get("intent"), pincode=data.get("pincode"))
+    return jsonify({"invalidated": count, "reply_cache": REPLY_CACHE.stats()})
+
+# The reply goes back in the TwiML response instead of through send_message.
+# Replies that depend only on (lang, intent) come from TWIML_REPLIES as
+# finished bytes; only schedules and alerts are escaped per request.
+def handle_twiml_message(phone: str, text: str, endpoint: str = "/twilio/twiml") -> dict:
+    CACHE_SYNC.poll()
+    pack = PACK
+    timer = STAGE_SECONDS.timer()
+    lang, intent, age, pincode = classify_turn(phone, text, None, None, timer, pack)
+    if PROFILER.enabled:
+        PROFILER.tag(lang=lang, intent=intent)
+    reply = None
+    if age is not None or intent == "outbreak":
+        key, ttl, pincode = reply_key(lang, intent, age, pincode, pack)
+        reply = REPLY_CACHE.get_or_render(key, lambda: render_reply(lang, intent, age, pincode, pack), ttl)
+    timer.mark("format_reply")
+    timer.done()
+    MESSAGES_TOTAL.inc(endpoint, lang, intent)
+    return {"lang": lang, "intent": intent, "reply": reply}
+
+def twiml_body(result: dict) -> bytes:
+    if "intent" not in result:
+        return EMPTY_RESPONSE
+    if result["reply"] is None:
+        return TWIML_REPLIES.get(result["lang"], result["intent"])
+    return render_message(result["reply"])
+
+@app.route("/twilio/twiml", methods=["POST"])
+def twilio_twiml_webhook():
+    form = request.form or {}
+    phone = form.get("WaId") or form.get("From", "").replace("whatsapp:", "")
+    sid = form.get("MessageSid")
+    # A retried delivery gets the same body; one still in flight gets an empty reply.
+    try:
+        with ADMISSION.slot(INTERACTIVE):
+            result = DEDUP.run_once(
+                f"twiml:{sid}" if sid else None,
+                lambda: handle_twiml_message(phone, form.get("Body", "")),
+                DUPLICATE_IN_FLIGHT,
+            )
+    except Overloaded:
+        result = {"lang": busy_lang(phone), "intent": "busy", "reply": None}
+        MESSAGES_TOTAL.inc("/twilio/twiml", result["lang"], "busy")
+    return Response(twiml_body(result), mimetype="application/xml")
+
+def start_background() -> None:
+    ALERTS.start()
+    CONTENT.start()
+    if OUTBOUND is not None:
+        OUTBOUND.start()
+    BROADCASTS.resume_pending()
+    BROADCASTS.watch()
+
+def preload() -> None:
+    PACK.preload()
+    TWIML_REPLIES.preload(
+        (lang, intent) for lang in LANGS for intent in PACK.get(PACK.default_lang).responses if intent != "outbreak"
+    )
+    # Moves everything loaded so far out of the collector's reach, so GC
+    # passes in the workers do not write to (and un-share) those pages.
+    gc.freeze()
+
+# Under a pre-fork server (gunicorn.conf.py) the master only loads; threads
+# are started in each worker after the fork.
+if os.environ.get("CHATBOT_PREFORK") == "1":
+    preload()
+else:
+    start_background()
 
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=8000)
@@ -0,0 +1,362 @@
+import asyncio
+import json
+import os
+import random
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional, Set
+
+from aiohttp import BasicAuth, ClientError, ClientSession, ClientTimeout, TCPConnector, web
+
+import app as chatbot
+from admission import INTERACTIVE, Overloaded
+from knowledge import KnowledgePack
+from outbound import whatsapp_form
+from sessions import SharedSessionStore
+
+AsyncSender = Callable[[str, str], Awaitable[None]]
+AlertProvider = Callable[[Optional[str], str], Awaitable[str]]
+# Takes the request's pack snapshot, so the schedule and the rest of the
+# reply come from the same content version.
+ScheduleProvider = Callable[[int, str, KnowledgePack], Awaitable[str]]
+
+
+async def local_alerts(pincode: Optional[str], lang: str) -> str:
+    return chatbot.fetch_outbreak_alerts(pincode, lang)
+
+
+async def local_schedule(age_days: int, lang: str, pack: KnowledgePack) -> str:
+    return chatbot.fetch_vaccination_schedule(age_days, lang, pack)
+
+
+async def print_sender(phone: str, text: str) -> None:
+    print(f"[SEND] to {phone}: {text}")
+
+
+def stub_sender(latency: float) -> AsyncSender:
+    async def send(phone: str, text: str) -> None:
+        await asyncio.sleep(latency)
+    return send
+
+
+# Awaits each delivery instead of queueing it, retrying 429/5xx and
+# connection errors with the same full-jitter backoff as OutboundQueue.
+class AsyncHttpSender:
+    def __init__(self, url: str, build: Callable[[str, str], Dict[str, str]], auth: Optional[BasicAuth] = None,
+                 connections: int = 100, timeout: float = 10.0, max_attempts: int = 5,
+                 base_delay: float = 0.5, max_delay: float = 30.0):
+        self.url = url
+        self.build = build
+        self.auth = auth
+        self.connections = connections
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self.in_flight = 0
+        self._session: Optional[ClientSession] = None
+
+    # The session belongs to the running loop, so it is opened on first use.
+    def _get_session(self) -> ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = ClientSession(
+                connector=TCPConnector(limit=self.connections),
+                timeout=ClientTimeout(total=self.timeout),
+                auth=self.auth,
+            )
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+
+    async def __call__(self, phone: str, text: str) -> None:
+        form = self.build(phone, text)
+        self.in_flight += 1
+        try:
+            for attempt in range(1, self.max_attempts + 1):
+                try:
+                    async with self._get_session().post(self.url, data=form) as resp:
+                        body = await resp.read()
+                    if 200 <= resp.status < 300:
+                        self.sent += 1
+                        return
+                    retryable = resp.status == 429 or resp.status >= 500
+                    error = f"HTTP {resp.status}: {body[:200].decode('utf-8', 'replace')}"
+                except (ClientError, asyncio.TimeoutError) as exc:
+                    retryable, error = True, f"{type(exc).__name__}: {exc}"
+                if not retryable or attempt == self.max_attempts:
+                    break
+                self.retried += 1
+                await asyncio.sleep(random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1))))
+            self.failed += 1
+            print(f"[SEND FAILED] to {phone}: {error}")
+        finally:
+            self.in_flight -= 1
+
+    def stats(self) -> Dict[str, int]:
+        return {"in_flight": self.in_flight, "sent": self.sent, "retried": self.retried, "failed": self.failed}
+
+
+def async_sender_from_env(env: Optional[Dict[str, str]] = None) -> AsyncSender:
+    env = os.environ if env is None else env
+    sid = env.get("TWILIO_ACCOUNT_SID")
+    url = env.get("OUTBOUND_API_URL")
+    if not url and sid:
+        url = f"https://api.twilio.com/2010-04-01/Accounts/{sid}/Messages.json"
+    if not url:
+        return print_sender
+    return AsyncHttpSender(
+        url,
+        whatsapp_form(env.get("TWILIO_WHATSAPP_NUMBER", "")),
+        auth=BasicAuth(sid, env.get("TWILIO_AUTH_TOKEN", "")) if sid else None,
+        connections=int(env.get("OUTBOUND_CONNECTIONS", "100")),
+        timeout=float(env.get("OUTBOUND_TIMEOUT", "10")),
+        max_attempts=int(env.get("OUTBOUND_MAX_ATTEMPTS", "5")),
+    )
+
+
+# Replies are sent by background tasks, so a request returns as soon as
+# its reply is composed instead of waiting out the provider's retries. At
+# most max_pending sends are in flight; past that, replies are dropped and
+# counted, as with a full OutboundQueue.
+class AsyncChatbot:
+    def __init__(self, send: Optional[AsyncSender] = None, alerts: AlertProvider = local_alerts,
+                 schedule: ScheduleProvider = local_schedule, max_pending: Optional[int] = None):
+        self.send = send if send is not None else async_sender_from_env()
+        self.alerts = alerts
+        self.schedule = schedule
+        self.max_pending = max_pending if max_pending is not None else int(
+            os.environ.get("OUTBOUND_QUEUE_SIZE", "10000"))
+        self.dropped = 0
+        self.send_errors = 0
+        self._sends: Set[asyncio.Task] = set()
+
+    # Sessions in SQLite or Redis are blocking calls, kept off the loop.
+    async def classify_turn(self, phone: str, text: str, pincode: Optional[str], lang_in: Optional[str], timer,
+                            pack: Optional[KnowledgePack] = None):
+        if isinstance(chatbot.SESSIONS, SharedSessionStore):
+            return await asyncio.get_running_loop().run_in_executor(
+                None, chatbot.classify_turn, phone, text, pincode, lang_in, timer, pack,
+            )
+        return chatbot.classify_turn(phone, text, pincode, lang_in, timer, pack)
+
+    def deliver(self, phone: str, text: str) -> bool:
+        if len(self._sends) >= self.max_pending:
+            self.dropped += 1
+            print(f"[SEND DROPPED] to {phone}: {len(self._sends)} sends pending")
+            return False
+        task = asyncio.get_running_loop().create_task(self._send(phone, text))
+        self._sends.add(task)
+        task.add_done_callback(self._sends.discard)
+        return True
+
+    async def _send(self, phone: str, text: str) -> None:
+        try:
+            await self.send(phone, text)
+        except Exception as exc:
+            self.send_errors += 1
+            print(f"[SEND FAILED] to {phone}: {type(exc).__name__}: {exc}")
+
+    # Same priorities and limits as the sync routes' admitted(), but a
+    # queued request waits on the loop instead of in a thread.
+    async def admitted(self, priority: int, phone: str, endpoint: str, process: Callable[[], Awaitable[dict]]):
+        try:
+            async with chatbot.ADMISSION.slot_async(priority):
+                return await process()
+        except Overloaded:
+            return await self.shed_reply(phone, endpoint)
+
+    async def shed_reply(self, phone: str, endpoint: str) -> dict:
+        if isinstance(chatbot.SESSIONS, SharedSessionStore):
+            lang = await asyncio.get_running_loop().run_in_executor(None, chatbot.busy_lang, phone)
+        else:
+            lang = chatbot.busy_lang(phone)
+        reply = chatbot.compose_reply(lang, "busy", None, None)
+        self.deliver(phone, reply)
+        chatbot.MESSAGES_TOTAL.inc(endpoint, lang, "busy")
+        return {"to": phone, "lang": lang, "intent": "busy", "reply": reply}
+
+    # Waits for every send started so far, e.g. before shutting down.
+    async def drain(self) -> None:
+        while self._sends:
+            await asyncio.gather(*self._sends)
+
+    def stats(self) -> Dict[str, int]:
+        stats = self.send.stats() if isinstance(self.send, AsyncHttpSender) else {}
+        return {**stats, "pending": len(self._sends), "dropped": self.dropped, "errors": self.send_errors}
+
+    async def render_reply(self, lang: str, intent: str, age: Optional[int], pincode: Optional[str],
+                           pack: Optional[KnowledgePack] = None) -> str:
+        if pack is None:
+            pack = chatbot.PACK
+        schedule = await self.schedule(age, lang, pack) if age is not None else None
+        alert = await self.alerts(pincode, lang) if intent == "outbreak" else None
+        return chatbot.compose_reply(lang, intent, schedule, alert, pack)
+
+    async def handle_message(self, phone: str, text: str, pincode: Optional[str] = None,
+                             lang_in: Optional[str] = None, endpoint: str = "direct"):
+        pack = chatbot.PACK
+        timer = chatbot.STAGE_SECONDS.timer()
+        lang, intent, age, pincode = await self.classify_turn(phone, text, pincode, lang_in, timer, pack)
+        key, ttl, pincode = chatbot.reply_key(lang, intent, age, pincode, pack)
+        reply = chatbot.REPLY_CACHE.get(key)
+        if reply is None:
+            reply = await self.render_reply(lang, intent, age, pincode, pack)
+            chatbot.REPLY_CACHE.put(key, reply, ttl)
+        timer.mark("format_reply")
+        self.deliver(phone, reply)
+        timer.mark("send")
+        timer.done()
+        chatbot.MESSAGES_TOTAL.inc(endpoint, lang, intent)
+        return {"to": phone, "lang": lang, "intent": intent, "reply": reply}
+
+
+async def _json_body(request: web.Request) -> dict:
+    # Same leniency as get_json(force=True, silent=True) on the sync routes.
+    try:
+        data = json.loads(await request.read() or b"null")
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+@web.middleware
+async def _observe_request(request: web.Request, handler):
+    started = time.perf_counter()
+    try:
+        return await handler(request)
+    finally:
+        info = request.match_info.route.resource
+        rule = info.canonical if info is not None else "unmatched"
+        chatbot.REQUEST_SECONDS.observe(time.perf_counter() - started, rule)
+
+
+def create_app(bot: Optional[AsyncChatbot] = None) -> web.Application:
+    bot = bot if bot is not None else AsyncChatbot()
+    routes = web.RouteTableDef()
+
+    @routes.post("/webhook")
+    async def webhook(request: web.Request) -> web.Response:
+        data = await _json_body(request)
+        phone = str(data.get("phone", ""))
+        message_id = data.get("message_id")
+        result = await bot.admitted(INTERACTIVE, phone, "/webhook", lambda: chatbot.DEDUP.run_once_async(
+            f"webhook:{message_id}" if message_id else None,
+            lambda: bot.handle_message(
+                phone=phone,
+                text=str(data.get("text", "")),
+                pincode=data.get("pincode"),
+                lang_in=data.get("lang"),
+                endpoint="/webhook",
+            ),
+            chatbot.DUPLICATE_IN_FLIGHT,
+        ))
+        return web.json_response(result)
+
+    @routes.post("/twilio")
+    async def twilio_webhook(request: web.Request) -> web.Response:
+        form = await request.post()
+        phone = form.get("WaId") or form.get("From", "").replace("whatsapp:", "")
+        sid = form.get("MessageSid")
+        result = await bot.admitted(INTERACTIVE, phone, "/twilio", lambda: chatbot.DEDUP.run_once_async(
+            f"twilio:{sid}" if sid else None,
+            lambda: bot.handle_message(phone=phone, text=form.get("Body", ""), endpoint="/twilio"),
+            chatbot.DUPLICATE_IN_FLIGHT,
+        ))
+        return web.json_response(result)
+
+    @routes.post("/admin/broadcast")
+    async def admin_broadcast(request: web.Request) -> web.Response:
+        payload = chatbot.BroadcastIn(await _json_body(request))
+        loop = asyncio.get_running_loop()
+        # Job creation touches SQLite; the job itself runs on the broadcast threads.
+        job_id = await loop.run_in_executor(None, chatbot.BROADCASTS.submit, payload.messages())
+        status = await loop.run_in_executor(None, chatbot.BROADCASTS.status, job_id)
+        return web.json_response(status, status=202)
+
+    @routes.get("/admin/broadcast/{job_id}")
+    async def admin_broadcast_status(request: web.Request) -> web.Response:
+        status = await asyncio.get_running_loop().run_in_executor(
+            None, chatbot.BROADCASTS.status, request.match_info["job_id"],
+        )
+        if status is None:
+            return web.json_response({"error": "unknown job"}, status=404)
+        return web.json_response(status)
+
+    @routes.get("/admin/broadcast/{job_id}/deliveries")
+    async def admin_broadcast_deliveries(request: web.Request) -> web.Response:
+        job_id = request.match_info["job_id"]
+        try:
+            page = await asyncio.get_running_loop().run_in_executor(
+                None, chatbot.delivery_page, job_id, request.query,
+            )
+        except ValueError as exc:
+            return web.json_response({"error": str(exc)}, status=400)
+        if page is None:
+            return web.json_response({"error": "unknown job"}, status=404)
+        body, headers = page
+        return web.Response(body=body.encode(), headers={"Content-Type": "application/x-ndjson", **headers})
+
+    @routes.post("/admin/content/reload")
+    async def admin_content_reload(request: web.Request) -> web.Response:
+        # Building the pack is CPU and file work; keep it off the event loop.
+        ok = await asyncio.get_running_loop().run_in_executor(None, chatbot.CONTENT.reload)
+        if not ok:
+            return web.json_response({"error": chatbot.CONTENT.last_error,
+                                      "knowledge": chatbot.PACK.stats()}, status=422)
+        return web.json_response({"knowledge": chatbot.PACK.stats()})
+
+    @routes.get("/health")
+    async def health(request: web.Request) -> web.Response:
+        report = await asyncio.get_running_loop().run_in_executor(None, chatbot.health_report)
+        report["mode"] = "async"
+        report["outbound"] = bot.stats()
+        return web.json_response(report)
+
+    @routes.get("/metrics")
+    async def metrics(request: web.Request) -> web.Response:
+        return web.Response(body=chatbot.METRICS.render().encode(),
+                            headers={"Content-Type": "text/plain; version=0.0.4"})
+
+    application = web.Application(middlewares=[_observe_request])
+    application.add_routes(routes)
+    application["bot"] = bot
+    application.cleanup_ctx.append(_background(bot))
+    return application
+
+
+# Replays reply-cache invalidations from the shared backend on the default
+# executor, once per CACHE_SYNC.interval, instead of on the request path.
+# On shutdown, pending sends finish before the sender is closed.
+def _background(bot: AsyncChatbot) -> Callable[[web.Application], AsyncIterator[None]]:
+    async def run(application: web.Application) -> AsyncIterator[None]:
+        async def sync_reply_cache() -> None:
+            loop = asyncio.get_running_loop()
+            while True:
+                try:
+                    await loop.run_in_executor(None, chatbot.CACHE_SYNC.poll)
+                except Exception as exc:
+                    print(f"[CACHE SYNC] {type(exc).__name__}: {exc}")
+                await asyncio.sleep(max(chatbot.CACHE_SYNC.interval, 0.1))
+
+        task = asyncio.get_running_loop().create_task(sync_reply_cache())
+        yield
+        task.cancel()
+        await bot.drain()
+        close = getattr(bot.send, "close", None)
+        if close is not None:
+            await close()
+    return run
+
+
+# gunicorn's aiohttp worker only accepts an Application or a coroutine
+# function returning one: gunicorn async_app:app_factory --worker-class ...
+async def app_factory() -> web.Application:
+    return create_app()
+
+
+if __name__ == "__main__":
+    web.run_app(create_app(), host="0.0.0.0", port=int(os.environ.get("PORT", "8000")))
@@ -0,0 +1,175 @@
+import codecs
+import json
+from typing import BinaryIO, Iterator, List, NamedTuple
+
+CHUNK_SIZE = 64 * 1024
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl", "application/json-seq")
+# Largest single array element or NDJSON line, in characters. Past this the
+# array is rejected, and the line skipped, rather than buffered (and
+# re-decoded) until the end of the body.
+MAX_ELEMENT_SIZE = 1024 * 1024
+
+_decoder = json.JSONDecoder()
+_WS = " \t\r\n"
+
+
+def _chunks(stream: BinaryIO, chunk_size: int) -> Iterator[str]:
+    dec = codecs.getincrementaldecoder("utf-8")()
+    while True:
+        raw = stream.read(chunk_size)
+        if not raw:
+            tail = dec.decode(b"", final=True)
+            if tail:
+                yield tail
+            return
+        text = dec.decode(raw)
+        if text:
+            yield text
+
+
+# Stands in for an NDJSON line that is not valid JSON, so one bad line
+# costs one record instead of the rest of the batch.
+class BadRecord(NamedTuple):
+    error: str
+
+
+def _ndjson_line(line: str) -> object:
+    try:
+        return json.loads(line)
+    except json.JSONDecodeError as exc:
+        return BadRecord(f"invalid JSON: {exc}")
+
+
+# Only each new chunk is searched for newlines; the pending line is kept as
+# a list of pieces and joined once. A line longer than max_element becomes a
+# BadRecord and is skipped up to the next newline instead of buffered.
+def iter_ndjson(stream: BinaryIO, chunk_size: int = CHUNK_SIZE,
+                max_element: int = MAX_ELEMENT_SIZE) -> Iterator[object]:
+    too_long = BadRecord(f"line is longer than {max_element} characters")
+    parts: List[str] = []
+    size = 0
+    skipping = False
+    for chunk in _chunks(stream, chunk_size):
+        pieces = chunk.split("\n")
+        tail = pieces.pop()
+        for piece in pieces:
+            if skipping:
+                skipping = False
+            elif size + len(piece) > max_element:
+                yield too_long
+            else:
+                line = "".join(parts) + piece if parts else piece
+                if line.strip():
+                    yield _ndjson_line(line)
+            parts = []
+            size = 0
+        if skipping or not tail:
+            continue
+        parts.append(tail)
+        size += len(tail)
+        if size > max_element:
+            yield too_long
+            parts = []
+            size = 0
+            skipping = True
+    line = "".join(parts)
+    if line.strip():
+        yield _ndjson_line(line)
+
+
+# Incremental parser for a top-level JSON array: elements are decoded one at
+# a time with raw_decode, and consumed input is dropped, so memory is bounded
+# by the largest single element rather than by the whole body, and an
+# element longer than max_element is an error.
+def iter_json_array(stream: BinaryIO, chunk_size: int = CHUNK_SIZE,
+                    max_element: int = MAX_ELEMENT_SIZE) -> Iterator[object]:
+    chunks = _chunks(stream, chunk_size)
+    buf = ""
+    pos = 0
+    eof = False
+
+    def fill() -> bool:
+        nonlocal buf, pos, eof
+        if eof:
+            return False
+        try:
+            chunk = next(chunks)
+        except StopIteration:
+            eof = True
+            return False
+        buf = buf[pos:] + chunk
+        pos = 0
+        return True
+
+    def skip(chars: str) -> None:
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in chars:
+                pos += 1
+            if pos < len(buf) or not fill():
+                return
+
+    skip(_WS)
+    if pos >= len(buf) or buf[pos] != "[":
+        raise ValueError("expected a JSON array")
+    pos += 1
+    expect_value = True
+    count = 0
+    while True:
+        skip(_WS)
+        if pos >= len(buf):
+            raise ValueError("unterminated JSON array")
+        ch = buf[pos]
+        if ch == "]":
+            if expect_value and count:
+                raise ValueError("trailing ',' in JSON array")
+            return
+        if ch == ",":
+            if expect_value:
+                raise ValueError("unexpected ',' in JSON array")
+            pos += 1
+            expect_value = True
+            continue
+        if not expect_value:
+            raise ValueError("expected ',' between JSON array elements")
+        while True:
+            try:
+                value, end = _decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if len(buf) - pos <= max_element and fill():
+                    continue
+                if len(buf) - pos > max_element:
+                    raise ValueError(f"JSON array element {count} is longer than {max_element} characters")
+                raise
+            # A number at the very end of the buffer may continue in the next chunk.
+            if end == len(buf) and not eof and fill():
+                continue
+            break
+        pos = end
+        expect_value = False
+        count += 1
+        yield value
+
+
+def iter_records(stream: BinaryIO, mimetype: str = "") -> Iterator[object]:
+    if mimetype in NDJSON_TYPES:
+        return iter_ndjson(stream)
+    head = stream.read(1)
+    while head and head.isspace():
+        head = stream.read(1)
+    rest = _Prepend(head, stream)
+    if head == b"[":
+        return iter_json_array(rest)
+    return iter_ndjson(rest)
+
+
+class _Prepend:
+    def __init__(self, head: bytes, stream: BinaryIO):
+        self._head = head
+        self._stream = stream
+
+    def read(self, size: int = -1) -> bytes:
+        if self._head:
+            head, self._head = self._head, b""
+            return head
+        return self._stream.read(size)
@@ -0,0 +1,101 @@
+import argparse
+import os
+import sys
+import threading
+import time
+from contextlib import nullcontext
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+os.environ.setdefault("SUBSCRIBER_DB", "memory")
+os.environ.setdefault("BROADCAST_DB", ":memory:")
+os.environ.setdefault("BROADCAST_CONCURRENCY", "16")
+os.environ["BROADCAST_RATE"] = "0"
+
+import app as chatbot  # noqa: E402
+from admission import BROADCAST, AdmissionController  # noqa: E402
+from loadtest import generate_corpus, summarize  # noqa: E402
+
+
+# Stands in for the per-recipient work of a real send (rendering, HTTP
+# client, TLS): pure Python, so it competes with handlers for the GIL.
+def busy_send(cost: float):
+    def send(phone: str, text: str) -> None:
+        end = time.perf_counter() + cost
+        while time.perf_counter() < end:
+            pass
+    return send
+
+
+def surge(records: List[dict], threads: int, seconds: float) -> Dict[str, object]:
+    latencies: List[float] = []
+    shed = [0]
+    lock = threading.Lock()
+    stop = time.perf_counter() + seconds
+
+    def client(mine: List[dict]) -> None:
+        i = 0
+        while time.perf_counter() < stop:
+            rec = mine[i % len(mine)]
+            i += 1
+            t0 = time.perf_counter()
+            result = chatbot.handle_webhook_payload({"phone": rec["phone"], "text": rec["text"]})
+            elapsed = time.perf_counter() - t0
+            with lock:
+                latencies.append(elapsed)
+                shed[0] += result.get("intent") == "busy"
+
+    workers = [threading.Thread(target=client, args=(records[i::threads],)) for i in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return {"latencies": latencies, "shed": shed[0]}
+
+
+def run(name: str, admission: Optional[AdmissionController], args) -> None:
+    chatbot.ADMISSION = admission if admission is not None else AdmissionController(
+        max_concurrency=10 ** 6, min_concurrency=10 ** 6, shares=(1.0, 1.0, 1.0),
+    )
+    chatbot.BROADCASTS.admit = (lambda: chatbot.ADMISSION.slot(BROADCAST)) if admission is not None else nullcontext
+    records = list(generate_corpus(5000, seed=31))
+    job_id = chatbot.BROADCASTS.submit({"en": "Outbreak announcement"})
+    time.sleep(0.2)
+    before = chatbot.BROADCASTS.status(job_id)["sent"]
+    result = surge(records, args.threads, args.seconds)
+    sent = chatbot.BROADCASTS.status(job_id)["sent"] - before
+    # Let the job finish so the next run starts from a quiet engine.
+    chatbot.BROADCASTS.admit = nullcontext
+    while chatbot.BROADCASTS.active():
+        time.sleep(0.05)
+    lat = summarize(result["latencies"], 1e3, "ms")
+    n = len(result["latencies"])
+    limit = f"{chatbot.ADMISSION.limit:6.1f}" if admission is not None else "     -"
+    print(f"  {name:<14} {n / args.seconds:8.0f} req/s   p50 {lat['p50_ms']:7.2f} ms   p99 {lat['p99_ms']:7.2f} ms"
+          f"   shed {result['shed'] / max(n, 1):6.1%}   broadcast {sent / args.seconds:7.0f}/s   limit {limit}")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Interactive latency during a broadcast, with and without admission")
+    parser.add_argument("--subscribers", type=int, default=200000)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--send-cost", type=float, default=0.0005)
+    parser.add_argument("--target-ms", type=float, default=20.0)
+    args = parser.parse_args(argv)
+
+    chatbot.send_message = lambda phone, text: None
+    chatbot.SUBSCRIBERS.bulk_import((f"91{7000000000 + i}", "en", None) for i in range(args.subscribers))
+    chatbot.BROADCASTS.send = busy_send(args.send_cost)
+
+    print(f"{args.threads} interactive clients for {args.seconds:.0f}s during a broadcast"
+          f" ({os.environ['BROADCAST_CONCURRENCY']} send threads, {args.send_cost * 1e3:.1f} ms CPU per send)")
+    run("no admission", None, args)
+    run("admission", AdmissionController(max_concurrency=64, min_concurrency=4, target_latency=args.target_ms / 1e3,
+                                         queue_timeout=args.target_ms / 1e3), args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from aiohttp import ClientSession, TCPConnector, web  # noqa: E402
+
+import app as chatbot  # noqa: E402
+from async_app import AsyncChatbot, create_app, stub_sender  # noqa: E402
+from loadtest import generate_corpus, summarize  # noqa: E402
+
+
+def report(name: str, n: int, elapsed: float, latencies: List[float]) -> None:
+    lat = summarize(latencies, 1e3, "ms")
+    print(f"  {name:<28} {n / elapsed:9.0f} msg/s   p50 {lat['p50_ms']:8.1f} ms   p99 {lat['p99_ms']:8.1f} ms")
+
+
+def run_sync(records: List[dict], threads: int, latency: float) -> None:
+    def send(phone: str, text: str) -> None:
+        time.sleep(latency)
+
+    def one(rec: dict) -> float:
+        t0 = time.perf_counter()
+        chatbot.handle_message(rec["phone"], rec["text"], rec.get("pincode"), endpoint="bench")
+        return time.perf_counter() - t0
+
+    original, chatbot.send_message = chatbot.send_message, send
+    try:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            t0 = time.perf_counter()
+            latencies = list(pool.map(one, records))
+            elapsed = time.perf_counter() - t0
+    finally:
+        chatbot.send_message = original
+    report(f"sync, {threads} threads", len(records), elapsed, latencies)
+
+
+async def _conversations(records: List[dict], conversations: int, call, drain=None):
+    latencies: List[float] = []
+
+    async def conversation(mine: List[dict]) -> None:
+        for rec in mine:
+            t0 = time.perf_counter()
+            await call(rec)
+            latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(conversation(records[i::conversations]) for i in range(conversations)))
+    # Replies are sent in the background; throughput counts them as done once sent.
+    if drain is not None:
+        await drain()
+    return time.perf_counter() - t0, latencies
+
+
+async def run_async(records: List[dict], conversations: int, latency: float) -> None:
+    bot = AsyncChatbot(send=stub_sender(latency))
+
+    async def call(rec: dict) -> None:
+        await bot.handle_message(rec["phone"], rec["text"], rec.get("pincode"), endpoint="bench")
+
+    elapsed, latencies = await _conversations(records, conversations, call, bot.drain)
+    report(f"async handler, {conversations} conv", len(records), elapsed, latencies)
+
+
+# Client and server share one process and loop, so this is bounded by a single core.
+async def run_async_http(records: List[dict], conversations: int, latency: float) -> None:
+    bot = AsyncChatbot(send=stub_sender(latency))
+    runner = web.AppRunner(create_app(bot), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0, backlog=conversations)
+    await site.start()
+    port = runner.addresses[0][1]
+    url = f"http://127.0.0.1:{port}/webhook"
+    try:
+        async with ClientSession(connector=TCPConnector(limit=conversations)) as session:
+            async def call(rec: dict) -> None:
+                async with session.post(url, json=rec) as resp:
+                    await resp.read()
+
+            elapsed, latencies = await _conversations(records, conversations, call, bot.drain)
+    finally:
+        await runner.cleanup()
+    report(f"async HTTP, {conversations} conv", len(records), elapsed, latencies)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Sync vs async handle_message with a slow stubbed send")
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--conversations", type=int, default=5000)
+    parser.add_argument("--threads", type=int, default=64)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--skip-http", action="store_true")
+    args = parser.parse_args(argv)
+
+    records = list(generate_corpus(args.messages, seed=5))
+    print(f"{args.messages} messages, send latency {args.latency * 1e3:.0f} ms")
+    # The thread pool is slow by construction, so it gets ten rounds instead of the full corpus.
+    run_sync(records[: args.threads * 10], args.threads, args.latency)
+    asyncio.run(run_async(records, args.conversations, args.latency))
+    if not args.skip_http:
+        asyncio.run(run_async_http(records, args.conversations, args.latency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in a fresh interpreter: wall time of `import app`, then the cost of
+# the first lookup per language (lazy pack decode) when the tree has a pack.
+CHILD = """
+import json, time
+t0 = time.perf_counter()
+import app
+out = {"import_ms": (time.perf_counter() - t0) * 1e3, "first_use_ms": {}}
+pack = getattr(app, "PACK", None)
+if pack is not None:
+    for lang in pack.langs:
+        t = time.perf_counter()
+        pack.get(lang).matcher.best("fever", "help")
+        out["first_use_ms"][lang] = (time.perf_counter() - t) * 1e3
+print("RESULT " + json.dumps(out))
+"""
+
+
+def run_child(tree: str, workdir: str, extra_env: Optional[Dict[str, str]] = None) -> dict:
+    env = dict(os.environ, PYTHONPATH=tree, SUBSCRIBER_DB="memory",
+               BROADCAST_DB=os.path.join(workdir, "jobs.db"), METRICS_ENABLED="1")
+    env.update(extra_env or {})
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", CHILD], cwd=workdir, env=env,
+                          capture_output=True, text=True, check=True)
+    result = {}
+    for line in proc.stdout.splitlines():
+        if line.startswith("RESULT "):
+            result = json.loads(line[len("RESULT "):])
+    # -X importtime: "import time: self_us | cumulative_us | name"
+    for line in proc.stderr.splitlines():
+        parts = [p.strip() for p in line.split("|")]
+        if len(parts) == 3 and parts[2] == "app":
+            result["app_self_ms"] = int(parts[0].split(":")[1]) / 1e3
+    return result
+
+
+def summarize(runs: List[dict]) -> dict:
+    out = {
+        "import_ms": round(statistics.median(r["import_ms"] for r in runs), 2),
+        "app_self_ms": round(statistics.median(r.get("app_self_ms", 0.0) for r in runs), 2),
+    }
+    langs = runs[0].get("first_use_ms", {})
+    if langs:
+        out["first_use_ms"] = {
+            lang: round(statistics.median(r["first_use_ms"][lang] for r in runs), 3) for lang in langs
+        }
+    return out
+
+
+def export_tree(rev: str, dest: str) -> str:
+    archive = subprocess.run(["git", "-C", ROOT, "archive", rev], capture_output=True, check=True).stdout
+    subprocess.run(["tar", "-x", "-C", dest], input=archive, check=True)
+    return dest
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Cold-start time of a fresh worker importing app.py")
+    parser.add_argument("--runs", type=int, default=9)
+    parser.add_argument("--rev", help="also measure this git revision (e.g. the commit before the pack)")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        scenarios = {
+            # The artifact exists and is newer than the source.
+            "pack": (ROOT, {}),
+            # No writable artifact: the pack is compiled from JSON on every start.
+            "source_only": (ROOT, {"KNOWLEDGE_PACK": os.path.join(tmp, "missing", "knowledge.pack")}),
+        }
+        if args.rev:
+            scenarios[args.rev] = (export_tree(args.rev, tempfile.mkdtemp(dir=tmp)), {})
+        run_child(ROOT, tmp)  # builds data/knowledge.pack if it is stale
+        results = {}
+        for name, (tree, env) in scenarios.items():
+            results[name] = summarize([run_child(tree, tmp, env) for _ in range(args.runs)])
+
+    print(f"cold start, median of {args.runs} fresh interpreters")
+    for name, res in results.items():
+        print(f"  {name:<14} import {res['import_ms']:8.2f} ms   app.py itself {res['app_self_ms']:7.2f} ms")
+        for lang, ms in res.get("first_use_ms", {}).items():
+            print(f"  {'':<14}   first {lang} lookup {ms:6.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
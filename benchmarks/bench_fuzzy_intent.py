@@ -0,0 +1,98 @@
+import argparse
+import os
+import random
+import string
+import sys
+import time
+from typing import List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import app as chatbot  # noqa: E402
+from fuzzy_intent import MIN_KEYWORD, FuzzyIntentClassifier  # noqa: E402
+from loadtest import TEMPLATES, generate_corpus  # noqa: E402
+
+NEUTRAL = [
+    "is the clinic open on sunday", "thanks a lot", "could you tell me more", "where is the nearest hospital",
+    "what should i do now", "ok", "my mother is worried", "which documents do i need", "good morning",
+]
+
+
+def typo(word: str, rng: random.Random) -> str:
+    i = rng.randrange(1, len(word) - 1)
+    edit = rng.choice(["drop", "swap", "double", "replace"])
+    if edit == "drop":
+        return word[:i] + word[i + 1:]
+    if edit == "swap":
+        return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+    if edit == "double":
+        return word[:i] + word[i] + word[i:]
+    return word[:i] + rng.choice(string.ascii_lowercase) + word[i + 1:]
+
+
+# English messages with one edit in the keyword, labelled with its intent.
+def misspelled(n: int, seed: int) -> List[Tuple[str, str]]:
+    rng = random.Random(seed)
+    pairs = [(intent, kw) for intent, kws in chatbot.PACK.get("en").keywords.items()
+             for kw in kws if len(kw) >= MIN_KEYWORD and " " not in kw]
+    out = []
+    for _ in range(n):
+        intent, kw = rng.choice(pairs)
+        out.append((rng.choice(TEMPLATES["en"]).format(kw=typo(kw, rng)), intent))
+    return out
+
+
+def per_message(texts: List[str]) -> float:
+    t0 = time.perf_counter()
+    for text in texts:
+        chatbot.classify(text)
+    return (time.perf_counter() - t0) / len(texts)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Keyword vs fuzzy n-gram intent classification")
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--batch", type=int, default=10000)
+    parser.add_argument("--threshold", type=float, default=0.5)
+    args = parser.parse_args(argv)
+
+    corpus = [rec["text"] for rec in generate_corpus(args.messages, seed=21)]
+    typos = misspelled(args.messages, seed=22)
+    fuzzy = FuzzyIntentClassifier(chatbot.fuzzy_keywords, threshold=args.threshold)
+    for lang in chatbot.LANGS:
+        fuzzy.prototypes(lang)
+
+    results = {}
+    for name, classifier in (("keyword", None), ("fuzzy", fuzzy)):
+        chatbot.FUZZY = classifier
+        per_message(corpus[:500])
+        right = sum(chatbot.classify(text)[1] == intent for text, intent in typos)
+        neutral_hits = sum(chatbot.classify(text)[1] not in ("help", "greet") for text in NEUTRAL)
+        results[name] = (per_message(corpus), per_message([t for t, _ in typos]), right, neutral_hits)
+    chatbot.FUZZY = None
+
+    print(f"classify(), {args.messages} messages each, threshold {args.threshold}")
+    print(f"  {'':<8} {'corpus us/msg':>14} {'typo us/msg':>12} {'typos right':>12} {'neutral misfires':>17}")
+    for name, (corpus_s, typo_s, right, neutral_hits) in results.items():
+        print(f"  {name:<8} {corpus_s * 1e6:14.1f} {typo_s * 1e6:12.1f} {right / len(typos):12.1%}"
+              f" {neutral_hits:>11}/{len(NEUTRAL)}")
+
+    batch = [t for t, _ in typos] * (args.batch // len(typos) + 1)
+    batch = batch[: args.batch]
+    fuzzy.clear()
+    t0 = time.perf_counter()
+    batched = fuzzy.classify_batch("en", batch)
+    elapsed = time.perf_counter() - t0
+    # Both start from empty word caches; classify() fills its cache as it goes.
+    fuzzy.clear()
+    t0 = time.perf_counter()
+    single = [fuzzy.classify("en", text) for text in batch]
+    one_by_one = time.perf_counter() - t0
+    assert batched == single
+    print(f"{len(batch)} misspelled messages, cold caches: classify_batch {len(batch) / elapsed:9.0f} msg/s,"
+          f" classify() {len(batch) / one_by_one:9.0f} msg/s")
+
+
+if __name__ == "__main__":
+    main()
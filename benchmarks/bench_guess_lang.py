@@ -0,0 +1,70 @@
+import os
+import sys
+import timeit
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lang_detect import detect_lang  # noqa: E402
+
+
+def legacy_guess_lang(text: str) -> str:
+    if text is None:
+        return "en"
+    t = text.strip().lower()
+    if len(t) == 0:
+        return "en"
+    hi_hints = ["namaste", "नमस्ते", "खांसी", "बुखार", "टीका", "टीकाकरण", "स्वास्थ्य"]
+    te_hints = ["నమస్తే", "జ్వరం", "దగ్గు", "టీకా", "ఆరోగ్యం"]
+    kn_hints = ["ನಮಸ್ಕಾರ", "ಜ್ವರ", "ಕೆಮ್ಮು", "ಲಸಿಕೆ", "ಆರೋಗ್ಯ"]
+    ta_hints = ["வணக்கம்", "காய்ச்சல்", "இருமல்", "தடுப்பூசி", "ஆரோக்கியம்"]
+    if any(ch in t for ch in "अआइईउऊएऐओऔकखगघचछजझटठडढतथदधनपफबभमयरलवशषसहािंीुूेैोौंः"):
+        return "hi"
+    if any(ch in t for ch in "అఆఇఈఉఊఎఏఐఒఔకఖగఘఙచఛజఝఞటఠడఢణతథదధనపఫబభమయరలవశషసహాిీుూెేైొోౌంః"):
+        return "te"
+    if any(ch in t for ch in "ಅಆಇಈಉಊಎಏಐಒಓಔಕಖಗಘಙಚಛಜಝಞಟಠಡಢಣತಥದಧನಪಫಬಭಮಯರಲವಶಷಸಹಾಿೀುೂೃೆೇೈೊೋೌಂಃ"):
+        return "kn"
+    if any(ch in t for ch in "அஆஇஈஉஊஎஏஐஒஓஔகஙசஞடணதநபமயரலவழளறஸஷஹாிீுூெேைொோௌம்ஂஃ"):
+        return "ta"
+    if any(w in t for w in hi_hints):
+        return "hi"
+    if any(w in t for w in te_hints):
+        return "te"
+    if any(w in t for w in kn_hints):
+        return "kn"
+    if any(w in t for w in ta_hints):
+        return "ta"
+    return "en"
+
+
+SAMPLES: Dict[str, str] = {
+    "en": "please share the vaccine schedule for my daughter, she has fever and cough. ",
+    "hi": "मेरे बच्चे को बुखार और खांसी है, टीकाकरण शेड्यूल बताइए। ",
+    "ta": "என் குழந்தைக்கு காய்ச்சல் மற்றும் இருமல் உள்ளது, தடுப்பூசி அட்டவணை சொல்லுங்கள். ",
+    "kn": "ನನ್ನ ಮಗುವಿಗೆ ಜ್ವರ ಮತ್ತು ಕೆಮ್ಮು ಇದೆ, ಲಸಿಕೆ ವೇಳಾಪಟ್ಟಿ ತಿಳಿಸಿ. ",
+}
+
+
+def make_text(seed: str, length: int) -> str:
+    return (seed * (length // len(seed) + 1))[:length]
+
+
+def per_call_us(fn: Callable[[str], object], text: str) -> float:
+    timer = timeit.Timer(lambda: fn(text))
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat=5, number=number))
+    return best / number * 1e6
+
+
+def main(lengths: List[int]) -> None:
+    print(f"{'sample':<8}{'chars':>7}{'legacy us':>12}{'detect us':>12}{'speedup':>9}")
+    for name, seed in SAMPLES.items():
+        for n in lengths:
+            text = make_text(seed, n)
+            old = per_call_us(legacy_guess_lang, text)
+            new = per_call_us(detect_lang, text)
+            print(f"{name:<8}{n:>7}{old:>12.2f}{new:>12.2f}{old / new:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [10, 100, 4000])
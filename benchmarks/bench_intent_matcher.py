@@ -0,0 +1,82 @@
+import os
+import random
+import string
+import sys
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from intent_matcher import IntentMatcher  # noqa: E402
+
+BASE: Dict[str, List[str]] = {
+    "greet": ["hi", "hello", "hey", "namaste"],
+    "preventive": ["prevention", "prevent", "wash", "mask", "avoid"],
+    "symptoms": ["symptom", "fever", "cough", "cold", "headache"],
+    "vaccine": ["vaccine", "vaccination", "schedule", "dose", "immunization"],
+    "outbreak": ["outbreak", "alert", "cases", "disease spread"],
+    "help": ["help", "menu"],
+}
+
+MESSAGES = [
+    "hello",
+    "my son has fever and a bad cough since yesterday",
+    "what is the vaccine schedule for a 2 year old",
+    "are there dengue cases near 560001",
+    "how do i prevent malaria in the monsoon season",
+    "ok thanks " * 40,
+]
+
+
+def legacy_intent(lang_map: Dict[str, List[str]], t: str) -> str:
+    intent = "help"
+    for k_intent, kws in lang_map.items():
+        for k in kws:
+            if k in t:
+                intent = k_intent
+                break
+        if intent != "help":
+            break
+    return intent
+
+
+def grow(extra: int, rng: random.Random) -> Dict[str, List[str]]:
+    table = {intent: list(kws) for intent, kws in BASE.items()}
+    intents = list(table)
+    for _ in range(extra):
+        word = "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(6, 12)))
+        table[rng.choice(intents)].append(word)
+    return table
+
+
+def percentiles(samples: List[float]) -> str:
+    samples.sort()
+    p50 = samples[len(samples) // 2] * 1e6
+    p99 = samples[int(len(samples) * 0.99)] * 1e6
+    return f"{p50:>9.1f}{p99:>9.1f}"
+
+
+def run(fn, rounds: int) -> List[float]:
+    samples = []
+    for _ in range(rounds):
+        for msg in MESSAGES:
+            t0 = time.perf_counter()
+            fn(msg)
+            samples.append(time.perf_counter() - t0)
+    return samples
+
+
+def main() -> None:
+    rng = random.Random(7)
+    print(f"{'keywords':>9}{'legacy p50':>11}{'p99':>9}{'ac p50':>9}{'p99':>9}  (us)")
+    for extra in (0, 100, 1000, 5000):
+        table = grow(extra, rng)
+        matcher = IntentMatcher(table)
+        total = sum(len(v) for v in table.values())
+        legacy = run(lambda t: legacy_intent(table, t), 300)
+        ac = run(lambda t: matcher.best(t), 300)
+        print(f"{total:>9}{percentiles(legacy):>20}{percentiles(ac):>18}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+import contextlib
+import io
+import os
+import sys
+import time
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import app as chatbot  # noqa: E402
+from loadtest import generate_corpus  # noqa: E402
+
+
+def run(records: List[dict], rounds: int) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        for rec in records:
+            chatbot.handle_message(rec["phone"], rec["text"], rec.get("pincode"), endpoint="bench")
+        best = min(best, time.perf_counter() - t0)
+    return best / len(records) * 1e6
+
+
+def main(n: int = 5000, rounds: int = 5) -> None:
+    records = list(generate_corpus(n, seed=3))
+    with contextlib.redirect_stdout(io.StringIO()):
+        chatbot.METRICS.enabled = False
+        off = run(records, rounds)
+        chatbot.METRICS.enabled = True
+        on = run(records, rounds)
+    print(f"handle_message over {n} messages (best of {rounds})")
+    print(f"  metrics off: {off:8.2f} us/msg")
+    print(f"  metrics on:  {on:8.2f} us/msg  (+{on - off:.2f} us, {100 * (on - off) / off:.1f}%)")
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:3]])
@@ -0,0 +1,66 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+from typing import List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+os.environ.setdefault("SUBSCRIBER_DB", "memory")
+os.environ.setdefault("BROADCAST_DB", ":memory:")
+
+import app as chatbot  # noqa: E402
+from loadtest import generate_corpus  # noqa: E402
+from profiling import RequestProfiler  # noqa: E402
+
+
+def per_message(records: List[dict], profiler: Optional[RequestProfiler]) -> float:
+    t0 = time.perf_counter()
+    for rec in records:
+        profiling = False
+        if profiler is not None:
+            profiler.poll()
+            if profiler.enabled:
+                profiling = profiler.begin({})
+        chatbot.handle_message(rec["phone"], rec["text"], rec.get("pincode"))
+        if profiling:
+            profiler.end(endpoint="/webhook")
+    return (time.perf_counter() - t0) / len(records)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Cost of the request profiler when off and when profiling")
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--hook-calls", type=int, default=1000000)
+    args = parser.parse_args(argv)
+
+    chatbot.send_message = lambda phone, text: None
+    records = list(generate_corpus(args.messages, seed=41))
+    directory = tempfile.mkdtemp(prefix="bench-profiles-")
+    profiler = RequestProfiler(directory=directory, backend=chatbot.STATE)
+
+    # What every request pays while nothing is armed.
+    t0 = time.perf_counter()
+    for _ in range(args.hook_calls):
+        profiler.poll()
+        if profiler.enabled:
+            profiler.begin({})
+    hook = (time.perf_counter() - t0) / args.hook_calls
+    print(f"request hooks, profiler off: {hook * 1e9:.0f} ns/request")
+
+    per_message(records[:500], None)
+    base = per_message(records, None)
+    off = per_message(records, profiler)
+    profiler.start(3600, 1.0)
+    on = per_message(records, profiler)
+    profiler.stop()
+    print(f"handle_message, {len(records)} messages:")
+    print(f"  no profiler      {base * 1e6:8.1f} us/msg")
+    print(f"  profiler off     {off * 1e6:8.1f} us/msg")
+    print(f"  every request    {on * 1e6:8.1f} us/msg  ({on / base:.1f}x), written to {directory}")
+
+
+if __name__ == "__main__":
+    main()
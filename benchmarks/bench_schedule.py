@@ -0,0 +1,63 @@
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from typing import Callable, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as chatbot  # noqa: E402
+from knowledge import DEFAULT_SOURCE  # noqa: E402
+from schedule import build_schedule  # noqa: E402
+
+PHRASES = ["{n} days", "{n} weeks", "{n} months", "{n} years", "{n}", "{n} महीने", "{n} saal", "{n} నెలలు", "{n}-month-old"]
+
+
+def messages(n: int, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    return [f"vaccine for my child, {rng.choice(PHRASES).format(n=rng.randint(0, 70))}" for _ in range(n)]
+
+
+def timed(name: str, fn: Callable[[], None], n: int) -> float:
+    t0 = time.perf_counter()
+    fn()
+    per = (time.perf_counter() - t0) / n
+    print(f"  {name:<36} {per * 1e6:8.2f} us/msg")
+    return per
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Vaccine schedule: interval index and pre-rendered replies")
+    parser.add_argument("--messages", type=int, default=50000)
+    parser.add_argument("--lang", default="en")
+    args = parser.parse_args(argv)
+
+    with open(DEFAULT_SOURCE, encoding="utf-8") as fp:
+        source = json.load(fp)
+    lang = args.lang
+    index = chatbot.PACK.vaccine_schedule
+    content = chatbot.PACK.get(lang)
+    texts = messages(args.messages, seed=5)
+    ages = [index.extract_age_days(t) for t in texts]
+    ages = [a for a in ages if a is not None]
+    print(f"{len(index.starts)} schedule intervals, {len(ages)} ages out of {len(texts)} messages")
+
+    # Rendering the interval on every request: what the reply cache saves
+    # on a hit, and what a miss would cost without pre-rendering.
+    def render_each() -> None:
+        for a in ages:
+            starts, replies = build_schedule(source["vaccine_schedule"], {lang: source["langs"][lang]})
+            replies[lang][len([s for s in starts if s <= a]) - 1]
+
+    timed("extract age", lambda: [index.extract_age_days(t) for t in texts], len(texts))
+    timed("linear scan + pre-rendered", lambda: [
+        content.schedule_replies[len([s for s in index.starts if s <= a]) - 1] for a in ages
+    ], len(ages))
+    timed("bisect + pre-rendered", lambda: [content.schedule_replies[index.band(a)] for a in ages], len(ages))
+    timed("render per request", render_each, len(ages))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+from typing import List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sessions import BYTES_PER_SESSION, SessionStore  # noqa: E402
+
+LANGS = ["en", "hi", "te", "kn", "ta"]
+INTENTS = ["greet", "preventive", "symptoms", "vaccine", "outbreak", "help"]
+
+
+def phones(n: int, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    return [f"91{rng.randrange(6000000000, 9999999999)}" for _ in range(n)]
+
+
+# Bytes held by the store per session, measured with tracemalloc. Phones
+# arrive as "+91...", so the key the store keeps is allocated while tracing.
+def measure_size(numbers: List[str], pincode_share: float, seed: int) -> float:
+    rng = random.Random(seed)
+    store = SessionStore(max_sessions=len(numbers), ttl=3600)
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for phone in numbers:
+        pincode = str(rng.randrange(110001, 855999)) if rng.random() < pincode_share else None
+        store.update("+" + phone, rng.choice(LANGS), rng.choice(INTENTS), pincode)
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    assert len(store) == len(numbers)
+    return (after - before) / len(numbers)
+
+
+# The obvious layout, for comparison: str keys, a dict per session, str pincodes.
+def measure_naive_size(numbers: List[str], pincode_share: float, seed: int) -> float:
+    rng = random.Random(seed)
+    store = {}
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for phone in numbers:
+        pincode = str(rng.randrange(110001, 855999)) if rng.random() < pincode_share else None
+        store["+" + phone] = {"lang": rng.choice(LANGS), "intent": rng.choice(INTENTS),
+                              "pincode": pincode, "touched": time.monotonic()}
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / len(numbers)
+
+
+def measure_speed(numbers: List[str], ops: int, seed: int) -> None:
+    rng = random.Random(seed)
+    store = SessionStore(max_sessions=len(numbers) // 2, ttl=3600)
+    picks = [rng.choice(numbers) for _ in range(ops)]
+    t0 = time.perf_counter()
+    for phone in picks:
+        store.update(phone, "hi", "vaccine", None)
+    t1 = time.perf_counter()
+    for phone in picks:
+        store.get(phone)
+    t2 = time.perf_counter()
+    print(f"  update {(t1 - t0) / ops * 1e9:7.0f} ns/op   get {(t2 - t1) / ops * 1e9:7.0f} ns/op"
+          f"   (cap {store.max_sessions}, evicted {store.evicted})")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Session store size per entry and get/update cost")
+    parser.add_argument("--users", type=int, default=1000000)
+    parser.add_argument("--pincode-share", type=float, default=0.5)
+    parser.add_argument("--ops", type=int, default=500000)
+    args = parser.parse_args(argv)
+
+    numbers = list(dict.fromkeys(phones(args.users, seed=11)))
+    per = measure_size(numbers, args.pincode_share, seed=12)
+    print(f"{len(numbers)} sessions, {args.pincode_share:.0%} with a pincode")
+    print(f"  {per:7.1f} bytes/session   {per * len(numbers) / 2 ** 20:8.1f} MiB total"
+          f"   (BYTES_PER_SESSION = {BYTES_PER_SESSION})")
+    naive = measure_naive_size(numbers, args.pincode_share, seed=12)
+    print(f"  {naive:7.1f} bytes/session with a dict per session and str keys")
+    measure_speed(numbers, args.ops, seed=13)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import argparse
+import os
+import sys
+import time
+from typing import Callable, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from twilio.twiml.messaging_response import MessagingResponse  # noqa: E402
+
+import app as chatbot  # noqa: E402
+from loadtest import generate_corpus  # noqa: E402
+from twiml import render_message  # noqa: E402
+
+
+def object_builder(text: str) -> bytes:
+    resp = MessagingResponse()
+    resp.message(text)
+    return str(resp).encode("utf-8")
+
+
+def timed(name: str, fn: Callable[[], None], n: int) -> float:
+    t0 = time.perf_counter()
+    fn()
+    per = (time.perf_counter() - t0) / n
+    print(f"  {name:<34} {per * 1e6:8.2f} us/reply")
+    return per
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="TwiML rendering: MessagingResponse vs pre-rendered bytes")
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--requests", type=int, default=3000)
+    args = parser.parse_args(argv)
+
+    # Classify the corpus once, so only the TwiML step is timed below.
+    turns = []
+    for rec in generate_corpus(args.messages, seed=9):
+        lang, intent, age = chatbot.classify(rec["text"], rec.get("lang"))
+        key, ttl, pincode = chatbot.reply_key(lang, intent, age, rec.get("pincode"))
+        static = age is None and intent != "outbreak"
+        turns.append((lang, intent, static, chatbot.render_reply(lang, intent, age, pincode)))
+    static_share = sum(t[2] for t in turns) / len(turns)
+    print(f"{len(turns)} replies, {static_share:.0%} static")
+
+    for lang, intent, static, reply in turns:
+        body = chatbot.TWIML_REPLIES.get(lang, intent) if static else render_message(reply)
+        assert body == object_builder(reply), (lang, intent)
+
+    n = len(turns)
+    old = timed("MessagingResponse", lambda: [object_builder(t[3]) for t in turns], n)
+    new = timed("pre-rendered + escaping template", lambda: [
+        chatbot.TWIML_REPLIES.get(lang, intent) if static else render_message(reply)
+        for lang, intent, static, reply in turns
+    ], n)
+    timed("escaping template only", lambda: [render_message(t[3]) for t in turns], n)
+    print(f"  speedup {old / new:.1f}x")
+
+    # End to end through Flask, the pre-rendered endpoint against a
+    # MessagingResponse handler on the same pipeline.
+    @chatbot.app.route("/bench/twiml-object", methods=["POST"])
+    def object_endpoint():
+        form = chatbot.request.form
+        result = chatbot.handle_twiml_message(form.get("WaId", ""), form.get("Body", ""), endpoint="bench")
+        reply = result["reply"]
+        if reply is None:
+            reply = chatbot.compose_reply(result["lang"], result["intent"], None, None)
+        return chatbot.Response(object_builder(reply), mimetype="application/xml")
+
+    client = chatbot.app.test_client()
+    records = list(generate_corpus(args.requests, seed=10))
+    for path in ("/bench/twiml-object", "/twilio/twiml"):
+        t0 = time.perf_counter()
+        for i, rec in enumerate(records):
+            client.post(path, data={"WaId": f"91{i:010d}", "Body": rec["text"]})
+        print(f"  {path:<34} {len(records) / (time.perf_counter() - t0):8.0f} req/s")
+
+
+if __name__ == "__main__":
+    main()
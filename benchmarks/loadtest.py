@@ -0,0 +1,283 @@
+import argparse
+import contextlib
+import http.client
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import app as chatbot  # noqa: E402
+
+TEMPLATES: Dict[str, List[str]] = {
+    "en": ["{kw}", "what about {kw}?", "my child has {kw} since yesterday", "please tell me about {kw}"],
+    "hi": ["{kw}", "{kw} के बारे में बताइए", "मेरे बच्चे को {kw} है", "कृपया {kw} की जानकारी दें"],
+    "te": ["{kw}", "{kw} గురించి చెప్పండి", "నా బిడ్డకు {kw} ఉంది"],
+    "kn": ["{kw}", "{kw} ಬಗ್ಗೆ ತಿಳಿಸಿ", "ನನ್ನ ಮಗುವಿಗೆ {kw} ಇದೆ"],
+    "ta": ["{kw}", "{kw} பற்றி சொல்லுங்கள்", "என் குழந்தைக்கு {kw} உள்ளது"],
+}
+UNMATCHED = {
+    "en": "is the clinic open on sunday",
+    "hi": "क्या क्लिनिक रविवार को खुला है",
+    "te": "ఆదివారం క్లినిక్ తెరిచి ఉందా",
+    "kn": "ಭಾನುವಾರ ಕ್ಲಿನಿಕ್ ತೆರೆದಿದೆಯೇ",
+    "ta": "ஞாயிறு அன்று மருத்துவமனை திறந்திருக்குமா",
+}
+AGES = [0, 1, 2, 5, 10, 16, 30, 65]
+PINCODES = ["560001", "560034", "500032", "600004", "110001", "400001", "682001", "751001"]
+STAGES = ["guess_lang", "intent", "extract_age", "format_reply", "send"]
+
+
+def generate_corpus(n: int, seed: int = 1, twilio_share: float = 0.3) -> Iterator[dict]:
+    rng = random.Random(seed)
+    for i in range(n):
+        lang = rng.choice(chatbot.LANGS)
+        keywords = chatbot.PACK.get(lang).keywords
+        roll = rng.random()
+        if roll < 0.08:
+            text = UNMATCHED[lang]
+        else:
+            intent = rng.choice(list(keywords))
+            text = rng.choice(TEMPLATES[lang]).format(kw=rng.choice(keywords[intent]))
+            if intent == "vaccine" and rng.random() < 0.5:
+                text += f" {rng.choice(AGES)}"
+            if roll > 0.97:
+                text = (text + " ") * 60
+        rec = {
+            "endpoint": "/twilio" if rng.random() < twilio_share else "/webhook",
+            "phone": f"91{rng.randrange(10 ** 9, 10 ** 10)}",
+            "text": text,
+        }
+        if rng.random() < 0.5:
+            rec["pincode"] = rng.choice(PINCODES)
+        yield rec
+
+
+def read_jsonl(path: str) -> Iterator[dict]:
+    with open(path, encoding="utf-8") as fp:
+        for line in fp:
+            line = line.strip()
+            if line:
+                rec = json.loads(line)
+                rec.setdefault("endpoint", "/webhook")
+                yield rec
+
+
+def request_for(rec: dict) -> Tuple[str, bytes, str]:
+    endpoint = rec.get("endpoint", "/webhook")
+    if endpoint == "/twilio":
+        form = {
+            "From": f"whatsapp:+{rec['phone']}",
+            "WaId": rec["phone"],
+            "Body": rec["text"],
+            "MessageSid": rec.get("message_sid") or "SM" + uuid.uuid4().hex,
+        }
+        return endpoint, urlencode(form).encode(), "application/x-www-form-urlencoded"
+    if endpoint == "/admin/broadcast":
+        body = {k: v for k, v in rec.items() if k.startswith("message_")} or {"message_en": rec.get("text", "")}
+        return endpoint, json.dumps(body).encode(), "application/json"
+    body = {k: rec[k] for k in ("phone", "text", "pincode", "lang", "message_id") if k in rec}
+    return endpoint, json.dumps(body, ensure_ascii=False).encode(), "application/json"
+
+
+class InProcessClient:
+    def __init__(self):
+        self._local = threading.local()
+
+    def post(self, path: str, body: bytes, content_type: str) -> int:
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = chatbot.app.test_client()
+        return client.post(path, data=body, content_type=content_type).status_code
+
+
+class HttpClient:
+    def __init__(self, base_url: str):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname or "127.0.0.1"
+        self.port = parts.port or 80
+        self.prefix = parts.path.rstrip("/")
+        self._local = threading.local()
+
+    def post(self, path: str, body: bytes, content_type: str) -> int:
+        for attempt in (0, 1):
+            conn = getattr(self._local, "conn", None)
+            if conn is None:
+                conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            try:
+                conn.request("POST", self.prefix + path, body=body, headers={"Content-Type": content_type})
+                resp = conn.getresponse()
+                resp.read()
+                return resp.status
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                self._local.conn = None
+                if attempt:
+                    return 599
+        return 599
+
+
+def percentile(sorted_samples: List[float], q: float) -> float:
+    if not sorted_samples:
+        return 0.0
+    idx = min(len(sorted_samples) - 1, max(0, int(round(q * len(sorted_samples) + 0.5)) - 1))
+    return sorted_samples[idx]
+
+
+def summarize(samples: List[float], scale: float, unit: str) -> Dict[str, float]:
+    s = sorted(samples)
+    return {
+        "count": len(s),
+        f"mean_{unit}": round(sum(s) / len(s) * scale, 3) if s else 0.0,
+        f"p50_{unit}": round(percentile(s, 0.50) * scale, 3),
+        f"p95_{unit}": round(percentile(s, 0.95) * scale, 3),
+        f"p99_{unit}": round(percentile(s, 0.99) * scale, 3),
+        f"max_{unit}": round(s[-1] * scale, 3) if s else 0.0,
+    }
+
+
+def run_load(client, records: List[dict], concurrency: int) -> Dict[str, object]:
+    lock = threading.Lock()
+    latencies: Dict[str, List[float]] = {}
+    errors: Dict[str, int] = {}
+
+    def one(rec: dict) -> None:
+        path, body, ctype = request_for(rec)
+        t0 = time.perf_counter()
+        status = client.post(path, body, ctype)
+        dt = time.perf_counter() - t0
+        with lock:
+            latencies.setdefault(path, []).append(dt)
+            if status >= 400:
+                errors[path] = errors.get(path, 0) + 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, records))
+    elapsed = time.perf_counter() - started
+    every = [x for xs in latencies.values() for x in xs]
+    report: Dict[str, object] = {
+        "overall": {"elapsed_s": round(elapsed, 3), "rps": round(len(every) / elapsed, 1),
+                    "errors": sum(errors.values()), **summarize(every, 1e3, "ms")},
+        "endpoints": {},
+    }
+    for path, xs in sorted(latencies.items()):
+        report["endpoints"][path] = {"rps": round(len(xs) / elapsed, 1), "errors": errors.get(path, 0),
+                                     **summarize(xs, 1e3, "ms")}
+    return report
+
+
+# Stage timings are taken in-process by calling each step of handle_message
+# directly, in the same order, so they can be compared across commits even
+# when the HTTP numbers are dominated by the server.
+def stage_profile(records: List[dict]) -> Dict[str, Dict[str, float]]:
+    samples: Dict[str, List[float]] = {name: [] for name in STAGES}
+    clock = time.perf_counter
+    for rec in records:
+        if rec.get("endpoint") == "/admin/broadcast":
+            continue
+        text = rec.get("text", "")
+        t0 = clock()
+        lang = chatbot.guess_lang(text)
+        t1 = clock()
+        intent = chatbot.PACK.get(lang).matcher.best(text.lower(), "help")
+        t2 = clock()
+        age = chatbot.extract_age_days(text)
+        t3 = clock()
+        reply = chatbot.render_reply(lang, intent, age, rec.get("pincode"))
+        t4 = clock()
+        chatbot.send_message(rec.get("phone", ""), reply)
+        t5 = clock()
+        for name, dt in zip(STAGES, (t1 - t0, t2 - t1, t3 - t2, t4 - t3, t5 - t4)):
+            samples[name].append(dt)
+    return {name: summarize(xs, 1e6, "us") for name, xs in samples.items()}
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, object]:
+    parser = argparse.ArgumentParser(description="Load test /webhook, /twilio and /admin/broadcast")
+    parser.add_argument("--mode", choices=["inproc", "http"], default="inproc")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="base URL for --mode http")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--twilio-share", type=float, default=0.3)
+    parser.add_argument("--broadcast-every", type=int, default=0, help="insert a broadcast every N requests")
+    parser.add_argument("--replay", help="replay a recorded JSONL traffic file instead of generating one")
+    parser.add_argument("--write-corpus", help="also write the request corpus to this JSONL file")
+    parser.add_argument("--out", help="result JSON path (default bench_results/loadtest-<commit>-<time>.json)")
+    args = parser.parse_args(argv)
+
+    if args.replay:
+        records = list(read_jsonl(args.replay))
+    else:
+        records = list(generate_corpus(args.requests, args.seed, args.twilio_share))
+    if args.broadcast_every:
+        for i in range(len(records) - 1, 0, -1):
+            if i % args.broadcast_every == 0:
+                records.insert(i, {"endpoint": "/admin/broadcast", "message_en": "Load test broadcast"})
+    if args.write_corpus:
+        with open(args.write_corpus, "w", encoding="utf-8") as fp:
+            for rec in records:
+                fp.write(json.dumps(rec, ensure_ascii=False) + "\n")
+
+    client = InProcessClient() if args.mode == "inproc" else HttpClient(args.url)
+    # The default sender prints every reply; keep that off the terminal.
+    with contextlib.redirect_stdout(io.StringIO()) as sink:
+        load = run_load(client, records, args.concurrency)
+        sink.truncate(0)
+        stages = stage_profile(records)
+
+    commit = git_commit()
+    result = {
+        "meta": {
+            "commit": commit,
+            "time": datetime.utcnow().isoformat(),
+            "mode": args.mode,
+            "url": args.url if args.mode == "http" else None,
+            "concurrency": args.concurrency,
+            "requests": len(records),
+            "source": args.replay or f"generated(seed={args.seed})",
+            "python": platform.python_version(),
+        },
+        **load,
+        "stages": stages,
+    }
+    out = args.out or os.path.join(
+        ROOT, "bench_results", f"loadtest-{commit or 'nogit'}-{datetime.utcnow():%Y%m%dT%H%M%S}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as fp:
+        json.dump(result, fp, indent=2)
+
+    o = result["overall"]
+    print(f"{len(records)} requests, c={args.concurrency}, {o['rps']} req/s, "
+          f"p50 {o['p50_ms']} ms, p95 {o['p95_ms']} ms, p99 {o['p99_ms']} ms, errors {o['errors']}")
+    for path, ep in result["endpoints"].items():
+        print(f"  {path:<18}{ep['rps']:>9} req/s  p50 {ep['p50_ms']:>8} ms  p99 {ep['p99_ms']:>8} ms  errors {ep['errors']}")
+    for name, st in stages.items():
+        print(f"  stage {name:<18} p50 {st['p50_us']:>9} us  p95 {st['p95_us']:>9} us  p99 {st['p99_us']:>9} us")
+    print(f"saved {out}")
+    return result
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,391 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime
+from typing import Callable, ContextManager, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from state import is_redis_url, redis_client
+
+Recipient = Tuple[int, str, str]
+RecipientSource = Callable[[int], Iterable[Recipient]]
+Sender = Callable[[str, str], None]
+
+
+class RateLimiter:
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(1.0, rate))
+        self._tokens = self.burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                wait = (1.0 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+JOB_FIELDS = ("id", "messages", "status", "total", "sent", "failed", "cursor", "created", "updated")
+
+
+# Jobs are leased: a worker must claim() a job before driving it, and each
+# progress() checkpoint renews the lease. A job whose worker died becomes
+# claimable again once its lease runs out.
+class JobStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._pid = -1
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS broadcast_jobs ("
+                " id TEXT PRIMARY KEY, messages TEXT NOT NULL, status TEXT NOT NULL,"
+                " total INTEGER NOT NULL, sent INTEGER NOT NULL DEFAULT 0,"
+                " failed INTEGER NOT NULL DEFAULT 0, cursor INTEGER NOT NULL DEFAULT -1,"
+                " created REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(broadcast_jobs)")}
+            if "owner" not in columns:
+                conn.execute("ALTER TABLE broadcast_jobs ADD COLUMN owner TEXT")
+                conn.execute("ALTER TABLE broadcast_jobs ADD COLUMN lease_until REAL NOT NULL DEFAULT 0")
+
+    # Called with _lock held. A forked worker opens its own connection.
+    def _connect(self) -> sqlite3.Connection:
+        if self._pid != os.getpid():
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._pid = os.getpid()
+        return self._conn
+
+    def claim(self, job_id: str, owner: str, lease: float) -> bool:
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE broadcast_jobs SET owner = ?, lease_until = ?"
+                " WHERE id = ? AND status IN ('queued', 'running')"
+                " AND (owner IS NULL OR owner = ? OR lease_until < ?)",
+                (owner, now + lease, job_id, owner, now),
+            )
+        return cur.rowcount > 0
+
+    def create(self, job_id: str, messages: Dict[str, str], total: int) -> None:
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT INTO broadcast_jobs (id, messages, status, total, created, updated)"
+                " VALUES (?, ?, 'queued', ?, ?, ?)",
+                (job_id, json.dumps(messages), total, now, now),
+            )
+
+    # With an owner, the write (and lease renewal) only happens while that
+    # owner still holds the job; False means the lease was lost.
+    def progress(self, job_id: str, status: str, cursor: int, sent: int, failed: int,
+                 owner: Optional[str] = None, lease: float = 0.0) -> bool:
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            if owner is None:
+                cur = conn.execute(
+                    "UPDATE broadcast_jobs SET status = ?, cursor = ?, sent = ?, failed = ?, updated = ?"
+                    " WHERE id = ?",
+                    (status, cursor, sent, failed, now, job_id),
+                )
+            else:
+                cur = conn.execute(
+                    "UPDATE broadcast_jobs SET status = ?, cursor = ?, sent = ?, failed = ?, updated = ?,"
+                    " lease_until = ? WHERE id = ? AND owner = ?",
+                    (status, cursor, sent, failed, now, now + lease, job_id, owner),
+                )
+        return cur.rowcount > 0
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._connect().execute(
+                f"SELECT {', '.join(JOB_FIELDS)} FROM broadcast_jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(JOB_FIELDS, row))
+        job["messages"] = json.loads(job["messages"])
+        return job
+
+    def unfinished(self) -> List[str]:
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT id FROM broadcast_jobs WHERE status IN ('queued', 'running') ORDER BY created"
+            ).fetchall()
+        return [r[0] for r in rows]
+
+
+class RedisJobStore:
+    def __init__(self, client, prefix: str = "chatbot:broadcast:"):
+        self.client = client
+        self.prefix = prefix
+
+    def _key(self, job_id: str) -> str:
+        return f"{self.prefix}job:{job_id}"
+
+    def create(self, job_id: str, messages: Dict[str, str], total: int) -> None:
+        now = time.time()
+        pipe = self.client.pipeline()
+        pipe.hset(self._key(job_id), mapping={
+            "id": job_id, "messages": json.dumps(messages), "status": "queued", "total": total,
+            "sent": 0, "failed": 0, "cursor": -1, "created": now, "updated": now, "owner": "", "lease_until": 0,
+        })
+        pipe.zadd(f"{self.prefix}unfinished", {job_id: now})
+        pipe.execute()
+
+    # Check-and-set under WATCH: the transaction is retried if another
+    # worker touches the job in between.
+    def _guarded(self, job_id: str, allowed: Callable[[Dict[bytes, bytes]], bool], mapping: Dict[str, object],
+                 done: bool = False) -> bool:
+        from redis.exceptions import WatchError
+
+        key = self._key(job_id)
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    job = pipe.hgetall(key)
+                    if not job or not allowed(job):
+                        pipe.unwatch()
+                        return False
+                    pipe.multi()
+                    pipe.hset(key, mapping=mapping)
+                    if done:
+                        pipe.zrem(f"{self.prefix}unfinished", job_id)
+                    pipe.execute()
+                    return True
+                except WatchError:
+                    continue
+
+    def claim(self, job_id: str, owner: str, lease: float) -> bool:
+        now = time.time()
+
+        def free(job: Dict[bytes, bytes]) -> bool:
+            holder = job.get(b"owner", b"").decode()
+            return job[b"status"] in (b"queued", b"running") and (
+                not holder or holder == owner or float(job.get(b"lease_until", 0)) < now
+            )
+
+        return self._guarded(job_id, free, {"owner": owner, "lease_until": now + lease})
+
+    def progress(self, job_id: str, status: str, cursor: int, sent: int, failed: int,
+                 owner: Optional[str] = None, lease: float = 0.0) -> bool:
+        now = time.time()
+        mapping: Dict[str, object] = {"status": status, "cursor": cursor, "sent": sent, "failed": failed, "updated": now}
+        if owner is not None:
+            mapping["lease_until"] = now + lease
+        return self._guarded(
+            job_id,
+            lambda job: owner is None or job.get(b"owner", b"").decode() == owner,
+            mapping,
+            done=status not in ("queued", "running"),
+        )
+
+    def get(self, job_id: str) -> Optional[dict]:
+        raw = self.client.hgetall(self._key(job_id))
+        if not raw:
+            return None
+        job = {k.decode(): v.decode() for k, v in raw.items() if k.decode() in JOB_FIELDS}
+        for name in ("total", "sent", "failed", "cursor"):
+            job[name] = int(job[name])
+        for name in ("created", "updated"):
+            job[name] = float(job[name])
+        job["messages"] = json.loads(job["messages"])
+        return job
+
+    def unfinished(self) -> List[str]:
+        return [job_id.decode() for job_id in self.client.zrange(f"{self.prefix}unfinished", 0, -1)]
+
+
+def open_job_store(url: str):
+    if is_redis_url(url):
+        return RedisJobStore(redis_client(url))
+    return JobStore(url)
+
+
+# Jobs running in this process, shared by every engine so a job is never
+# driven twice even if resume_pending is called more than once.
+_ACTIVE: Dict[str, threading.Thread] = {}
+_ACTIVE_LOCK = threading.Lock()
+
+
+class BroadcastEngine:
+    def __init__(
+        self,
+        recipients: RecipientSource,
+        count: Callable[[], int],
+        send: Sender,
+        store: JobStore,
+        concurrency: int = 8,
+        rate: float = 20.0,
+        batch_size: int = 200,
+        lease: float = 60.0,
+        admit: Callable[[], ContextManager] = nullcontext,
+        log=None,
+    ):
+        self.recipients = recipients
+        self.count = count
+        self.send = send
+        self.store = store
+        self.batch_size = batch_size
+        self.lease = lease
+        # Entered around each send, e.g. to yield to interactive traffic.
+        self.admit = admit
+        # Optional DeliveryLog: one row per recipient, synced per batch.
+        self.log = log
+        self.limiter = RateLimiter(rate)
+        self._pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="broadcast")
+        self._watcher: Optional[threading.Thread] = None
+        self._owner_pid = -1
+        self._owner = ""
+
+    # Unique per process, so forked workers never share a lease.
+    @property
+    def owner(self) -> str:
+        if self._owner_pid != os.getpid():
+            self._owner_pid = os.getpid()
+            self._owner = f"{socket.gethostname()}:{self._owner_pid}:{uuid.uuid4().hex[:8]}"
+        return self._owner
+
+    def submit(self, messages: Dict[str, str]) -> str:
+        job_id = uuid.uuid4().hex
+        self.store.create(job_id, messages, self.count())
+        self._start(job_id)
+        return job_id
+
+    def status(self, job_id: str) -> Optional[dict]:
+        job = self.store.get(job_id)
+        if job is None:
+            return None
+        done = job["sent"] + job["failed"]
+        return {
+            "job_id": job["id"],
+            "status": job["status"],
+            "total": job["total"],
+            "sent": job["sent"],
+            "failed": job["failed"],
+            "pending": max(0, job["total"] - done) if job["status"] != "done" else 0,
+            "created": datetime.utcfromtimestamp(job["created"]).isoformat(),
+            "updated": datetime.utcfromtimestamp(job["updated"]).isoformat(),
+        }
+
+    def active(self) -> List[dict]:
+        with _ACTIVE_LOCK:
+            job_ids = list(_ACTIVE)
+        return [s for s in map(self.status, job_ids) if s is not None]
+
+    def resume_pending(self) -> List[str]:
+        resumed = []
+        for job_id in self.store.unfinished():
+            if self._start(job_id):
+                resumed.append(job_id)
+        return resumed
+
+    # Periodically adopts jobs whose owner stopped renewing its lease.
+    def watch(self, interval: Optional[float] = None) -> None:
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+        interval = interval if interval is not None else self.lease / 2
+
+        def loop() -> None:
+            while True:
+                time.sleep(interval)
+                try:
+                    self.resume_pending()
+                except Exception as exc:
+                    print(f"[BROADCAST] resume failed: {type(exc).__name__}: {exc}")
+
+        self._watcher = threading.Thread(target=loop, name="broadcast-watch", daemon=True)
+        self._watcher.start()
+
+    def _start(self, job_id: str) -> bool:
+        with _ACTIVE_LOCK:
+            if job_id in _ACTIVE:
+                return False
+            if not self.store.claim(job_id, self.owner, self.lease):
+                return False
+            worker = threading.Thread(target=self._run, args=(job_id,), name=f"broadcast-{job_id[:8]}", daemon=True)
+            _ACTIVE[job_id] = worker
+        worker.start()
+        return True
+
+    def _deliver(self, messages: Dict[str, str], item: Recipient) -> bool:
+        _, phone, lang = item
+        text = messages.get(lang) or messages.get("en", "")
+        self.limiter.acquire()
+        with self.admit():
+            try:
+                self.send(phone, text)
+            except Exception:
+                return False
+        return True
+
+    def _batches(self, cursor: int) -> Iterator[List[Recipient]]:
+        batch: List[Recipient] = []
+        for item in self.recipients(cursor):
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _run(self, job_id: str) -> None:
+        try:
+            job = self.store.get(job_id)
+            if job is None:
+                return
+            messages = job["messages"]
+            owner, lease = self.owner, self.lease
+            cursor, sent, failed = job["cursor"], job["sent"], job["failed"]
+            if not self.store.progress(job_id, "running", cursor, sent, failed, owner, lease):
+                return
+            writer = self.log.open(job_id, cursor) if self.log is not None else None
+            try:
+                # Progress is checkpointed once per batch, so a restart re-sends
+                # at most one batch and the counters stay consistent with cursor.
+                # The batch's log rows are synced before the checkpoint.
+                for batch in self._batches(cursor):
+                    results = list(self._pool.map(lambda item: self._deliver(messages, item), batch))
+                    ok = sum(results)
+                    sent += ok
+                    failed += len(results) - ok
+                    cursor = batch[-1][0]
+                    if writer is not None:
+                        # Renewing the lease first means a worker that lost
+                        # the job never appends rows its successor re-sends.
+                        if not self.store.claim(job_id, owner, lease):
+                            print(f"[BROADCAST] lost the lease on {job_id}, another worker took over")
+                            return
+                        writer.append(batch, results)
+                        writer.sync()
+                    if not self.store.progress(job_id, "running", cursor, sent, failed, owner, lease):
+                        print(f"[BROADCAST] lost the lease on {job_id}, another worker took over")
+                        return
+            finally:
+                if writer is not None:
+                    writer.close()
+            self.store.progress(job_id, "done", cursor, sent, failed, owner, lease)
+        except Exception:
+            job = self.store.get(job_id)
+            if job is not None:
+                self.store.progress(job_id, "failed", job["cursor"], job["sent"], job["failed"], self.owner)
+            raise
+        finally:
+            with _ACTIVE_LOCK:
+                _ACTIVE.pop(job_id, None)
@@ -0,0 +1,117 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from state import MemoryBackend, SQLiteBackend, StateBackend, open_state
+
+NEW = "new"
+PENDING = "pending"
+DONE = "done"
+
+
+class IdempotencyStore:
+    def __init__(self, backend: StateBackend, ttl: float = 3600.0, pending_ttl: float = 60.0,
+                 prefix: str = "dedup:"):
+        self.backend = backend
+        self.ttl = ttl
+        # A claim whose worker died is released after pending_ttl.
+        self.pending_ttl = pending_ttl
+        self.prefix = prefix
+        self.hits = 0
+        self.in_flight = 0
+        self.misses = 0
+
+    def begin(self, key: str) -> Tuple[str, Any]:
+        key = self.prefix + key
+        # add() is the atomic claim; the loop covers an entry expiring
+        # between a failed claim and the read.
+        for _ in range(3):
+            if self.backend.add(key, [PENDING, None], self.pending_ttl):
+                state, result = NEW, None
+                break
+            entry = self.backend.get(key)
+            if entry is not None:
+                state, result = entry
+                break
+        else:
+            state, result = PENDING, None
+        self._count(state)
+        return state, result
+
+    def finish(self, key: str, result: Any) -> None:
+        self.backend.set(self.prefix + key, [DONE, result], self.ttl)
+
+    def abort(self, key: str) -> None:
+        self.backend.delete(self.prefix + key)
+
+    def size(self) -> Optional[int]:
+        return self.backend.size()
+
+    def _count(self, state: str) -> None:
+        if state == DONE:
+            self.hits += 1
+        elif state == PENDING:
+            self.in_flight += 1
+        else:
+            self.misses += 1
+
+    def run_once(self, key: Optional[str], process: Callable[[], Any], pending: Any = None) -> Any:
+        if not key:
+            return process()
+        state, cached = self.begin(key)
+        if state == DONE:
+            return cached
+        if state == PENDING:
+            return pending
+        try:
+            result = process()
+        except Exception:
+            self.abort(key)
+            raise
+        self.finish(key, result)
+        return result
+
+    # SQLite and Redis calls block, so off the event loop they go; the
+    # in-memory backend is called directly.
+    async def _call(self, fn: Callable[..., Any], *args: Any) -> Any:
+        if self.backend.kind == "memory":
+            return fn(*args)
+        return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+    async def run_once_async(self, key: Optional[str], process: Callable[[], Awaitable[Any]],
+                             pending: Any = None) -> Any:
+        if not key:
+            return await process()
+        state, cached = await self._call(self.begin, key)
+        if state == DONE:
+            return cached
+        if state == PENDING:
+            return pending
+        try:
+            result = await process()
+        except BaseException:
+            await self._call(self.abort, key)
+            raise
+        await self._call(self.finish, key, result)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.in_flight + self.misses
+        return {
+            "backend": self.backend.kind,
+            "size": self.size(),
+            "hits": self.hits,
+            "in_flight_hits": self.in_flight,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.in_flight) / lookups, 4) if lookups else 0.0,
+        }
+
+
+# backend is "memory", "sqlite" (stored at path) or any open_state() URL,
+# e.g. redis://host:6379/0 to share entries between hosts.
+def idempotency_store(backend: str, path: str = "dedup.db", maxsize: int = 100000,
+                      ttl: float = 3600.0) -> IdempotencyStore:
+    if backend == "sqlite":
+        return IdempotencyStore(SQLiteBackend(path), ttl=ttl)
+    if backend in ("", "memory"):
+        return IdempotencyStore(MemoryBackend(maxsize), ttl=ttl)
+    return IdempotencyStore(open_state(backend, maxsize), ttl=ttl)
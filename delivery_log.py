@@ -0,0 +1,118 @@
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from broadcast import Recipient
+
+HEADER = b"id,phone,lang,status,ts\n"
+FIELDS = ("id", "phone", "lang", "status", "ts")
+# Bytes a single read() may scan while looking for matching rows, so a
+# filter that matches nothing still returns promptly with a cursor.
+SCAN_LIMIT = 4 << 20
+
+
+def _clean(value: str) -> str:
+    return value.replace(",", "").replace("\n", "").replace("\r", "")
+
+
+# Append-only CSV log of delivery outcomes for one job, in recipient order.
+# Rows are buffered and made durable by sync(), which the engine calls once
+# per batch before checkpointing the cursor.
+class JobLogWriter:
+    def __init__(self, path: str, cursor: int, fsync: bool = True):
+        self.path = path
+        self.fsync = fsync
+        self._fp = open(path, "a+b")
+        self._truncate_after(cursor)
+        if self._fp.tell() == 0:
+            self._fp.write(HEADER)
+
+    # A resumed job re-sends everything after its checkpoint, so rows past
+    # the cursor (and any torn last line) are dropped before appending.
+    def _truncate_after(self, cursor: int) -> None:
+        self._fp.seek(0)
+        keep = 0
+        for line in self._fp:
+            if not line.endswith(b"\n"):
+                break
+            if line != HEADER and int(line.split(b",", 1)[0]) > cursor:
+                break
+            keep += len(line)
+        self._fp.truncate(keep)
+        self._fp.seek(keep)
+
+    def append(self, batch: Iterable[Recipient], results: Iterable[bool]) -> None:
+        ts = int(time.time())
+        self._fp.write("".join(
+            f"{rid},{_clean(phone)},{_clean(lang)},{'sent' if ok else 'failed'},{ts}\n"
+            for (rid, phone, lang), ok in zip(batch, results)
+        ).encode("utf-8"))
+
+    def sync(self) -> None:
+        self._fp.flush()
+        if self.fsync:
+            os.fsync(self._fp.fileno())
+
+    def close(self) -> None:
+        self.sync()
+        self._fp.close()
+
+
+class DeliveryLog:
+    def __init__(self, directory: str, fsync: bool = True):
+        self.directory = directory
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, job_id: str) -> str:
+        # Job ids are uuid hex; anything else must not escape the directory.
+        if not job_id.isalnum():
+            raise ValueError(f"invalid job id {job_id!r}")
+        return os.path.join(self.directory, f"{job_id}.csv")
+
+    def open(self, job_id: str, cursor: int) -> JobLogWriter:
+        with self._lock:
+            return JobLogWriter(self.path(job_id), cursor, self.fsync)
+
+    # Up to `limit` rows matching the filters, starting at byte offset
+    # `after` (0 = start). Returns the rows and the offset to continue from;
+    # the offset equals the file size once everything written so far is read.
+    # An offset that is not the start of a row (a cursor from another job,
+    # or from before a resumed job dropped its unsynced rows) is a ValueError.
+    def read(self, job_id: str, status: Optional[str] = None, lang: Optional[str] = None,
+             after: int = 0, limit: int = 1000) -> Tuple[List[Dict[str, object]], int]:
+        rows: List[Dict[str, object]] = []
+        try:
+            fp = open(self.path(job_id), "rb")
+        except FileNotFoundError:
+            return rows, after
+        with fp:
+            if after < 0:
+                raise ValueError(f"cursor {after} is not the start of a row")
+            if after > 0:
+                fp.seek(after - 1)
+                if fp.read(1) != b"\n":
+                    raise ValueError(f"cursor {after} is not the start of a row; restart from 0")
+            fp.seek(after)
+            offset = after
+            while len(rows) < limit and offset - after < SCAN_LIMIT:
+                line = fp.readline()
+                if not line.endswith(b"\n"):
+                    # End of file, or a row still being written.
+                    break
+                offset += len(line)
+                if line == HEADER:
+                    continue
+                rid, phone, row_lang, row_status, ts = line[:-1].decode("utf-8").split(",")
+                if (status is None or row_status == status) and (lang is None or row_lang == lang):
+                    rows.append({"id": int(rid), "phone": phone, "lang": row_lang,
+                                 "status": row_status, "ts": int(ts)})
+        return rows, offset
+
+    def size(self, job_id: str) -> int:
+        try:
+            return os.path.getsize(self.path(job_id))
+        except FileNotFoundError:
+            return 0
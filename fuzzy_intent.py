@@ -0,0 +1,178 @@
+import string
+import zlib
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # optional: INTENT_CLASSIFIER=fuzzy needs it
+    np = None
+
+# Character 2- and 3-grams of " word ", hashed into DIM buckets. crc32
+# rather than hash() so scores do not change with PYTHONHASHSEED.
+DIM = 2048
+NGRAMS = (2, 3)
+# Shorter keywords and words are only matched exactly: at four letters a
+# single shared bigram is enough to confuse "cold" with "could".
+MIN_KEYWORD = 5
+MIN_WORD = 4
+# Long forwarded texts are scored on their first MAX_WORDS words.
+MAX_WORDS = 64
+# Distinct words scored per numpy pass in predict().
+CHUNK = 4096
+# Per-language cache of word scores for classify(); cleared when full.
+WORD_CACHE = 50000
+
+_STRIP = string.punctuation + string.digits + "।॥“”‘’…"
+
+
+@lru_cache(maxsize=65536)
+def word_grams(word: str) -> Tuple[int, ...]:
+    padded = f" {word} "
+    return tuple(
+        zlib.crc32(padded[i:i + n].encode("utf-8")) % DIM
+        for n in NGRAMS
+        for i in range(len(padded) - n + 1)
+    )
+
+
+@lru_cache(maxsize=65536)
+def _gram_index(word: str) -> "np.ndarray":
+    return np.array(word_grams(word), dtype=np.intp)
+
+
+@lru_cache(maxsize=65536)
+def _word_norm(word: str) -> float:
+    counts: Dict[int, int] = {}
+    for g in word_grams(word):
+        counts[g] = counts.get(g, 0) + 1
+    return sum(c * c for c in counts.values()) ** 0.5
+
+
+def words(text: str) -> List[str]:
+    out = []
+    for w in text.lower().split()[:MAX_WORDS]:
+        w = w.strip(_STRIP)
+        if len(w) >= MIN_WORD:
+            out.append(w)
+    return out
+
+
+# One normalized n-gram vector per keyword, as columns, with the keywords
+# of each intent next to each other so scores can be max-pooled per intent.
+# A word's dot product with every keyword is the sum of the matrix rows of
+# its n-grams, so words are never expanded into DIM-wide vectors.
+class Prototypes:
+    def __init__(self, keywords: Dict[str, List[str]]):
+        self.intents: List[str] = []
+        self.starts: List[int] = []
+        columns: List[Tuple[int, ...]] = []
+        for intent, kws in keywords.items():
+            kept = [word_grams(k.lower()) for k in kws if len(k) >= MIN_KEYWORD]
+            if not kept:
+                continue
+            self.intents.append(intent)
+            self.starts.append(len(columns))
+            columns.extend(kept)
+        self._cache: Dict[str, "np.ndarray"] = {}
+        self.matrix = np.zeros((DIM, max(len(columns), 1)), dtype=np.float32)
+        for col, grams in enumerate(columns):
+            np.add.at(self.matrix[:, col], list(grams), 1.0)
+        self.matrix /= np.maximum(np.linalg.norm(self.matrix, axis=0), 1e-9)
+
+    # Words -> (words x intents) best cosine per intent.
+    def score(self, batch: Sequence[str]) -> "np.ndarray":
+        grams: List[int] = []
+        offsets: List[int] = []
+        for w in batch:
+            offsets.append(len(grams))
+            grams.extend(word_grams(w))
+        dots = np.add.reduceat(self.matrix[grams], offsets, axis=0)
+        dots /= np.array([_word_norm(w) for w in batch], dtype=np.float32)[:, None]
+        return np.maximum.reduceat(dots, self.starts, axis=1)
+
+    # One word -> best cosine per intent, cached: the same few hundred words
+    # make up most messages.
+    def word_score(self, word: str) -> "np.ndarray":
+        scores = self._cache.get(word)
+        if scores is None:
+            dots = self.matrix[_gram_index(word)].sum(axis=0)
+            scores = np.maximum.reduceat(dots, self.starts) / _word_norm(word)
+            if len(self._cache) >= WORD_CACHE:
+                self._cache = {}
+            self._cache[word] = scores
+        return scores
+
+
+# Scores a message against keyword prototypes by character n-gram cosine
+# similarity. Each intent scores its best keyword against the message's
+# best word. An intent centroid would average unrelated keywords ("fever",
+# "cough") into a vector close to neither, so misspellings score low.
+class FuzzyIntentClassifier:
+    def __init__(self, keywords_for, threshold: float = 0.5):
+        if np is None:
+            raise RuntimeError("the fuzzy intent classifier needs numpy (pip install numpy)")
+        self._keywords_for = keywords_for
+        self.threshold = threshold
+        self._prototypes: Dict[str, Prototypes] = {}
+
+    def prototypes(self, lang: str) -> Prototypes:
+        protos = self._prototypes.get(lang)
+        if protos is None:
+            protos = self._prototypes[lang] = Prototypes(self._keywords_for(lang))
+        return protos
+
+    def clear(self) -> None:
+        self._prototypes = {}
+
+    # Best (intent, score) per text, all in one language. Texts without a
+    # scoreable word get ("", 0.0).
+    def predict(self, lang: str, texts: Sequence[str]) -> List[Tuple[str, float]]:
+        protos = self.prototypes(lang)
+        vocab: Dict[str, int] = {}
+        rows: List[List[int]] = []
+        for text in texts:
+            rows.append([vocab.setdefault(w, len(vocab)) for w in words(text or "")])
+        if not vocab or not protos.intents:
+            return [("", 0.0)] * len(texts)
+        vocab_list = list(vocab)
+        if len(vocab_list) <= CHUNK:
+            best = protos.score(vocab_list)
+        else:
+            best = np.concatenate([protos.score(vocab_list[lo:lo + CHUNK])
+                                   for lo in range(0, len(vocab_list), CHUNK)])
+        # Max over each text's words, for all texts with at least one word.
+        order = [i for row in rows for i in row]
+        offsets, pos = [], 0
+        for row in rows:
+            if row:
+                offsets.append(pos)
+                pos += len(row)
+        per_text = np.maximum.reduceat(best[order], offsets, axis=0)
+        top = per_text.argmax(axis=1)
+        scores = per_text[np.arange(len(top)), top]
+        out: List[Tuple[str, float]] = []
+        k = 0
+        for row in rows:
+            if row:
+                out.append((protos.intents[top[k]], float(scores[k])))
+                k += 1
+            else:
+                out.append(("", 0.0))
+        return out
+
+    def classify(self, lang: str, text: str) -> Optional[str]:
+        protos = self.prototypes(lang)
+        batch = words(text or "")
+        if not batch or not protos.intents:
+            return None
+        per_intent = protos.word_score(batch[0])
+        for w in batch[1:]:
+            per_intent = np.maximum(per_intent, protos.word_score(w))
+        top = int(per_intent.argmax())
+        return protos.intents[top] if per_intent[top] >= self.threshold else None
+
+    # None where the best score is under the threshold, so the caller keeps
+    # the keyword matcher's answer.
+    def classify_batch(self, lang: str, texts: Sequence[str]) -> List[Optional[str]]:
+        return [intent if score >= self.threshold else None for intent, score in self.predict(lang, texts)]
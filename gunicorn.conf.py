@@ -0,0 +1,33 @@
+import os
+
+# Production entry point:
+#   gunicorn -c gunicorn.conf.py app:app
+#   gunicorn -c gunicorn.conf.py async_app:app_factory --worker-class aiohttp.GunicornWebWorker
+#
+# The app is imported once in the master (preload_app) with CHATBOT_PREFORK=1,
+# which loads the knowledge pack and freezes it out of the GC; the forked
+# workers share those pages copy-on-write. Background threads (alert feed
+# watcher, outbound senders, broadcast jobs) only start in the workers.
+os.environ.setdefault("CHATBOT_PREFORK", "1")
+
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+threads = int(os.environ.get("WEB_THREADS", "4"))
+preload_app = True
+
+# Dedup, sessions, the profile window and reply-cache invalidations must be
+# shared by the workers, so the default here is a SQLite file rather than the
+# app's per-process "memory".
+os.environ.setdefault("STATE_URL", "state.db")
+_MEMORY = ("", "memory", ":memory:")
+if workers > 1:
+    for _name in ("STATE_URL", "DEDUP_BACKEND"):
+        if _name in os.environ and os.environ[_name] in _MEMORY:
+            raise RuntimeError(f"{_name}={os.environ[_name]!r} is per-process; use a SQLite path or redis:// "
+                               f"with {workers} workers")
+
+
+def post_fork(server, worker):
+    import app
+
+    app.start_background()
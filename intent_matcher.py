@@ -0,0 +1,103 @@
+import unicodedata
+from collections import deque
+from typing import Dict, List, Tuple
+
+# Keywords shorter than this must match a whole word ("hi" no longer fires
+# inside "this"); longer ones may carry a suffix ("symptom" -> "symptoms").
+STEM_MIN_LEN = 3
+
+
+def _is_word_char(ch: str) -> bool:
+    return unicodedata.category(ch)[0] in "LMN"
+
+
+class IntentMatcher:
+    def __init__(self, keywords: Dict[str, List[str]]):
+        self.intents: List[str] = list(keywords)
+        goto: List[Dict[str, int]] = [{}]
+        out: List[List[Tuple[int, int]]] = [[]]
+        for idx, intent in enumerate(self.intents):
+            for kw in keywords[intent]:
+                kw = kw.strip().lower()
+                if not kw:
+                    continue
+                state = 0
+                for ch in kw:
+                    nxt = goto[state].get(ch)
+                    if nxt is None:
+                        nxt = len(goto)
+                        goto[state][ch] = nxt
+                        goto.append({})
+                        out.append([])
+                    state = nxt
+                out[state].append((idx, len(kw)))
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0)
+                out[nxt] = out[nxt] + out[fail[nxt]]
+        self._goto = goto
+        self._fail = fail
+        self._out = out
+        self.size = len(goto)
+
+    # Plain lists and dicts, so a compiled automaton can be stored with
+    # marshal and restored without rebuilding it.
+    def export(self) -> Tuple[List[str], List[Dict[str, int]], List[int], List[List[Tuple[int, int]]]]:
+        return self.intents, self._goto, self._fail, self._out
+
+    @classmethod
+    def restore(cls, state) -> "IntentMatcher":
+        matcher = cls.__new__(cls)
+        intents, goto, fail, out = state
+        matcher.intents = list(intents)
+        matcher._goto = goto
+        matcher._fail = fail
+        matcher._out = out
+        matcher.size = len(goto)
+        return matcher
+
+    # `t` is expected to be lowercased already, as handle_message does.
+    def hits(self, t: str) -> List[Tuple[int, int, int]]:
+        goto = self._goto
+        fail = self._fail
+        out = self._out
+        n = len(t)
+        found: List[Tuple[int, int, int]] = []
+        state = 0
+        for i, ch in enumerate(t):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if not out[state]:
+                continue
+            end = i + 1
+            for idx, klen in out[state]:
+                start = end - klen
+                if start > 0 and _is_word_char(t[start - 1]):
+                    continue
+                if klen < STEM_MIN_LEN and end < n and _is_word_char(t[end]):
+                    continue
+                found.append((start, end, idx))
+        return found
+
+    def scores(self, t: str) -> List[Tuple[str, int]]:
+        totals: Dict[int, int] = {}
+        for start, end, idx in self.hits(t):
+            totals[idx] = totals.get(idx, 0) + end - start
+        ranked = sorted(totals.items(), key=lambda kv: (-kv[1], kv[0]))
+        return [(self.intents[idx], score) for idx, score in ranked]
+
+    def best(self, t: str, default: str = "help") -> str:
+        ranked = self.scores(t)
+        return ranked[0][0] if ranked else default
+
+
+def compile_intent_matchers(table: Dict[str, Dict[str, List[str]]]) -> Dict[str, IntentMatcher]:
+    return {lang: IntentMatcher(keywords) for lang, keywords in table.items()}
@@ -0,0 +1,284 @@
+import json
+import marshal
+import os
+import struct
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from intent_matcher import IntentMatcher
+from schedule import ScheduleIndex, build_schedule, unit_words
+
+# Layout: MAGIC, a 4-byte header length, a JSON header, then one marshal blob
+# per section. The header maps section names to (offset, length) so a
+# language is read and decoded only when it is first used.
+MAGIC = b"KPACK\x01"
+_HEADER_LEN = struct.Struct(">I")
+_PYTHON = list(sys.version_info[:2])
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SOURCE = os.path.join(HERE, "data", "knowledge.json")
+DEFAULT_ARTIFACT = os.path.join(HERE, "data", "knowledge.pack")
+
+LANG_FIELDS = ("keywords", "responses", "schedule_header", "schedule_labels", "age_units")
+
+
+class LangContent:
+    __slots__ = ("lang", "keywords", "responses", "schedule_header", "schedule_replies", "matcher")
+
+    def __init__(self, lang: str, section: dict):
+        self.lang = lang
+        self.keywords: Dict[str, List[str]] = section["keywords"]
+        self.responses: Dict[str, str] = section["responses"]
+        self.schedule_header: str = section["schedule_header"]
+        # One pre-rendered reply per schedule interval, see ScheduleIndex.
+        self.schedule_replies: List[str] = section["schedule_replies"]
+        self.matcher = IntentMatcher.restore(section["matcher"])
+
+
+def build_pack(source_path: str) -> bytes:
+    with open(source_path, encoding="utf-8") as fp:
+        source = json.load(fp)
+    langs = source["langs"]
+    default_lang = source.get("default_lang", "en")
+    if default_lang not in langs:
+        raise ValueError(f"default_lang {default_lang!r} has no content")
+    if "help" not in langs[default_lang].get("responses", {}):
+        raise ValueError(f"default_lang {default_lang!r} has no help response")
+    sections = {}
+    for lang, content in langs.items():
+        missing = [f for f in LANG_FIELDS if f not in content]
+        if missing:
+            raise ValueError(f"language {lang!r} is missing {', '.join(missing)}")
+    starts, replies = build_schedule(source["vaccine_schedule"], langs)
+    for lang, content in langs.items():
+        section = {f: content[f] for f in ("keywords", "responses", "schedule_header")}
+        section["schedule_replies"] = replies[lang]
+        section["matcher"] = IntentMatcher(content["keywords"]).export()
+        sections["lang:" + lang] = marshal.dumps(section)
+    sections["vaccine_schedule"] = marshal.dumps({"starts": starts, "units": unit_words(langs)})
+    index, offset = {}, 0
+    for name, blob in sections.items():
+        index[name] = [offset, len(blob)]
+        offset += len(blob)
+    header = json.dumps({
+        "version": str(source["version"]),
+        "default_lang": default_lang,
+        "langs": list(langs),
+        "python": _PYTHON,
+        "sections": index,
+    }).encode("utf-8")
+    return b"".join([MAGIC, _HEADER_LEN.pack(len(header)), header] + list(sections.values()))
+
+
+def write_pack(data: bytes, path: str) -> None:
+    tmp = f"{path}.tmp.{os.getpid()}"
+    with open(tmp, "wb") as fp:
+        fp.write(data)
+    os.replace(tmp, path)
+
+
+class KnowledgePack:
+    def __init__(self, path: Optional[str] = None, data: Optional[bytes] = None):
+        self.path = path
+        self._data = data
+        head = data if data is not None else self._read_head(path)
+        if not head.startswith(MAGIC):
+            raise ValueError(f"{path or 'data'} is not a knowledge pack")
+        start = len(MAGIC) + _HEADER_LEN.size
+        (size,) = _HEADER_LEN.unpack_from(head, len(MAGIC))
+        header = json.loads(head[start:start + size].decode("utf-8"))
+        # marshal output is only guaranteed to load on the version that wrote it.
+        if header["python"] != _PYTHON:
+            raise ValueError(f"knowledge pack was built for Python {header['python']}")
+        self._base = start + size
+        self._sections: Dict[str, List[int]] = header["sections"]
+        self.version: str = header["version"]
+        self.default_lang: str = header["default_lang"]
+        self.langs: List[str] = header["langs"]
+        self._loaded: Dict[str, LangContent] = {}
+        self._schedule: Optional[ScheduleIndex] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _read_head(path: str) -> bytes:
+        with open(path, "rb") as fp:
+            head = fp.read(len(MAGIC) + _HEADER_LEN.size)
+            if len(head) < len(MAGIC) + _HEADER_LEN.size:
+                return head
+            (size,) = _HEADER_LEN.unpack_from(head, len(MAGIC))
+            return head + fp.read(size)
+
+    def _section(self, name: str):
+        offset, length = self._sections[name]
+        offset += self._base
+        if self._data is not None:
+            blob = self._data[offset:offset + length]
+        else:
+            with open(self.path, "rb") as fp:
+                fp.seek(offset)
+                blob = fp.read(length)
+        return marshal.loads(blob)
+
+    def get(self, lang: str) -> LangContent:
+        content = self._loaded.get(lang)
+        if content is not None:
+            return content
+        if lang not in self.langs:
+            return self.get(self.default_lang)
+        with self._lock:
+            content = self._loaded.get(lang)
+            if content is None:
+                content = self._loaded[lang] = LangContent(lang, self._section("lang:" + lang))
+        return content
+
+    @property
+    def vaccine_schedule(self) -> ScheduleIndex:
+        if self._schedule is None:
+            self._schedule = ScheduleIndex(self._section("vaccine_schedule"))
+        return self._schedule
+
+    # Decodes everything up front, e.g. in a pre-fork master so workers
+    # share the tables instead of each building their own.
+    def preload(self) -> None:
+        for lang in self.langs:
+            self.get(lang)
+        self.vaccine_schedule
+
+    def stats(self) -> dict:
+        return {"version": self.version, "langs": self.langs, "loaded": sorted(self._loaded)}
+
+
+def _is_fresh(artifact: str, source: str) -> bool:
+    try:
+        built = os.stat(artifact).st_mtime_ns
+    except OSError:
+        return False
+    try:
+        return built >= os.stat(source).st_mtime_ns
+    except OSError:
+        # A deployment may ship only the compiled artifact.
+        return True
+
+
+def load_pack(artifact: str = DEFAULT_ARTIFACT, source: str = DEFAULT_SOURCE) -> KnowledgePack:
+    if _is_fresh(artifact, source):
+        try:
+            return KnowledgePack(artifact)
+        except (OSError, ValueError, KeyError):
+            pass
+    data = build_pack(source)
+    try:
+        write_pack(data, artifact)
+    except OSError:
+        pass
+    return KnowledgePack(artifact, data=data)
+
+
+# Rebuilds the pack when the source JSON (or, in a deployment that ships
+# only the artifact, the artifact) changes, or when reload() is called.
+# The new pack is built, validated and fully decoded on the calling thread
+# (the watcher, or an admin request), and only then handed to listeners.
+class PackReloader:
+    def __init__(self, artifact: str = DEFAULT_ARTIFACT, source: str = DEFAULT_SOURCE, poll_interval: float = 5.0):
+        self.artifact = artifact
+        self.source = source
+        self.poll_interval = poll_interval
+        self.reloads = 0
+        self.loaded_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._stamp = self._stat()
+        self._listeners: List[Callable[[KnowledgePack], None]] = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def _watched(self) -> str:
+        return self.source if os.path.exists(self.source) else self.artifact
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self._watched())
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def on_reload(self, fn: Callable[[KnowledgePack], None]) -> None:
+        self._listeners.append(fn)
+
+    def _build(self) -> KnowledgePack:
+        if os.path.exists(self.source):
+            data = build_pack(self.source)
+            try:
+                write_pack(data, self.artifact)
+            except OSError:
+                pass
+            pack = KnowledgePack(self.artifact, data=data)
+        else:
+            pack = KnowledgePack(self.artifact)
+        # Requests must never be the ones decoding a section.
+        pack.preload()
+        return pack
+
+    def reload(self, force: bool = True) -> bool:
+        with self._lock:
+            stamp = self._stat()
+            if not force and stamp == self._stamp:
+                # Already picked up, e.g. by an admin reload.
+                return False
+            try:
+                pack = self._build()
+            except Exception as exc:
+                # Any error in the new content (a short age_units list is an
+                # IndexError) keeps the current pack. Remember the broken
+                # file's stamp so the watcher waits for the next edit.
+                self._stamp = stamp
+                self.last_error = f"{type(exc).__name__}: {exc}"
+                print(f"[KNOWLEDGE] keeping current content, reload of {self._watched()} failed: {self.last_error}")
+                return False
+            self._stamp = stamp
+            self.reloads += 1
+            self.loaded_at = time.time()
+            self.last_error = None
+            for fn in self._listeners:
+                fn(pack)
+            return True
+
+    def start(self) -> None:
+        if self.poll_interval <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._watch, name="knowledge-watch", daemon=True)
+        self._thread.start()
+
+    def _watch(self) -> None:
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                stamp = self._stat()
+                if stamp is not None and stamp != self._stamp:
+                    self.reload(force=False)
+            except Exception as exc:
+                # A failing listener must not stop the watcher.
+                self.last_error = f"{type(exc).__name__}: {exc}"
+                print(f"[KNOWLEDGE] watcher error: {self.last_error}")
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "watching": self._watched() if self._thread is not None else None,
+            "reloads": self.reloads,
+            "loaded_at": self.loaded_at,
+            "last_error": self.last_error,
+        }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) in (2, 3, 4) and sys.argv[1] == "build":
+        src = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_SOURCE
+        out = sys.argv[3] if len(sys.argv) > 3 else DEFAULT_ARTIFACT
+        data = build_pack(src)
+        write_pack(data, out)
+        pack = KnowledgePack(out)
+        print(f"{out}: version {pack.version}, langs {','.join(pack.langs)}, {len(data)} bytes")
+    else:
+        print("usage: python knowledge.py build [SOURCE.json [OUT.pack]]")
+        sys.exit(2)
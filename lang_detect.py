@@ -0,0 +1,103 @@
+import re
+from typing import Dict, NamedTuple, Optional
+
+# Unicode blocks are 128 code points wide and aligned, so `ord(ch) >> 7`
+# identifies the block of a character with a single shift.
+SCRIPT_BLOCKS: Dict[int, str] = {
+    0x0900 >> 7: "hi",  # Devanagari
+    0x0B80 >> 7: "ta",  # Tamil
+    0x0C00 >> 7: "te",  # Telugu
+    0x0C80 >> 7: "kn",  # Kannada
+}
+
+ROMANIZED_HINTS: Dict[str, str] = {
+    "namaste": "hi",
+    "namaskar": "hi",
+    "bukhar": "hi",
+    "khansi": "hi",
+    "teeka": "hi",
+    "tika": "hi",
+    "swasthya": "hi",
+    "namaskaram": "te",
+    "jvaram": "te",
+    "jwaram": "te",
+    "daggu": "te",
+    "namaskara": "kn",
+    "jvara": "kn",
+    "jwara": "kn",
+    "kemmu": "kn",
+    "lasike": "kn",
+    "vanakkam": "ta",
+    "kaichal": "ta",
+    "irumal": "ta",
+    "thaduppoosi": "ta",
+}
+
+_LATIN_WORD = re.compile(r"[a-z]+")
+
+# Long forwarded messages are classified from an evenly strided sample, so
+# the per-message cost is bounded by these limits rather than by the length.
+SAMPLE_LIMIT = 64
+HINT_SCAN_LIMIT = 512
+
+
+class LangGuess(NamedTuple):
+    lang: str
+    confidence: float
+
+
+def _romanized_guess(text: str) -> LangGuess:
+    words = _LATIN_WORD.findall(text[:HINT_SCAN_LIMIT].lower())
+    votes: Dict[str, int] = {}
+    for w in words:
+        lang = ROMANIZED_HINTS.get(w)
+        if lang is not None:
+            votes[lang] = votes.get(lang, 0) + 1
+    if votes:
+        lang = max(votes, key=votes.__getitem__)
+        return LangGuess(lang, votes[lang] / len(words))
+    if words:
+        return LangGuess("en", 1.0)
+    return LangGuess("en", 0.0)
+
+
+def detect_lang(text: Optional[str]) -> LangGuess:
+    if not text:
+        return LangGuess("en", 0.0)
+    if text.isascii():
+        return _romanized_guess(text)
+    n = len(text)
+    sample = text if n <= SAMPLE_LIMIT else text[::-(-n // SAMPLE_LIMIT)]
+    counts = [0] * 32
+    latin = 0
+    for ch in sample:
+        o = ord(ch)
+        if o < 0x80:
+            if ch.isalpha():
+                latin += 1
+        elif o < 0x1000:
+            counts[o >> 7] += 1
+    indic = 0
+    best_lang = "en"
+    best = 0
+    for block, lang in SCRIPT_BLOCKS.items():
+        c = counts[block]
+        indic += c
+        if c > best:
+            best = c
+            best_lang = lang
+    if best:
+        return LangGuess(best_lang, best / (indic + latin))
+    return _romanized_guess(text)
+
+
+# Cheap check that text can stay in a language already known for the
+# sender: it can unless its first Indic character is from another script.
+def keeps_lang(text: Optional[str], lang: str) -> bool:
+    if not text or text.isascii():
+        return True
+    for ch in text:
+        script = SCRIPT_BLOCKS.get(ord(ch) >> 7)
+        if script is not None:
+            return script == lang
+    return True
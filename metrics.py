@@ -0,0 +1,206 @@
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+
+# Seconds; spans the microsecond-scale stages of handle_message up to slow sends.
+DEFAULT_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Iterable[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, registry: "Registry", name: str, help: str, labelnames: Sequence[str] = ()):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self.samples()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        if not self.registry.enabled:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, k)} {_fmt(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, *args, collect: Optional[Callable[[], Dict[LabelValues, float]]] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+        self._collect = collect
+
+    def set(self, value: float, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        if self._collect is not None:
+            values.update(self._collect())
+        return [f"{self.name}{_labels(self.labelnames, k)} {_fmt(v)}" for k, v in sorted(values.items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: one slot per bucket plus +Inf, then the running sum.
+        self._series: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        if not self.registry.enabled:
+            return
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            series[idx] += 1
+            series[-1] += value
+
+    def observe_many(self, pairs: Iterable[Tuple[float, LabelValues]]) -> None:
+        buckets = self.buckets
+        width = len(buckets) + 2
+        with self._lock:
+            for value, labels in pairs:
+                series = self._series.get(labels)
+                if series is None:
+                    series = self._series[labels] = [0] * width
+                series[bisect_left(buckets, value)] += 1
+                series[-1] += value
+
+    def timer(self):
+        if not self.registry.enabled:
+            return NULL_TIMER
+        return StageTimer(self)
+
+    def snapshot(self, *labels: str) -> Tuple[List[int], float]:
+        with self._lock:
+            series = list(self._series.get(labels, [0] * (len(self.buckets) + 2)))
+        return series[:-1], series[-1]
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        lines = []
+        bounds = list(self.buckets) + [float("inf")]
+        for key, series in items:
+            running = 0
+            for bound, n in zip(bounds, series):
+                running += n
+                le = 'le="%s"' % _fmt(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {running}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_fmt(series[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {running}")
+        return lines
+
+
+# Stage durations are buffered per request and written to the histogram
+# under a single lock acquisition in done().
+class StageTimer:
+    __slots__ = ("_hist", "_last", "_pairs")
+
+    def __init__(self, hist: Histogram):
+        self._hist = hist
+        self._pairs: List[Tuple[float, LabelValues]] = []
+        self._last = time.perf_counter()
+
+    def mark(self, stage: str) -> None:
+        now = time.perf_counter()
+        self._pairs.append((now - self._last, (stage,)))
+        self._last = now
+
+    def done(self) -> None:
+        self._hist.observe_many(self._pairs)
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def mark(self, stage: str) -> None:
+        pass
+
+    def done(self) -> None:
+        pass
+
+
+NULL_TIMER = _NullTimer()
+
+
+class Registry:
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> None:
+        self._metrics.append(metric)
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return Counter(self, name, help, labelnames)
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = (),
+              collect: Optional[Callable[[], Dict[LabelValues, float]]] = None) -> Gauge:
+        return Gauge(self, name, help, labelnames, collect=collect)
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return Histogram(self, name, help, labelnames, buckets=buckets)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
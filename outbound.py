@@ -0,0 +1,294 @@
+import base64
+import heapq
+import http.client
+import itertools
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from queue import Full, Queue
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+
+from broadcast import RateLimiter
+
+
+class DeliveryError(Exception):
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class HttpTransport:
+    def __init__(self, url: str, auth: Optional[Tuple[str, str]] = None, timeout: float = 10.0):
+        parts = urlsplit(url)
+        self.scheme = parts.scheme
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port
+        self.path = parts.path or "/"
+        if parts.query:
+            self.path += "?" + parts.query
+        self.timeout = timeout
+        self.headers = {"Content-Type": "application/x-www-form-urlencoded", "Connection": "keep-alive"}
+        if auth:
+            token = base64.b64encode(f"{auth[0]}:{auth[1]}".encode()).decode()
+            self.headers["Authorization"] = f"Basic {token}"
+        self._local = threading.local()
+
+    # One keep-alive connection per worker thread: the worker pool is the
+    # connection pool, and connections are only reopened after an error.
+    def _conn(self) -> http.client.HTTPConnection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            cls = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+            conn = cls(self.host, self.port, timeout=self.timeout)
+            self._local.conn = conn
+        return conn
+
+    def _reset(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+        self._local.conn = None
+
+    def post(self, form: Dict[str, str]) -> Tuple[int, bytes]:
+        body = urlencode(form).encode()
+        try:
+            conn = self._conn()
+            conn.request("POST", self.path, body=body, headers=self.headers)
+            resp = conn.getresponse()
+            data = resp.read()
+        except (OSError, http.client.HTTPException) as exc:
+            self._reset()
+            raise DeliveryError(f"{type(exc).__name__}: {exc}") from exc
+        if resp.getheader("Connection", "").lower() == "close":
+            self._reset()
+        return resp.status, data
+
+    def send(self, form: Dict[str, str]) -> None:
+        status, data = self.post(form)
+        if 200 <= status < 300:
+            return
+        detail = data[:200].decode("utf-8", "replace")
+        raise DeliveryError(f"HTTP {status}: {detail}", retryable=status == 429 or status >= 500)
+
+
+def whatsapp_form(from_number: str) -> Callable[[str, str], Dict[str, str]]:
+    def build(phone: str, text: str) -> Dict[str, str]:
+        to = phone if phone.startswith(("whatsapp:", "+")) else f"+{phone}"
+        if not to.startswith("whatsapp:"):
+            to = f"whatsapp:{to}"
+        return {"From": from_number, "To": to, "Body": text}
+    return build
+
+
+class OutboundQueue:
+    def __init__(
+        self,
+        transport: HttpTransport,
+        build: Callable[[str, str], Dict[str, str]],
+        workers: int = 4,
+        maxsize: int = 10000,
+        max_attempts: int = 5,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+        rate: float = 0.0,
+        dead_letter_path: Optional[str] = None,
+        bulk_share: float = 0.5,
+        bulk_timeout: float = 60.0,
+        autostart: bool = True,
+    ):
+        self.transport = transport
+        self.build = build
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.limiter = RateLimiter(rate)
+        self.dead_letter_path = dead_letter_path
+        self.dead_letters: Deque[dict] = deque(maxlen=1000)
+        self.sent = 0
+        self.retried = 0
+        self.dead = 0
+        self.dropped = 0
+        self.bulk_timed_out = 0
+        # Bulk (broadcast) sends may hold at most bulk_share of the queue, so
+        # the rest stays free for interactive replies.
+        self.bulk_timeout = bulk_timeout
+        self._bulk_slots = threading.BoundedSemaphore(max(1, int(maxsize * bulk_share))) if maxsize > 0 else None
+        self._queue: "Queue[Tuple[str, str, int, bool]]" = Queue(maxsize)
+        self._retry: List[Tuple[float, int, Tuple[str, str, int, bool]]] = []
+        self._seq = itertools.count()
+        self._pending = 0
+        self._cond = threading.Condition()
+        self.workers = workers
+        self._threads: List[threading.Thread] = []
+        if autostart:
+            self.start()
+
+    # Separate from __init__ so a pre-fork server can build the queue in the
+    # master and start the threads in each worker.
+    def start(self) -> None:
+        if self._threads:
+            return
+        self._threads = [
+            threading.Thread(target=self._work, name=f"outbound-{i}", daemon=True) for i in range(self.workers)
+        ]
+        self._threads.append(threading.Thread(target=self._schedule, name="outbound-retry", daemon=True))
+        for t in self._threads:
+            t.start()
+
+    # Interactive sends never block the caller: with the queue full the
+    # message is dropped, counted, and False returned so the caller can fall
+    # back. Bulk sends wait up to bulk_timeout for one of the bulk slots, so a
+    # broadcast slows down to the send rate instead of failing recipients.
+    def enqueue(self, phone: str, text: str, bulk: bool = False) -> bool:
+        if bulk:
+            return self._enqueue_bulk(phone, text)
+        with self._cond:
+            self._pending += 1
+        try:
+            self._queue.put_nowait((phone, text, 1, False))
+        except Full:
+            with self._cond:
+                self._pending -= 1
+                self.dropped += 1
+                self._cond.notify_all()
+            return False
+        return True
+
+    def _enqueue_bulk(self, phone: str, text: str) -> bool:
+        deadline = time.monotonic() + self.bulk_timeout
+        slots = self._bulk_slots
+        if slots is not None and not slots.acquire(timeout=self.bulk_timeout):
+            with self._cond:
+                self.bulk_timed_out += 1
+            return False
+        with self._cond:
+            self._pending += 1
+        try:
+            self._queue.put((phone, text, 1, slots is not None), timeout=max(0.0, deadline - time.monotonic()))
+        except Full:
+            if slots is not None:
+                slots.release()
+            with self._cond:
+                self._pending -= 1
+                self.bulk_timed_out += 1
+                self._cond.notify_all()
+            return False
+        return True
+
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._pending:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def backoff(self, attempt: int) -> float:
+        # "Full jitter": spreads retries of a burst of failures over the window.
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    # Every message taken off the queue either goes back as a retry or is
+    # settled by _done, whatever the transport or build raises, so drain()
+    # cannot wait forever on a message that was lost.
+    def _work(self) -> None:
+        while True:
+            phone, text, attempt, bulk = self._queue.get()
+            # A bulk slot only covers the first trip through the queue; retries
+            # are re-queued unslotted so the retry thread never waits on one.
+            if bulk:
+                self._bulk_slots.release()
+            sent = retrying = False
+            try:
+                self.limiter.acquire()
+                self.transport.send(self.build(phone, text))
+                sent = True
+            except DeliveryError as exc:
+                if exc.retryable and attempt < self.max_attempts:
+                    due = time.monotonic() + self.backoff(attempt)
+                    with self._cond:
+                        self.retried += 1
+                        heapq.heappush(self._retry, (due, next(self._seq), (phone, text, attempt + 1, False)))
+                        self._cond.notify_all()
+                    retrying = True
+                else:
+                    self._dead_letter(phone, text, attempt, str(exc))
+            except Exception as exc:
+                self._dead_letter(phone, text, attempt, f"{type(exc).__name__}: {exc}")
+            finally:
+                if not retrying:
+                    self._done(sent)
+
+    def _schedule(self) -> None:
+        while True:
+            with self._cond:
+                while not self._retry:
+                    self._cond.wait()
+                due, _, item = self._retry[0]
+                wait = due - time.monotonic()
+                if wait > 0:
+                    self._cond.wait(wait)
+                    continue
+                heapq.heappop(self._retry)
+            self._queue.put(item)
+
+    def _dead_letter(self, phone: str, text: str, attempts: int, error: str) -> None:
+        record = {"phone": phone, "text": text, "attempts": attempts, "error": error, "time": time.time()}
+        with self._cond:
+            self.dead_letters.append(record)
+            if self.dead_letter_path:
+                try:
+                    with open(self.dead_letter_path, "a", encoding="utf-8") as fp:
+                        fp.write(json.dumps(record, ensure_ascii=False) + "\n")
+                except OSError as exc:
+                    print(f"[OUTBOUND] could not write dead letter to {self.dead_letter_path}: {exc}")
+
+    def _done(self, sent: bool) -> None:
+        with self._cond:
+            if sent:
+                self.sent += 1
+            else:
+                self.dead += 1
+            self._pending -= 1
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {
+                "queued": self._queue.qsize(),
+                "retrying": len(self._retry),
+                "pending": self._pending,
+                "sent": self.sent,
+                "retried": self.retried,
+                "dead_lettered": self.dead,
+                "dropped": self.dropped,
+                "bulk_timed_out": self.bulk_timed_out,
+            }
+
+
+def outbound_from_env(env: Optional[Dict[str, str]] = None, autostart: bool = True) -> Optional[OutboundQueue]:
+    env = os.environ if env is None else env
+    sid = env.get("TWILIO_ACCOUNT_SID")
+    url = env.get("OUTBOUND_API_URL")
+    if not url and sid:
+        url = f"https://api.twilio.com/2010-04-01/Accounts/{sid}/Messages.json"
+    if not url:
+        return None
+    auth = (sid, env.get("TWILIO_AUTH_TOKEN", "")) if sid else None
+    return OutboundQueue(
+        HttpTransport(url, auth=auth, timeout=float(env.get("OUTBOUND_TIMEOUT", "10"))),
+        whatsapp_form(env.get("TWILIO_WHATSAPP_NUMBER", "")),
+        workers=int(env.get("OUTBOUND_WORKERS", "4")),
+        maxsize=int(env.get("OUTBOUND_QUEUE_SIZE", "10000")),
+        max_attempts=int(env.get("OUTBOUND_MAX_ATTEMPTS", "5")),
+        rate=float(env.get("OUTBOUND_RATE", "0")),
+        dead_letter_path=env.get("OUTBOUND_DEAD_LETTER"),
+        bulk_share=float(env.get("OUTBOUND_BULK_SHARE", "0.5")),
+        bulk_timeout=float(env.get("OUTBOUND_BULK_TIMEOUT", "60")),
+        autostart=autostart,
+    )
@@ -0,0 +1,179 @@
+import os
+import random
+import sys
+import threading
+import time
+from typing import Dict, List, Mapping, Optional
+
+WINDOW_KEY = "profile:window"
+# Longest window /admin/profile/start will open.
+MAX_WINDOW = 3600.0
+TAGS = ("endpoint", "lang", "intent")
+
+
+def _code_name(code) -> str:
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def _c_name(fn) -> str:
+    name = getattr(fn, "__qualname__", None) or getattr(fn, "__name__", None) or type(fn).__name__
+    module = getattr(fn, "__module__", None)
+    return f"{module}.{name}" if module else name
+
+
+# sys.setprofile callback for one request on one thread. Keeps the stack as
+# collapsed paths ("a;b;c") and adds the wall time between events to the
+# path on top, leaving out the callback's own time.
+class _Recorder:
+    __slots__ = ("paths", "stack", "names", "last", "tags")
+
+    def __init__(self, names: Dict[object, str]):
+        self.paths: Dict[str, int] = {}
+        self.stack: List[str] = []
+        self.names = names
+        self.tags: Dict[str, str] = {}
+        self.last = time.perf_counter_ns()
+
+    def __call__(self, frame, event: str, arg) -> None:
+        now = time.perf_counter_ns()
+        stack = self.stack
+        if stack:
+            top = stack[-1]
+            self.paths[top] = self.paths.get(top, 0) + now - self.last
+        if event == "call":
+            code = frame.f_code
+            name = self.names.get(code)
+            if name is None:
+                name = self.names[code] = _code_name(code)
+            stack.append(f"{stack[-1]};{name}" if stack else name)
+        elif event == "c_call":
+            name = _c_name(arg)
+            stack.append(f"{stack[-1]};{name}" if stack else name)
+        elif stack:
+            # return, c_return, c_exception. Returns from frames entered
+            # before profiling started arrive with an empty stack.
+            stack.pop()
+        self.last = time.perf_counter_ns()
+
+
+# Opt-in profiling of live requests, written as collapsed stacks for
+# flamegraph.pl or speedscope: one "endpoint:..;lang:..;intent:..;frames us"
+# line per stack and request, appended to <directory>/<window>-<pid>.folded.
+#
+# Nothing is profiled unless armed: by PROFILE_SAMPLE_RATE, by naming
+# PROFILE_HEADER, or by a time-boxed window from start(). A window is kept
+# in the shared state backend so every worker follows it. While armed, a
+# request is profiled if it carries the header or wins the sample draw.
+class RequestProfiler:
+    def __init__(self, directory: str = "profiles", sample_rate: float = 0.0, header: str = "X-Profile",
+                 header_always: bool = False, backend=None, poll_interval: float = 1.0, clock=time.monotonic):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.header = header
+        self.header_always = header_always
+        self.backend = backend
+        self.poll_interval = poll_interval
+        self._clock = clock
+        self._window: Optional[dict] = None
+        self._next_check = 0.0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._names: Dict[object, str] = {}
+        self.profiled = 0
+        # The only thing request hooks look at when profiling is off.
+        self.enabled = self._armed()
+
+    def _armed(self) -> bool:
+        return self.sample_rate > 0 or self.header_always or self._window is not None
+
+    def poll(self) -> None:
+        now = self._clock()
+        if now < self._next_check or self.backend is None:
+            return
+        self._next_check = now + self.poll_interval
+        window = self.backend.get(WINDOW_KEY)
+        if window is not None and window["until"] <= time.time():
+            window = None
+        self._window = window
+        self.enabled = self._armed()
+
+    def begin(self, headers: Mapping[str, str]) -> bool:
+        window = self._window
+        if window is not None and window["until"] <= time.time():
+            window = self._window = None
+            self.enabled = self._armed()
+        forced = (self.header_always or window is not None) and bool(headers.get(self.header))
+        rate = window["rate"] if window is not None else self.sample_rate
+        if not forced and not (rate > 0 and random.random() < rate):
+            return False
+        recorder = _Recorder(self._names)
+        recorder.tags["window"] = window["id"] if window is not None else "always"
+        self._local.recorder = recorder
+        sys.setprofile(recorder)
+        return True
+
+    # Labels the request being profiled on this thread, if any. A batch
+    # request whose messages differ is tagged "mixed".
+    def tag(self, **tags: str) -> None:
+        recorder = getattr(self._local, "recorder", None)
+        if recorder is None:
+            return
+        for k, v in tags.items():
+            seen = recorder.tags.get(k)
+            recorder.tags[k] = v if seen is None or seen == v else "mixed"
+
+    def end(self, **tags: str) -> None:
+        recorder = getattr(self._local, "recorder", None)
+        if recorder is None:
+            return
+        sys.setprofile(None)
+        self._local.recorder = None
+        recorder.tags.update(tags)
+        prefix = "".join(f"{k}:{recorder.tags[k]};" for k in TAGS if recorder.tags.get(k))
+        lines = "".join(f"{prefix}{path} {ns // 1000}\n" for path, ns in recorder.paths.items() if ns >= 1000)
+        path = os.path.join(self.directory, f"{recorder.tags['window']}-{os.getpid()}.folded")
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(path, "a", encoding="utf-8") as fp:
+                fp.write(lines)
+            self.profiled += 1
+
+    def start(self, seconds: float, sample_rate: float) -> dict:
+        if not 0 < seconds <= MAX_WINDOW:
+            raise ValueError(f"seconds must be in (0, {MAX_WINDOW:.0f}]")
+        if not 0 <= sample_rate <= 1:
+            raise ValueError("sample_rate must be in [0, 1]")
+        window = {"id": time.strftime("%Y%m%dT%H%M%S"), "until": time.time() + seconds, "rate": sample_rate}
+        if self.backend is not None:
+            self.backend.set(WINDOW_KEY, window, seconds)
+        self._window = window
+        self.enabled = True
+        return window
+
+    def stop(self) -> None:
+        if self.backend is not None:
+            self.backend.delete(WINDOW_KEY)
+        self._window = None
+        self.enabled = self._armed()
+
+    def stats(self) -> Dict[str, object]:
+        window = self._window
+        return {
+            "enabled": self.enabled,
+            "window": window,
+            "seconds_left": round(max(0.0, window["until"] - time.time()), 1) if window is not None else None,
+            "sample_rate": window["rate"] if window is not None else self.sample_rate,
+            "header": self.header,
+            "profiled": self.profiled,
+            "directory": self.directory,
+        }
+
+
+def profiler_from_env(env: Dict[str, str], backend=None) -> RequestProfiler:
+    return RequestProfiler(
+        directory=env.get("PROFILE_DIR", "profiles"),
+        sample_rate=float(env.get("PROFILE_SAMPLE_RATE", "0")),
+        header=env.get("PROFILE_HEADER") or "X-Profile",
+        header_always=bool(env.get("PROFILE_HEADER")),
+        backend=backend,
+    )
@@ -0,0 +1,228 @@
+import argparse
+import gzip
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import Counter, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import BinaryIO, Deque, Dict, Iterator, List, Optional, Tuple
+
+# Replays recorded messages through the classification half of
+# handle_message (language, intent, age) without sending anything, spread
+# over a process pool, and reports aggregate counts.
+#
+#   python replay.py archive-2024-*.jsonl.gz --workers 8 --out per_message.ndjson
+#
+# Input is JSONL with a "text" field and optionally "lang" (as sent to
+# /webhook). Each message is classified as if from a first-time sender:
+# sessions are per worker and the archive is not split by phone.
+
+# app is imported in every worker with these settings, so it opens no
+# databases, network connections or background senders. Content and the
+# intent classifier still come from the environment.
+OFFLINE_ENV = {
+    "STATE_URL": "memory",
+    "SUBSCRIBER_DB": "memory",
+    "BROADCAST_DB": ":memory:",
+    "BROADCAST_LOG_DIR": os.path.join(tempfile.gettempdir(), "chatbot-replay-logs"),
+    "DEDUP_BACKEND": "memory",
+    "METRICS_ENABLED": "0",
+    "KNOWLEDGE_WATCH_INTERVAL": "0",
+}
+OFFLINE_UNSET = ("ALERT_FEED", "OUTBOUND_API_URL", "TWILIO_ACCOUNT_SID", "CHATBOT_PREFORK")
+
+_chatbot = None
+
+
+def _init_worker() -> None:
+    global _chatbot
+    for name in OFFLINE_UNSET:
+        os.environ.pop(name, None)
+    os.environ.update(OFFLINE_ENV)
+    import app
+    _chatbot = app
+
+
+class ChunkResult:
+    __slots__ = ("rows", "errors", "counts", "fallthrough", "ages", "ndjson")
+
+    def __init__(self):
+        self.rows = 0
+        self.errors = 0
+        self.counts: Counter = Counter()
+        self.fallthrough: Counter = Counter()
+        self.ages: Counter = Counter()
+        self.ndjson = b""
+
+
+# "help" because nothing matched, as opposed to a message asking for help.
+def _fell_through(lang: str, text: str) -> bool:
+    pack = _chatbot.PACK
+    t = text.lower()
+    if pack.get(lang).matcher.best(t, "") == "help":
+        return False
+    return not (t.isascii() and pack.get(pack.default_lang).matcher.best(t, "") == "help")
+
+
+def classify_chunk(first_line: int, lines: List[bytes], ndjson: bool) -> ChunkResult:
+    if _chatbot is None:
+        _init_worker()
+    schedule = _chatbot.PACK.vaccine_schedule
+    res = ChunkResult()
+    out: List[str] = []
+    for n, raw in enumerate(lines, first_line):
+        try:
+            rec = json.loads(raw)
+            text = rec.get("text") or ""
+            lang_in = rec.get("lang")
+        except (ValueError, AttributeError):
+            res.errors += 1
+            continue
+        if not isinstance(text, str):
+            res.errors += 1
+            continue
+        lang, intent, age = _chatbot.classify(text, lang_in)
+        res.rows += 1
+        res.counts[lang, intent] += 1
+        if intent == "help" and _fell_through(lang, text):
+            res.fallthrough[lang] += 1
+        res.ages[None if age is None else f"{schedule.starts[schedule.band(age)]}d"] += 1
+        if ndjson:
+            out.append(json.dumps({"line": n, "lang": lang, "intent": intent, "age_days": age}, ensure_ascii=False))
+    if out:
+        res.ndjson = ("\n".join(out) + "\n").encode("utf-8")
+    return res
+
+
+def _open(path: str) -> BinaryIO:
+    if path == "-":
+        return sys.stdin.buffer
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+# (first line number, lines) per chunk; line numbers run across all inputs.
+def read_chunks(paths: List[str], size: int) -> Iterator[Tuple[int, List[bytes]]]:
+    n = 1
+    chunk: List[bytes] = []
+    start = n
+    for path in paths:
+        fp = _open(path)
+        try:
+            for line in fp:
+                if line.strip():
+                    chunk.append(line)
+                n += 1
+                if len(chunk) >= size:
+                    yield start, chunk
+                    chunk, start = [], n
+        finally:
+            if fp is not sys.stdin.buffer:
+                fp.close()
+    if chunk:
+        yield start, chunk
+
+
+class Totals:
+    def __init__(self):
+        self.rows = 0
+        self.errors = 0
+        self.counts: Counter = Counter()
+        self.fallthrough: Counter = Counter()
+        self.ages: Counter = Counter()
+
+    def add(self, res: ChunkResult) -> None:
+        self.rows += res.rows
+        self.errors += res.errors
+        self.counts.update(res.counts)
+        self.fallthrough.update(res.fallthrough)
+        self.ages.update(res.ages)
+
+    def summary(self) -> Dict[str, object]:
+        by_lang: Dict[str, Dict[str, int]] = {}
+        for (lang, intent), count in sorted(self.counts.items()):
+            by_lang.setdefault(lang, {})[intent] = count
+        lang_rows = {lang: sum(intents.values()) for lang, intents in by_lang.items()}
+        fallthrough = sum(self.fallthrough.values())
+        ages = [(k, c) for k, c in self.ages.items() if k is not None]
+        return {
+            "rows": self.rows,
+            "errors": self.errors,
+            "lang_intent": by_lang,
+            "help_fallthrough": {
+                "total": fallthrough,
+                "rate": round(fallthrough / self.rows, 4) if self.rows else 0.0,
+                "by_lang": {lang: round(self.fallthrough[lang] / rows, 4) for lang, rows in lang_rows.items()},
+            },
+            # Keyed by the schedule interval the age falls in, from its first day.
+            "age_days": dict(sorted(ages, key=lambda kc: int(kc[0][:-1]))),
+            "no_age": self.ages.get(None, 0),
+        }
+
+
+# Chunks are classified in the pool with at most `window` in flight, and
+# results are taken in input order, so memory stays bounded by the window
+# and the NDJSON output follows the input.
+def replay(paths: List[str], workers: int, chunk: int, window: int, out: Optional[BinaryIO],
+           progress: bool = False) -> Totals:
+    totals = Totals()
+    started = time.perf_counter()
+
+    def collect(res: ChunkResult) -> None:
+        totals.add(res)
+        if out is not None and res.ndjson:
+            out.write(res.ndjson)
+        if progress:
+            rate = totals.rows / max(time.perf_counter() - started, 1e-9)
+            print(f"\r{totals.rows} rows, {rate:.0f} rows/s", end="", file=sys.stderr, flush=True)
+
+    chunks = read_chunks(paths, chunk)
+    if workers <= 0:
+        for first, lines in chunks:
+            collect(classify_chunk(first, lines, out is not None))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            pending: Deque[Future] = deque()
+            for first, lines in chunks:
+                pending.append(pool.submit(classify_chunk, first, lines, out is not None))
+                if len(pending) >= window:
+                    collect(pending.popleft().result())
+            while pending:
+                collect(pending.popleft().result())
+    if progress:
+        print(file=sys.stderr)
+    return totals
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Classify recorded messages offline and report lang/intent/age counts")
+    parser.add_argument("inputs", nargs="+", help="JSONL files (.gz ok), or - for stdin")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="0 classifies in this process")
+    parser.add_argument("--chunk", type=int, default=5000, help="lines per task")
+    parser.add_argument("--window", type=int, default=0, help="chunks in flight (default 2 per worker)")
+    parser.add_argument("--out", help="write one NDJSON line per message here")
+    parser.add_argument("--progress", action="store_true")
+    args = parser.parse_args(argv)
+
+    window = args.window or 2 * max(args.workers, 1)
+    t0 = time.perf_counter()
+    out = open(args.out, "wb") if args.out else None
+    try:
+        totals = replay(args.inputs, args.workers, args.chunk, window, out, args.progress)
+    finally:
+        if out is not None:
+            out.close()
+    elapsed = time.perf_counter() - t0
+    summary = totals.summary()
+    summary["seconds"] = round(elapsed, 2)
+    json.dump(summary, sys.stdout, ensure_ascii=False, indent=2)
+    print()
+    print(f"{totals.rows} rows in {elapsed:.1f}s ({totals.rows / max(elapsed, 1e-9):.0f} rows/s),"
+          f" {args.workers} workers", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
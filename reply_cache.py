@@ -0,0 +1,125 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+
+
+# version is the knowledge pack's, so replies rendered from older content
+# are never served once a reload is live.
+class ReplyKey(NamedTuple):
+    lang: str
+    intent: str
+    age_bucket: Optional[str]
+    pincode: Optional[str]
+    version: str = ""
+
+
+class ReplyCache:
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600.0, clock: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data: "OrderedDict[ReplyKey, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: ReplyKey) -> Optional[str]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires, value = entry
+            if expires <= self._clock():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: ReplyKey, value: str, ttl: Optional[float] = None) -> None:
+        expires = self._clock() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_render(self, key: ReplyKey, render: Callable[[], str], ttl: Optional[float] = None) -> str:
+        value = self.get(key)
+        if value is None:
+            value = render()
+            self.put(key, value, ttl)
+        return value
+
+    def invalidate(self, lang: Optional[str] = None, intent: Optional[str] = None, pincode: Optional[str] = None) -> int:
+        with self._lock:
+            if lang is None and intent is None and pincode is None:
+                n = len(self._data)
+                self._data.clear()
+                return n
+            stale = [
+                k for k in self._data
+                if (lang is None or k.lang == lang)
+                and (intent is None or k.intent == intent)
+                and (pincode is None or k.pincode == pincode)
+            ]
+            for k in stale:
+                del self._data[k]
+            return len(stale)
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+# Each worker keeps its own ReplyCache. An invalidation is applied locally,
+# then appended to a numbered log in the shared backend; every worker
+# replays entries it has not seen, checking at most once per interval.
+class InvalidationLog:
+    def __init__(self, cache: ReplyCache, backend, interval: float = 1.0, key: str = "reply_cache:invalidations",
+                 retention: float = 86400.0, clock: Callable[[], float] = time.monotonic):
+        self.cache = cache
+        self.backend = backend
+        self.interval = interval
+        self.key = key
+        self.retention = retention
+        self._clock = clock
+        self._seen = backend.get(key) or 0
+        self._next_check = 0.0
+
+    def publish(self, lang: Optional[str] = None, intent: Optional[str] = None, pincode: Optional[str] = None) -> int:
+        n = self.cache.invalidate(lang=lang, intent=intent, pincode=pincode)
+        seq = self.backend.incr(self.key)
+        self.backend.set(f"{self.key}:{seq}", {"lang": lang, "intent": intent, "pincode": pincode}, self.retention)
+        return n
+
+    def poll(self) -> None:
+        now = self._clock()
+        if now < self._next_check:
+            return
+        self._next_check = now + self.interval
+        latest = self.backend.get(self.key) or 0
+        while self._seen < latest:
+            self._seen += 1
+            filters = self.backend.get(f"{self.key}:{self._seen}")
+            if filters is None:
+                # The entry has aged out, so drop everything.
+                self.cache.invalidate()
+                self._seen = latest
+                break
+            self.cache.invalidate(**filters)
@@ -0,0 +1,133 @@
+import re
+import string
+from bisect import bisect_right
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Ages are whole days. Spans in the data file are "<n><unit>" with unit
+# d, w, m or y; months and years use their mean length so "12m" == "1y".
+UNIT_DAYS = {"d": 1.0, "w": 7.0, "m": 30.4375, "y": 365.25}
+# Ages above this are treated as something else (a pincode, a year).
+MAX_AGE_YEARS = 120
+# A number and the word after it, e.g. "6 months", "10wk", "1.5 साल", "6-month-old".
+# Not \w: Indic vowel signs are not word characters.
+_AGE = re.compile(r"(\d+(?:\.\d+)?)\s*([^\s\d]*)")
+_STRIP = string.punctuation + "।॥"
+
+
+def span_days(span: str) -> int:
+    unit = span[-1:]
+    if unit not in UNIT_DAYS:
+        raise ValueError(f"bad age span {span!r}: expected <n>d, <n>w, <n>m or <n>y")
+    return round(float(span[:-1]) * UNIT_DAYS[unit])
+
+
+def _age_label(span: str, units: Dict[str, List[str]]) -> str:
+    n = span[:-1]
+    names = units[span[-1]]
+    return f"{n} {names[0] if n == '1' else names[1]}"
+
+
+def _range_label(start: str, end: str, units: Dict[str, List[str]]) -> str:
+    if start[-1] == end[-1]:
+        return f"{start[:-1]}-{_age_label(end, units)}"
+    return f"{_age_label(start, units)} - {_age_label(end, units)}"
+
+
+# Splits the age axis at every band start and end and catch-up deadline, so
+# every interval has one reply: the doses due in its band, the earlier doses
+# still open for catch-up, and the next band's doses. Past a band's "to"
+# (12-16 months, 2-5 years) nothing is due now: the band's open doses are
+# catch-up. Returns the interval starts (ascending, first is 0) and, per
+# language, the reply for each interval.
+def build_schedule(table: dict, langs: Dict[str, dict]) -> Tuple[List[int], Dict[str, List[str]]]:
+    bands = sorted(table["bands"], key=lambda b: span_days(b["from"]))
+    band_starts = [span_days(b["from"]) for b in bands]
+    if not bands or band_starts[0] != 0:
+        raise ValueError("vaccine_schedule bands must start at 0d")
+    doses = [(span_days(d["due"]), span_days(d["until"]) if "until" in d else None, d) for d in table["doses"]]
+    cuts = set(band_starts)
+    cuts.update(span_days(b["to"]) for b in bands if "to" in b)
+    cuts.update(until for _, until, _ in doses if until is not None)
+    starts = sorted(cuts)
+
+    replies: Dict[str, List[str]] = {}
+    for lang, content in langs.items():
+        units, labels = content["age_units"], content["schedule_labels"]
+
+        def band_label(b: dict) -> str:
+            if "label" in b:
+                return labels[b["label"]]
+            if "to" in b:
+                return _range_label(b["from"], b["to"], units)
+            return _age_label(b["from"], units)
+
+        out = []
+        for start in starts:
+            i = bisect_right(band_starts, start) - 1
+            lo = band_starts[i]
+            hi = band_starts[i + 1] if i + 1 < len(bands) else None
+            gap = "to" in bands[i] and start >= span_days(bands[i]["to"])
+            lines = [content["schedule_header"]]
+            if gap:
+                late = [(until, d) for due, until, d in doses if due <= start and until is not None and until > start]
+            else:
+                lines.append(f"{labels['due']} ({band_label(bands[i])}):")
+                lines += [f"- {d['vaccine']}" for due, until, d in doses
+                          if lo <= due and (hi is None or due < hi) and (until is None or until > start)]
+                late = [(until, d) for due, until, d in doses if due < lo and until is not None and until > start]
+            if late:
+                lines.append(f"{labels['catch_up']}:")
+                lines += [f"- {d['vaccine']} ({labels['until'].format(age=_age_label(d['until'], units))})"
+                          for _, d in late]
+            if hi is not None:
+                after = bands[i + 2]["from"] if i + 2 < len(bands) else None
+                upcoming = [d for due, _, d in doses if due >= hi and (after is None or due < span_days(after))]
+                lines.append(f"{labels['next']} ({band_label(bands[i + 1])}):")
+                lines += [f"- {d['vaccine']}" for d in upcoming]
+            out.append("\n".join(lines))
+        replies[lang] = out
+    return starts, replies
+
+
+# Unit words of every language -> unit, so "6 महीने" is read as months even
+# when the message was detected as another language.
+def unit_words(langs: Dict[str, dict]) -> Dict[str, str]:
+    words: Dict[str, str] = {}
+    for content in langs.values():
+        for unit, names in content["age_units"].items():
+            for name in names:
+                words.setdefault(name.lower(), unit)
+    return words
+
+
+# Sorted interval starts; an age falls in the interval of the last start
+# at or below it, found by bisection.
+class ScheduleIndex:
+    def __init__(self, section: dict):
+        self.starts: Sequence[int] = section["starts"]
+        self.units: Dict[str, str] = section["units"]
+
+    def band(self, age_days: int) -> int:
+        return bisect_right(self.starts, age_days) - 1
+
+    def band_id(self, age_days: int) -> str:
+        return f"d{self.starts[self.band(age_days)]}"
+
+    # Age in days from the first number in the text. A unit word after it
+    # ("10 weeks", "6 महीने") sets the unit; a bare number is years.
+    def extract_age_days(self, text: Optional[str]) -> Optional[int]:
+        if not text:
+            return None
+        m = _AGE.search(text.lower())
+        if m is None:
+            return None
+        try:
+            value = float(m.group(1))
+        except ValueError:
+            return None
+        word = m.group(2).strip(_STRIP).split("-", 1)[0]
+        unit = self.units.get(word, "y")
+        days = round(value * UNIT_DAYS[unit])
+        if days > MAX_AGE_YEARS * UNIT_DAYS["y"]:
+            return None
+        return days
@@ -0,0 +1,167 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Union
+
+# Measured by benchmarks/bench_sessions.py (CPython 3.11, 64-bit) with every
+# session holding a pincode: record, str key, float timestamp, int pincode
+# and the OrderedDict entry.
+BYTES_PER_SESSION = 256
+KEY_PREFIX = "session:"
+
+
+class Session:
+    __slots__ = ("lang", "intent", "pincode", "touched")
+
+    def __init__(self, lang: str, intent: str, pincode: Optional[int], touched: float):
+        self.lang = lang
+        self.intent = intent
+        self.pincode = pincode
+        self.touched = touched
+
+    def pincode_str(self) -> Optional[str]:
+        return None if self.pincode is None else str(self.pincode)
+
+
+# "+91..." and "91..." are the same sender. Kept as a str: an int would
+# make "0123" and "123" one session.
+def _key(phone: str) -> str:
+    return phone[1:] if phone.startswith("+") else phone
+
+
+def _pincode(pincode: Optional[str]) -> Optional[int]:
+    if pincode is None:
+        return None
+    pincode = str(pincode).strip()
+    return int(pincode) if len(pincode) == 6 and pincode.isdigit() and pincode.isascii() else None
+
+
+# Last language, intent and pincode per phone. Entries are kept in
+# last-touched order, so both the size cap and the TTL evict from the front.
+class SessionStore:
+    def __init__(self, max_sessions: int = 200000, ttl: float = 3600.0, clock=time.monotonic):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._clock = clock
+        self._data: "OrderedDict[str, Session]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def get(self, phone: str) -> Optional[Session]:
+        if not phone:
+            return None
+        key = _key(phone)
+        now = self._clock()
+        with self._lock:
+            session = self._data.get(key)
+            if session is not None and session.touched + self.ttl <= now:
+                del self._data[key]
+                self.expired += 1
+                session = None
+            if session is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return session
+
+    def update(self, phone: str, lang: str, intent: str, pincode: Optional[str] = None) -> None:
+        if not phone:
+            return
+        key = _key(phone)
+        now = self._clock()
+        with self._lock:
+            session = self._data.get(key)
+            if session is None:
+                self._data[key] = Session(lang, intent, _pincode(pincode), now)
+            else:
+                session.lang = lang
+                session.intent = intent
+                session.touched = now
+                session.pincode = _pincode(pincode) or session.pincode
+                self._data.move_to_end(key)
+            self._evict(now)
+
+    # Called on every write: drops expired entries from the front, a couple
+    # at a time, then whatever is over the cap.
+    def _evict(self, now: float) -> None:
+        data = self._data
+        for _ in range(2):
+            if not data:
+                return
+            key = next(iter(data))
+            if data[key].touched + self.ttl > now:
+                break
+            del data[key]
+            self.expired += 1
+        while len(data) > self.max_sessions:
+            data.popitem(last=False)
+            self.evicted += 1
+
+    def forget(self, phone: str) -> None:
+        with self._lock:
+            self._data.pop(_key(phone), None)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._data),
+            "max_sessions": self.max_sessions,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "evicted": self.evicted,
+        }
+
+
+# Sessions in the shared state backend, so every worker sees a sender's
+# last message whichever worker handled it. Expiry is the backend's TTL;
+# there is no size cap beyond the backend's own.
+class SharedSessionStore:
+    def __init__(self, backend, ttl: float = 3600.0):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, phone: str) -> Optional[Session]:
+        if not phone:
+            return None
+        raw = self.backend.get(KEY_PREFIX + _key(phone))
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return Session(raw["lang"], raw["intent"], raw["pincode"], raw["touched"])
+
+    def update(self, phone: str, lang: str, intent: str, pincode: Optional[str] = None) -> None:
+        if not phone:
+            return
+        key = KEY_PREFIX + _key(phone)
+        pin = _pincode(pincode)
+        if pin is None:
+            raw = self.backend.get(key)
+            pin = raw["pincode"] if raw is not None else None
+        self.backend.set(key, {"lang": lang, "intent": intent, "pincode": pin, "touched": time.time()}, self.ttl)
+
+    def forget(self, phone: str) -> None:
+        self.backend.delete(KEY_PREFIX + _key(phone))
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+# A memory budget in MiB becomes a session count using the measured size.
+# With a shared (non-memory) backend, sessions are kept there instead.
+def session_store_from_env(env: Dict[str, str], backend=None) -> Union[SessionStore, SharedSessionStore]:
+    if backend is not None and backend.kind != "memory":
+        return SharedSessionStore(backend, ttl=float(env.get("SESSION_TTL", "3600")))
+    budget = float(env.get("SESSION_MAX_MB", "64"))
+    return SessionStore(
+        max_sessions=max(1, int(budget * 2 ** 20 / BYTES_PER_SESSION)),
+        ttl=float(env.get("SESSION_TTL", "3600")),
+    )
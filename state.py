@@ -0,0 +1,213 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+REDIS_SCHEMES = ("redis://", "rediss://", "unix://")
+
+
+def is_redis_url(url: str) -> bool:
+    return url.startswith(REDIS_SCHEMES)
+
+
+def redis_client(url: str):
+    try:
+        import redis
+    except ImportError:
+        raise RuntimeError(f"{url} needs the redis package (pip install redis)") from None
+    return redis.Redis.from_url(url)
+
+
+# Shared key/value state with optional per-key expiry. Values are anything
+# json can encode; counters from incr() are plain integers.
+class StateBackend:
+    kind = ""
+
+    def get(self, key: str) -> Any:
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        raise NotImplementedError
+
+    # Set only if the key is absent or expired; True if this call set it.
+    def add(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def incr(self, key: str, amount: int = 1) -> int:
+        raise NotImplementedError
+
+    def size(self) -> Optional[int]:
+        return None
+
+
+class MemoryBackend(StateBackend):
+    kind = "memory"
+
+    def __init__(self, maxsize: Optional[int] = None, clock=time.monotonic):
+        self.maxsize = maxsize
+        self._clock = clock
+        self._data: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _live(self, key: str, now: float) -> Optional[Tuple[Any, float]]:
+        entry = self._data.get(key)
+        if entry is not None and entry[1] <= now:
+            del self._data[key]
+            return None
+        return entry
+
+    def _store(self, key: str, value: Any, ttl: Optional[float], now: float) -> None:
+        self._data[key] = (value, now + ttl if ttl else float("inf"))
+        self._data.move_to_end(key)
+        if self.maxsize is not None:
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            entry = self._live(key, self._clock())
+        return None if entry is None else entry[0]
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        with self._lock:
+            self._store(key, value, ttl, self._clock())
+
+    def add(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        now = self._clock()
+        with self._lock:
+            if self._live(key, now) is not None:
+                return False
+            self._store(key, value, ttl, now)
+            return True
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def incr(self, key: str, amount: int = 1) -> int:
+        now = self._clock()
+        with self._lock:
+            entry = self._live(key, now)
+            value = (entry[0] if entry is not None else 0) + amount
+            self._data[key] = (value, entry[1] if entry is not None else float("inf"))
+            return value
+
+    def size(self) -> int:
+        return len(self._data)
+
+
+class SQLiteBackend(StateBackend):
+    kind = "sqlite"
+    PURGE_EVERY = 1000
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._pid = os.getpid()
+        self._ops = 0
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL)"
+        )
+
+    # Connections never cross a fork: a child opens its own on first use.
+    def _conn(self) -> sqlite3.Connection:
+        if self._pid != os.getpid():
+            self._local = threading.local()
+            self._pid = os.getpid()
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _maybe_purge(self, conn: sqlite3.Connection, now: float) -> None:
+        self._ops += 1
+        if self._ops % self.PURGE_EVERY == 0:
+            conn.execute("DELETE FROM state WHERE expires <= ?", (now,))
+
+    def get(self, key: str) -> Any:
+        row = self._conn().execute(
+            "SELECT value FROM state WHERE key = ? AND (expires IS NULL OR expires > ?)", (key, time.time())
+        ).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        now = time.time()
+        conn = self._conn()
+        self._maybe_purge(conn, now)
+        conn.execute(
+            "INSERT OR REPLACE INTO state (key, value, expires) VALUES (?, ?, ?)",
+            (key, json.dumps(value, ensure_ascii=False), now + ttl if ttl else None),
+        )
+
+    def add(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        now = time.time()
+        conn = self._conn()
+        self._maybe_purge(conn, now)
+        # One statement, so the check and the write are atomic across processes.
+        cur = conn.execute(
+            "INSERT INTO state (key, value, expires) VALUES (?, ?, ?)"
+            " ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires = excluded.expires"
+            " WHERE state.expires IS NOT NULL AND state.expires <= ?",
+            (key, json.dumps(value, ensure_ascii=False), now + ttl if ttl else None, now),
+        )
+        return cur.rowcount > 0
+
+    def delete(self, key: str) -> None:
+        self._conn().execute("DELETE FROM state WHERE key = ?", (key,))
+
+    def incr(self, key: str, amount: int = 1) -> int:
+        row = self._conn().execute(
+            "INSERT INTO state (key, value, expires) VALUES (?, ?, NULL)"
+            " ON CONFLICT (key) DO UPDATE SET value = CAST(value AS INTEGER) + ? RETURNING value",
+            (key, str(amount), amount),
+        ).fetchone()
+        return int(row[0])
+
+    def size(self) -> int:
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM state WHERE expires IS NULL OR expires > ?", (time.time(),)
+        ).fetchone()[0]
+
+
+class RedisBackend(StateBackend):
+    kind = "redis"
+
+    def __init__(self, client, prefix: str = "chatbot:"):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key: str) -> Any:
+        raw = self.client.get(self.prefix + key)
+        return None if raw is None else json.loads(raw)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self.client.set(self.prefix + key, json.dumps(value, ensure_ascii=False), px=int(ttl * 1000) if ttl else None)
+
+    def add(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        return bool(self.client.set(
+            self.prefix + key, json.dumps(value, ensure_ascii=False), px=int(ttl * 1000) if ttl else None, nx=True,
+        ))
+
+    def delete(self, key: str) -> None:
+        self.client.delete(self.prefix + key)
+
+    def incr(self, key: str, amount: int = 1) -> int:
+        return int(self.client.incrby(self.prefix + key, amount))
+
+
+def open_state(url: str, maxsize: Optional[int] = None) -> StateBackend:
+    if url in ("", "memory", ":memory:"):
+        return MemoryBackend(maxsize)
+    if is_redis_url(url):
+        return RedisBackend(redis_client(url))
+    return SQLiteBackend(url[len("sqlite:///"):] if url.startswith("sqlite:///") else url)
+
@@ -0,0 +1,366 @@
+import csv
+import io
+import json
+import os
+import sqlite3
+import sys
+import threading
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+from state import is_redis_url, redis_client
+
+Row = Tuple[str, str, Optional[str]]
+
+
+class SubscriberStore:
+    def add(self, phone: str, lang: str, pincode: Optional[str] = None) -> None:
+        self.bulk_import([(phone, lang, pincode)])
+
+    def bulk_import(self, rows: Iterable[Row], chunk_size: int = 10000) -> int:
+        raise NotImplementedError
+
+    def remove(self, phone: str) -> bool:
+        raise NotImplementedError
+
+    def get(self, phone: str) -> Optional[Dict[str, Optional[str]]]:
+        raise NotImplementedError
+
+    def count(self, lang: Optional[str] = None, pincode: Optional[str] = None) -> int:
+        raise NotImplementedError
+
+    def iter_from(
+        self, after: int = -1, lang: Optional[str] = None, pincode: Optional[str] = None
+    ) -> Iterator[Tuple[int, str, str]]:
+        raise NotImplementedError
+
+
+class MemorySubscriberStore(SubscriberStore):
+    def __init__(self):
+        self._rows: List[Optional[Row]] = []
+        self._by_phone: Dict[str, int] = {}
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def bulk_import(self, rows: Iterable[Row], chunk_size: int = 10000) -> int:
+        n = 0
+        with self._lock:
+            for phone, lang, pincode in rows:
+                pos = self._by_phone.get(phone)
+                if pos is None:
+                    self._by_phone[phone] = len(self._rows)
+                    self._rows.append((phone, lang, pincode))
+                    self._size += 1
+                else:
+                    self._rows[pos] = (phone, lang, pincode)
+                n += 1
+        return n
+
+    def remove(self, phone: str) -> bool:
+        with self._lock:
+            pos = self._by_phone.pop(phone, None)
+            if pos is None:
+                return False
+            self._rows[pos] = None
+            self._size -= 1
+            return True
+
+    def get(self, phone: str) -> Optional[Dict[str, Optional[str]]]:
+        pos = self._by_phone.get(phone)
+        row = self._rows[pos] if pos is not None else None
+        if row is None:
+            return None
+        return {"phone": row[0], "lang": row[1], "pincode": row[2]}
+
+    def count(self, lang: Optional[str] = None, pincode: Optional[str] = None) -> int:
+        if lang is None and pincode is None:
+            return self._size
+        return sum(1 for _ in self.iter_from(-1, lang, pincode))
+
+    def iter_from(
+        self, after: int = -1, lang: Optional[str] = None, pincode: Optional[str] = None
+    ) -> Iterator[Tuple[int, str, str]]:
+        for pos in range(after + 1, len(self._rows)):
+            row = self._rows[pos]
+            if row is None:
+                continue
+            if lang is not None and row[1] != lang:
+                continue
+            if pincode is not None and row[2] != pincode:
+                continue
+            yield pos, row[0], row[1]
+
+
+class SQLiteSubscriberStore(SubscriberStore):
+    def __init__(self, path: str, page_size: int = 1000):
+        self.path = path
+        self.page_size = page_size
+        self._local = threading.local()
+        self._pid = os.getpid()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        with conn:
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS subscribers (
+                    id INTEGER PRIMARY KEY,
+                    phone TEXT NOT NULL UNIQUE,
+                    lang TEXT NOT NULL,
+                    pincode TEXT
+                );
+                CREATE INDEX IF NOT EXISTS subscribers_lang ON subscribers (lang, id);
+                CREATE INDEX IF NOT EXISTS subscribers_pincode ON subscribers (pincode, id);
+                CREATE TABLE IF NOT EXISTS subscriber_stats (
+                    id INTEGER PRIMARY KEY CHECK (id = 0),
+                    total INTEGER NOT NULL
+                );
+                INSERT OR IGNORE INTO subscriber_stats (id, total)
+                    SELECT 0, COUNT(*) FROM subscribers;
+                CREATE TRIGGER IF NOT EXISTS subscribers_ins AFTER INSERT ON subscribers
+                    BEGIN UPDATE subscriber_stats SET total = total + 1 WHERE id = 0; END;
+                CREATE TRIGGER IF NOT EXISTS subscribers_del AFTER DELETE ON subscribers
+                    BEGIN UPDATE subscriber_stats SET total = total - 1 WHERE id = 0; END;
+                """
+            )
+
+    # A forked worker must not reuse the parent's connection.
+    def _conn(self) -> sqlite3.Connection:
+        if self._pid != os.getpid():
+            self._local = threading.local()
+            self._pid = os.getpid()
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def bulk_import(self, rows: Iterable[Row], chunk_size: int = 10000) -> int:
+        conn = self._conn()
+        it = iter(rows)
+        n = 0
+        while True:
+            chunk = list(islice(it, chunk_size))
+            if not chunk:
+                return n
+            with conn:
+                conn.executemany(
+                    "INSERT INTO subscribers (phone, lang, pincode) VALUES (?, ?, ?)"
+                    " ON CONFLICT (phone) DO UPDATE SET lang = excluded.lang, pincode = excluded.pincode",
+                    chunk,
+                )
+            n += len(chunk)
+
+    def remove(self, phone: str) -> bool:
+        conn = self._conn()
+        with conn:
+            cur = conn.execute("DELETE FROM subscribers WHERE phone = ?", (phone,))
+        return cur.rowcount > 0
+
+    def get(self, phone: str) -> Optional[Dict[str, Optional[str]]]:
+        row = self._conn().execute(
+            "SELECT phone, lang, pincode FROM subscribers WHERE phone = ?", (phone,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {"phone": row[0], "lang": row[1], "pincode": row[2]}
+
+    def count(self, lang: Optional[str] = None, pincode: Optional[str] = None) -> int:
+        conn = self._conn()
+        if lang is None and pincode is None:
+            return conn.execute("SELECT total FROM subscriber_stats WHERE id = 0").fetchone()[0]
+        where, args = self._filters(lang, pincode)
+        return conn.execute(f"SELECT COUNT(*) FROM subscribers WHERE {where}", args).fetchone()[0]
+
+    # Keyset pagination: each page is an index range scan starting after the
+    # last id seen, so iteration memory is bounded by page_size.
+    def iter_from(
+        self, after: int = -1, lang: Optional[str] = None, pincode: Optional[str] = None
+    ) -> Iterator[Tuple[int, str, str]]:
+        conn = self._conn()
+        where, args = self._filters(lang, pincode)
+        sql = f"SELECT id, phone, lang FROM subscribers WHERE id > ? AND {where} ORDER BY id LIMIT ?"
+        while True:
+            page = conn.execute(sql, [after, *args, self.page_size]).fetchall()
+            if not page:
+                return
+            yield from page
+            after = page[-1][0]
+
+    @staticmethod
+    def _filters(lang: Optional[str], pincode: Optional[str]) -> Tuple[str, list]:
+        clauses = ["1"]
+        args: list = []
+        if lang is not None:
+            clauses.append("lang = ?")
+            args.append(lang)
+        if pincode is not None:
+            clauses.append("pincode = ?")
+            args.append(pincode)
+        return " AND ".join(clauses), args
+
+
+class RedisSubscriberStore(SubscriberStore):
+    # Each subscriber is a hash under sub:<id>; sorted sets of ids (score =
+    # id) serve as the overall, per-language and per-pincode indexes, so
+    # iter_from pages through ZRANGEBYSCORE the same way the SQLite store
+    # pages through its id index.
+    def __init__(self, client, prefix: str = "chatbot:subscribers:", page_size: int = 1000):
+        self.client = client
+        self.prefix = prefix
+        self.page_size = page_size
+
+    def _index(self, lang: Optional[str] = None, pincode: Optional[str] = None) -> str:
+        if lang is not None:
+            return f"{self.prefix}ids:lang:{lang}"
+        if pincode is not None:
+            return f"{self.prefix}ids:pin:{pincode}"
+        return f"{self.prefix}ids"
+
+    def _unindex(self, pipe, sub_id: int, lang: Optional[str], pincode: Optional[str]) -> None:
+        if lang:
+            pipe.zrem(self._index(lang=lang), sub_id)
+        if pincode:
+            pipe.zrem(self._index(pincode=pincode), sub_id)
+
+    def bulk_import(self, rows: Iterable[Row], chunk_size: int = 10000) -> int:
+        p = self.prefix
+        it = iter(rows)
+        n = 0
+        while True:
+            chunk = list(islice(it, chunk_size))
+            if not chunk:
+                return n
+            ids = self.client.mget([f"{p}phone:{phone}" for phone, _, _ in chunk])
+            fresh = [i for i, sub_id in enumerate(ids) if sub_id is None]
+            if fresh:
+                last = self.client.incrby(f"{p}seq", len(fresh))
+                pipe = self.client.pipeline()
+                for offset, i in enumerate(fresh):
+                    pipe.set(f"{p}phone:{chunk[i][0]}", last - len(fresh) + offset + 1, nx=True)
+                claimed = pipe.execute()
+                for offset, i in enumerate(fresh):
+                    if claimed[offset]:
+                        ids[i] = last - len(fresh) + offset + 1
+                lost = [i for i in fresh if ids[i] is None]
+                if lost:
+                    # Another importer added these phones since the mget.
+                    for i, sub_id in zip(lost, self.client.mget([f"{p}phone:{chunk[i][0]}" for i in lost])):
+                        ids[i] = sub_id
+            ids = [int(sub_id) for sub_id in ids]
+            pipe = self.client.pipeline()
+            for sub_id in ids:
+                pipe.hmget(f"{p}sub:{sub_id}", "lang", "pincode")
+            previous = pipe.execute()
+            pipe = self.client.pipeline(transaction=False)
+            for (phone, lang, pincode), sub_id, (old_lang, old_pincode) in zip(chunk, ids, previous):
+                self._unindex(pipe, sub_id, old_lang and old_lang.decode(), old_pincode and old_pincode.decode())
+                pipe.hset(f"{p}sub:{sub_id}", mapping={"phone": phone, "lang": lang, "pincode": pincode or ""})
+                pipe.zadd(self._index(), {sub_id: sub_id})
+                pipe.zadd(self._index(lang=lang), {sub_id: sub_id})
+                if pincode:
+                    pipe.zadd(self._index(pincode=pincode), {sub_id: sub_id})
+            pipe.execute()
+            n += len(chunk)
+
+    def remove(self, phone: str) -> bool:
+        p = self.prefix
+        sub_id = self.client.get(f"{p}phone:{phone}")
+        if sub_id is None:
+            return False
+        sub_id = int(sub_id)
+        lang, pincode = self.client.hmget(f"{p}sub:{sub_id}", "lang", "pincode")
+        pipe = self.client.pipeline()
+        pipe.delete(f"{p}phone:{phone}", f"{p}sub:{sub_id}")
+        pipe.zrem(self._index(), sub_id)
+        self._unindex(pipe, sub_id, lang and lang.decode(), pincode and pincode.decode())
+        pipe.execute()
+        return True
+
+    def get(self, phone: str) -> Optional[Dict[str, Optional[str]]]:
+        sub_id = self.client.get(f"{self.prefix}phone:{phone}")
+        if sub_id is None:
+            return None
+        lang, pincode = self.client.hmget(f"{self.prefix}sub:{int(sub_id)}", "lang", "pincode")
+        if lang is None:
+            return None
+        return {"phone": phone, "lang": lang.decode(), "pincode": pincode.decode() or None}
+
+    def count(self, lang: Optional[str] = None, pincode: Optional[str] = None) -> int:
+        if lang is not None and pincode is not None:
+            return sum(1 for _ in self.iter_from(-1, lang, pincode))
+        return self.client.zcard(self._index(lang, pincode))
+
+    def iter_from(
+        self, after: int = -1, lang: Optional[str] = None, pincode: Optional[str] = None
+    ) -> Iterator[Tuple[int, str, str]]:
+        index = self._index(lang, pincode)
+        while True:
+            ids = self.client.zrangebyscore(index, f"({after}", "+inf", start=0, num=self.page_size)
+            if not ids:
+                return
+            pipe = self.client.pipeline(transaction=False)
+            for sub_id in ids:
+                pipe.hmget(f"{self.prefix}sub:{int(sub_id)}", "phone", "lang", "pincode")
+            for sub_id, (phone, row_lang, row_pincode) in zip(ids, pipe.execute()):
+                if phone is None:
+                    continue
+                if pincode is not None and row_pincode.decode() != pincode:
+                    continue
+                yield int(sub_id), phone.decode(), row_lang.decode()
+            after = int(ids[-1])
+
+
+def _clean(phone, lang, pincode) -> Optional[Row]:
+    phone = str(phone or "").strip().replace("whatsapp:", "")
+    if not phone:
+        return None
+    lang = str(lang or "en").strip().lower() or "en"
+    pincode = str(pincode).strip() if pincode not in (None, "") else None
+    return phone, lang, pincode
+
+
+def read_csv(fp: TextIO) -> Iterator[Row]:
+    for rec in csv.DictReader(fp):
+        row = _clean(rec.get("phone"), rec.get("lang"), rec.get("pincode"))
+        if row is not None:
+            yield row
+
+
+def read_ndjson(fp: TextIO) -> Iterator[Row]:
+    for line in fp:
+        line = line.strip()
+        if not line:
+            continue
+        rec = json.loads(line)
+        row = _clean(rec.get("phone"), rec.get("lang"), rec.get("pincode"))
+        if row is not None:
+            yield row
+
+
+def import_file(store: SubscriberStore, path: str) -> int:
+    reader = read_ndjson if path.endswith((".ndjson", ".jsonl")) else read_csv
+    with io.open(path, encoding="utf-8", newline="") as fp:
+        return store.bulk_import(reader(fp))
+
+
+def open_subscriber_store(url: str) -> SubscriberStore:
+    if url in ("", "memory", ":memory:"):
+        return MemorySubscriberStore()
+    if is_redis_url(url):
+        return RedisSubscriberStore(redis_client(url))
+    return SQLiteSubscriberStore(url)
+
+
+if __name__ == "__main__":
+    db = os.environ.get("SUBSCRIBER_DB", "subscribers.db")
+    if len(sys.argv) >= 3 and sys.argv[1] == "import":
+        store = open_subscriber_store(db)
+        for path in sys.argv[2:]:
+            print(f"{path}: {import_file(store, path)} rows")
+        print(f"total subscribers: {store.count()}")
+    elif len(sys.argv) == 2 and sys.argv[1] == "count":
+        print(open_subscriber_store(db).count())
+    else:
+        print("usage: python subscribers.py import FILE.csv|FILE.ndjson [...] | count")
+        sys.exit(2)
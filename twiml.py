@@ -0,0 +1,46 @@
+from typing import Callable, Dict, Iterable, Tuple
+
+# Byte-for-byte what str(MessagingResponse()) produces, without building an
+# element tree per reply.
+_HEAD = b'<?xml version="1.0" encoding="UTF-8"?><Response><Message>'
+_TAIL = b"</Message></Response>"
+EMPTY_RESPONSE = b'<?xml version="1.0" encoding="UTF-8"?><Response />'
+
+
+# Element text only needs &, < and > escaped, as ElementTree does.
+def escape(text: str) -> str:
+    if "&" in text:
+        text = text.replace("&", "&amp;")
+    if "<" in text:
+        text = text.replace("<", "&lt;")
+    if ">" in text:
+        text = text.replace(">", "&gt;")
+    return text
+
+
+def render_message(text: str) -> bytes:
+    return _HEAD + escape(text).encode("utf-8") + _TAIL
+
+
+# Finished TwiML bodies for replies that depend only on (lang, intent).
+# Bodies are rendered on first use, or all at once by preload().
+class TwimlReplies:
+    def __init__(self, render: Callable[[str, str], str]):
+        self._render = render
+        self._bodies: Dict[Tuple[str, str], bytes] = {}
+
+    def get(self, lang: str, intent: str) -> bytes:
+        body = self._bodies.get((lang, intent))
+        if body is None:
+            body = self._bodies[(lang, intent)] = render_message(self._render(lang, intent))
+        return body
+
+    def preload(self, pairs: Iterable[Tuple[str, str]]) -> None:
+        for lang, intent in pairs:
+            self.get(lang, intent)
+
+    def clear(self) -> None:
+        self._bodies = {}
+
+    def __len__(self) -> int:
+        return len(self._bodies)